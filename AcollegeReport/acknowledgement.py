@@ -1,51 +1,18 @@
 import os
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
+from html import escape
+from report_styles import get_styles, make_doc_template
 
-def create_acknowledgement(output_path):
-    """Create a PDF with an acknowledgement page."""
-    # Set up the document
-    doc = SimpleDocTemplate(
-        output_path,
-        pagesize=A4,
-        rightMargin=72,
-        leftMargin=72,
-        topMargin=72,
-        bottomMargin=72
-    )
-    
-    # Get the styles
-    styles = getSampleStyleSheet()
-    
-    # Create custom styles
-    styles.add(ParagraphStyle(
-        name='AckTitle',
-        parent=styles['Heading1'],
-        fontSize=22,
-        alignment=TA_CENTER,
-        spaceAfter=30
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='AckBody',
-        parent=styles['Normal'],
-        fontSize=12,
-        leading=16,
-        alignment=TA_JUSTIFY,
-        firstLineIndent=20,
-        spaceAfter=12
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='AckSignature',
-        parent=styles['Normal'],
-        fontSize=12,
-        alignment=TA_CENTER,
-        spaceBefore=30
-    ))
+# Used when a report does not set its own names
+DEFAULT_STUDENT_NAME = "Rathod Abhiraj Bharat"
+DEFAULT_GUIDE = "Prof. J. R. Kolekar"
+DEFAULT_PROJECT_TITLE = "xShop (Shop Management System using flutter)"
+DEFAULT_TOPIC = "xShop website using Minimax Algorithm"
+
+def acknowledgement_flowables(styles, student_name=DEFAULT_STUDENT_NAME, guide=DEFAULT_GUIDE,
+                              project_title=DEFAULT_PROJECT_TITLE, topic=DEFAULT_TOPIC):
+    """Return the flowables of the acknowledgement page."""
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Paragraph, Spacer
     
     # List of content to add to the PDF
     content = []
@@ -56,11 +23,11 @@ def create_acknowledgement(output_path):
     content.append(Spacer(1, 0.5*inch))
     
     # Add acknowledgement text - using exact text from user
-    acknowledgement_text = """
+    acknowledgement_text = f"""
     Development of this project required the efforts of many people.
-    We have completed the project on "xShop (Shop Management System using flutter)"
+    We have completed the project on "{escape(project_title)}"
     
-    I would like to express my gratitude and thanks to my guide Prof. J. R. Kolekar who gave me the opportunity to do this project on the topic xShop website using Minimax Algorithm.
+    I would like to express my gratitude and thanks to my guide {escape(guide)} who gave me the opportunity to do this project on the topic {escape(topic)}.
     
     Introduced to this topic, that helped me in doing a lot of Research, and I came to know about so many new things.
     
@@ -75,10 +42,20 @@ def create_acknowledgement(output_path):
     content.append(Spacer(1, 1.5*inch))
     
     # Add signature
-    content.append(Paragraph("Rathod Abhiraj Bharat", styles['AckSignature']))
+    content.append(Paragraph(escape(student_name), styles['AckSignature']))
+    return content
+
+def create_acknowledgement(output_path, student_name=DEFAULT_STUDENT_NAME, guide=DEFAULT_GUIDE,
+                           project_title=DEFAULT_PROJECT_TITLE, topic=DEFAULT_TOPIC):
+    """Create a PDF with an acknowledgement page."""
+    # Set up the document
+    doc = make_doc_template(output_path)
+    
+    # Get the shared styles (AckTitle, AckBody, AckSignature)
+    styles = get_styles()
     
     # Build the PDF
-    doc.build(content)
+    doc.build(acknowledgement_flowables(styles, student_name, guide, project_title, topic))
     print(f"Acknowledgement page generated at: {output_path}")
 
 if __name__ == "__main__":
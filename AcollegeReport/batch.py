@@ -0,0 +1,156 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Per-report settings passed to create_acknowledgement
+ACKNOWLEDGEMENT_FIELDS = ['student_name', 'guide', 'project_title', 'topic']
+
+def load_manifest(manifest_path):
+    """
+    Read a batch manifest and return the list of report jobs.
+
+    The manifest is a JSON object with a "reports" list. Each report has a
+    "name", a "contents" directory and optional "cover" fields and
+    acknowledgement fields; "defaults" applies to every report. Relative
+    paths are taken from the manifest's directory.
+    """
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    output_dir = os.path.join(base_dir, manifest.get('output_dir', 'reports'))
+    defaults = manifest.get('defaults', {})
+
+    jobs = []
+    names = set()
+    for report in manifest['reports']:
+        settings = dict(defaults, **report)
+        settings['cover'] = dict(defaults.get('cover', {}), **report.get('cover', {}))
+        name = settings['name']
+        if name in names:
+            raise ValueError(f"Duplicate report name in manifest: {name}")
+        names.add(name)
+        jobs.append({
+            'name': name,
+            'contents': os.path.join(base_dir, settings['contents']),
+            'work_dir': os.path.join(output_dir, name),
+            'output': os.path.join(base_dir, settings['output']) if 'output' in settings
+                      else os.path.join(output_dir, f"{name}.pdf"),
+            'cover': settings['cover'],
+            'acknowledgement': {key: settings[key] for key in ACKNOWLEDGEMENT_FIELDS if key in settings},
+        })
+    return jobs
+
+def init_worker():
+    """Load the modules, fonts and styles once per worker and keep cache entries in memory."""
+    import build_cache
+    import acknowledgement, create_index, create_final_report, report, single_document
+    from report_styles import get_styles
+    build_cache.keep_in_memory()
+    get_styles()
+
+def build_report(job, sharded=False, single_build=False):
+    """Render one report (body, acknowledgement, index, final) and return a result dict."""
+    from acknowledgement import create_acknowledgement
+    from create_final_report import combine_pdfs
+    from create_index import create_index_pdf
+
+    start = time.perf_counter()
+    work_dir = job['work_dir']
+    # The index looks for "projectReport" in the name to skip the cover page
+    report_pdf_path = os.path.join(work_dir, "projectReport.pdf")
+    acknowledgement_pdf_path = os.path.join(work_dir, "acknowledgement.pdf")
+    index_pdf_path = os.path.join(work_dir, "index.pdf")
+
+    log = io.StringIO()
+    try:
+        os.makedirs(work_dir, exist_ok=True)
+        os.makedirs(os.path.dirname(job['output']), exist_ok=True)
+        with contextlib.redirect_stdout(log):
+            if single_build:
+                from single_document import create_complete_pdf
+                pages = create_complete_pdf(job['output'], job['contents'], cover=job['cover'],
+                                            acknowledgement=job['acknowledgement'])
+            else:
+                if sharded:
+                    from sharded_report import create_pdf_sharded
+                    create_pdf_sharded(report_pdf_path, job['contents'], jobs=1, cover=job['cover'])
+                else:
+                    from report import create_pdf
+                    create_pdf(report_pdf_path, job['contents'], cover=job['cover'])
+                create_acknowledgement(acknowledgement_pdf_path, **job['acknowledgement'])
+                create_index_pdf(index_pdf_path, report_pdf_path, acknowledgement_pdf_path)
+                pages = combine_pdfs(job['output'], report_pdf_path, acknowledgement_pdf_path, index_pdf_path)['pages']
+    except Exception as e:
+        return {'name': job['name'], 'ok': False, 'seconds': time.perf_counter() - start,
+                'error': traceback.format_exc(), 'exception': type(e).__name__,
+                'message': str(e), 'log': log.getvalue()}
+    return {'name': job['name'], 'ok': True, 'seconds': time.perf_counter() - start,
+            'output': job['output'], 'pages': pages, 'pid': os.getpid()}
+
+def run_batch(jobs, workers=None, sharded=False, single_build=False):
+    """Render every report job on a process pool; returns the results in manifest order."""
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    results = {}
+
+    def report(result):
+        if result['ok']:
+            print(f"[{len(results)}/{len(jobs)}] {result['name']}: {result['pages']} pages "
+                  f"in {result['seconds']:.2f}s -> {result['output']}")
+        else:
+            print(f"[{len(results)}/{len(jobs)}] {result['name']}: FAILED")
+            print(result['error'])
+
+    if workers <= 1:
+        init_worker()
+        for job in jobs:
+            results[job['name']] = build_report(job, sharded, single_build)
+            report(results[job['name']])
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+            futures = [pool.submit(build_report, job, sharded, single_build) for job in jobs]
+            for future in as_completed(futures):
+                result = future.result()
+                results[result['name']] = result
+                report(result)
+    return [results[job['name']] for job in jobs]
+
+def main(argv=None):
+    """Render every report listed in a batch manifest."""
+    parser = argparse.ArgumentParser(description="Generate many reports from one manifest.")
+    parser.add_argument("manifest", help="JSON file listing the reports to generate")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1,
+                        help="number of reports to render at the same time")
+    parser.add_argument("--sharded", action="store_true",
+                        help="render content files as cached chunks, so files shared between reports are rendered once")
+    parser.add_argument("--single-build", action="store_true",
+                        help="render each report as one document, without intermediate PDFs")
+    args = parser.parse_args(argv)
+    if args.sharded and args.single_build:
+        parser.error("--sharded and --single-build can't be combined")
+
+    jobs = load_manifest(args.manifest)
+    if not jobs:
+        print("Error: The manifest lists no reports.")
+        return False
+
+    start = time.perf_counter()
+    results = run_batch(jobs, args.jobs, args.sharded, args.single_build)
+    elapsed = time.perf_counter() - start
+
+    done = [result for result in results if result['ok']]
+    failed = [result['name'] for result in results if not result['ok']]
+    print(f"\n{len(done)} of {len(jobs)} reports generated in {elapsed:.1f}s "
+          f"({len(done) / elapsed * 60:.1f} reports/min)")
+    if failed:
+        print(f"Error: Failed reports: {', '.join(failed)}")
+        return False
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
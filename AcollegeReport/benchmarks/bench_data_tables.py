@@ -0,0 +1,103 @@
+import argparse
+import csv
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+
+REPORT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPORT_DIR)
+
+CATEGORIES = ['Medicine', 'Grocery', 'Cosmetics', 'Stationery', 'Beverages', 'Household']
+PRODUCTS = ['Paracetamol', 'Hand Soap', 'Notebook', 'Green Tea', 'Shampoo', 'Rice 5kg', 'Ballpoint Pen']
+
+def inventory_record(rng, i):
+    """One product in the shape of the Firebase inventory model."""
+    return {
+        'name': f"{rng.choice(PRODUCTS)} {i}",
+        'category': rng.choice(CATEGORIES),
+        'price': round(rng.uniform(1, 500), 2),
+        'stock': rng.randint(0, 999),
+        'expiry_date': f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        'barcode': str(8901234567890 + i),
+        'last_updated': "2026-02-07T12:00:00",
+    }
+
+def write_export(path, rows, seed=0):
+    """Write an inventory export of rows products as CSV, JSONL or a Firebase-style JSON object."""
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        if path.endswith('.csv'):
+            writer = csv.writer(f)
+            writer.writerow(['id'] + list(inventory_record(rng, 0)))
+            for i in range(rows):
+                writer.writerow([f"Product_ID_{i}"] + list(inventory_record(rng, i).values()))
+        elif path.endswith('.jsonl'):
+            for i in range(rows):
+                f.write(json.dumps(dict(id=f"Product_ID_{i}", **inventory_record(rng, i))) + '\n')
+        else:
+            # Streamed out like the reader streams it in
+            f.write('{')
+            for i in range(rows):
+                f.write(f"{',' if i else ''}\n \"Product_ID_{i}\": {json.dumps(inventory_record(rng, i))}")
+            f.write('\n}\n')
+
+def run(data_dir, output_path):
+    """Build the data appendix in this process and print its measurements as JSON."""
+    from data_tables import create_data_appendix
+    from tracing import peak_rss_mb
+    stats = create_data_appendix(output_path, data_dir)
+    stats['peak_rss_mb'] = peak_rss_mb()
+    stats['output_bytes'] = os.path.getsize(output_path)
+    print(json.dumps(stats))
+
+def measure(data_dir, output_path):
+    """Run in a fresh interpreter so the peak memory is that of this export alone."""
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--run', data_dir, output_path],
+        cwd=REPORT_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Data appendix failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure streaming data tables on large exports.")
+    parser.add_argument("--rows", type=int, nargs='+', default=[10000, 100000, 300000],
+                        help="export sizes in rows")
+    parser.add_argument("--formats", nargs='+', default=['csv', 'jsonl', 'json'], choices=['csv', 'jsonl', 'json'])
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument("--run", nargs=2, metavar=('DATA_DIR', 'PDF'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run(*args.run)
+        return
+
+    results = []
+    root = tempfile.mkdtemp(prefix='report-data-')
+    try:
+        print(f"{'format':>6} {'rows':>8} {'pages':>6} {'time':>8} {'rows/s':>8} {'peak RSS':>9} {'PDF':>9}")
+        for rows in args.rows:
+            for fmt in args.formats:
+                data_dir = os.path.join(root, f"{fmt}-{rows}")
+                os.makedirs(data_dir)
+                write_export(os.path.join(data_dir, f"inventory.{fmt}"), rows)
+                stats = measure(data_dir, os.path.join(root, 'data_appendix.pdf'))
+                results.append(dict(stats, format=fmt))
+                print(f"{fmt:>6} {stats['rows']:>8} {stats['pages']:>6} {stats['seconds']:>7.1f}s "
+                      f"{stats['rows_per_second']:>8.0f} {stats['peak_rss_mb']:>7.1f}MB "
+                      f"{stats['output_bytes'] / (1024 * 1024):>7.1f}MB")
+                shutil.rmtree(data_dir)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+REPORT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPORT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_data_tables import write_export
+
+def bench_size(rows, work_dir, kbps):
+    """Combine the final report with a data appendix of rows rows, plain and linearized."""
+    from create_final_report import combine_pdfs
+    from data_tables import create_data_appendix
+    from pdf_linearize import check_linearization
+
+    data_appendix_path = None
+    if rows:
+        data_dir = os.path.join(work_dir, 'data')
+        os.makedirs(data_dir, exist_ok=True)
+        write_export(os.path.join(data_dir, 'inventory.csv'), rows)
+        data_appendix_path = os.path.join(work_dir, 'data_appendix.pdf')
+        create_data_appendix(data_appendix_path, data_dir)
+        shutil.rmtree(data_dir)
+
+    results = {}
+    for linearize in (False, True):
+        output_path = os.path.join(work_dir, f"final_{'linear' if linearize else 'plain'}.pdf")
+        stats = combine_pdfs(output_path, os.path.join(REPORT_DIR, 'projectReport.pdf'),
+                             os.path.join(REPORT_DIR, 'acknowledgement.pdf'), os.path.join(REPORT_DIR, 'index.pdf'),
+                             data_appendix_pdf_path=data_appendix_path, linearize=linearize)
+        check = check_linearization(output_path)
+        results['linearized' if linearize else 'plain'] = {
+            'pages': stats['pages'],
+            'bytes': check['bytes'],
+            'first_page_bytes': check['first_page_bytes'],
+            'first_page_seconds': check['first_page_bytes'] * 8 / (kbps * 1000),
+            'assembly_seconds': stats['seconds'],
+            'valid': not check['problems'],
+        }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure what linearized output saves before the first page shows.")
+    parser.add_argument("--rows", type=int, nargs='+', default=[0, 20000, 100000],
+                        help="rows of data appendix to add to the report, to make it larger")
+    parser.add_argument("--kbps", type=float, default=512, help="link speed for the time to the first page")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = {}
+    root = tempfile.mkdtemp(prefix='report-linearize-')
+    try:
+        for rows in args.rows:
+            work_dir = os.path.join(root, str(rows))
+            os.makedirs(work_dir)
+            results[rows] = bench_size(rows, work_dir, args.kbps)
+            shutil.rmtree(work_dir)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"\nFirst page over a {args.kbps:.0f} kbit/s link:")
+    print(f"{'rows':>7} {'pages':>6} {'size':>9} {'plain':>9} {'linear':>9} {'page one':>9} {'assembly':>16} {'valid':>6}")
+    for rows, result in results.items():
+        plain, linear = result['plain'], result['linearized']
+        print(f"{rows:>7} {linear['pages']:>6} {linear['bytes'] / 1024:>7.0f}KB {plain['first_page_seconds']:>8.2f}s "
+              f"{linear['first_page_seconds']:>8.3f}s {linear['first_page_bytes'] / 1024:>7.1f}KB "
+              f"{plain['assembly_seconds']:>6.2f}s -> {linear['assembly_seconds']:>5.2f}s {str(linear['valid']):>6}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import argparse
+import os
+import sys
+import time
+
+# Make the report modules importable when run from anywhere
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from report import convert_markdown_to_html, parse_content_file, section_flowables
+from report_styles import get_styles
+from markdown_flowables import markdown_to_flowables
+
+def load_corpus(repeat):
+    """Concatenate the report's content files `repeat` times."""
+    contents_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'contents')
+    texts = []
+    for name in sorted(os.listdir(contents_dir)):
+        if name.endswith('.txt'):
+            with open(os.path.join(contents_dir, name), 'r', encoding='utf-8') as f:
+                texts.append(f.read())
+    return '\n\n'.join(texts * repeat)
+
+def best_of(runs, func):
+    """Return the fastest of several timed runs of func, in seconds."""
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the HTML round trip with the direct markdown compiler.")
+    parser.add_argument("--repeat", type=int, nargs='+', default=[1, 10, 40],
+                        help="how many copies of the contents directory to concatenate")
+    parser.add_argument("--runs", type=int, default=3, help="timed runs per measurement (best is kept)")
+    args = parser.parse_args()
+
+    styles = get_styles()
+    print(f"{'input':>10}  {'html only':>10}  {'html->flow':>10}  {'direct':>10}  {'speedup':>8}")
+    for repeat in args.repeat:
+        text = load_corpus(repeat)
+        html_only = best_of(args.runs, lambda: convert_markdown_to_html(text))
+        html_path = best_of(args.runs, lambda: section_flowables(parse_content_file(text), styles))
+        direct = best_of(args.runs, lambda: markdown_to_flowables(text, styles))
+        size = f"{len(text.encode('utf-8')) / 1024:.0f} KB"
+        print(f"{size:>10}  {html_only:>9.3f}s  {html_path:>9.3f}s  {direct:>9.3f}s  {html_path / direct:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
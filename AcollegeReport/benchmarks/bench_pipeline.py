@@ -0,0 +1,316 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime
+
+REPORT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPORT_DIR)
+
+# Corpus shapes: files, ## sections per file, paragraphs per section and
+# code blocks, lists and images per file
+CORPORA = {
+    'small': dict(files=12, sections=3, paragraphs=3, code_blocks=1, lists=1, images=0),
+    'medium': dict(files=40, sections=6, paragraphs=6, code_blocks=2, lists=2, images=1),
+    'large': dict(files=120, sections=10, paragraphs=8, code_blocks=3, lists=3, images=2),
+}
+
+# Pipeline stages in run order; each one reads the outputs of the ones before it
+STAGES = ['create_pdf', 'extract_headings', 'create_index_pdf', 'merge_pdfs', 'combine_pdfs']
+
+WORDS = (
+    "shop employee admin order product stock invoice firebase database report "
+    "module feature customer payment realtime update sync screen login user "
+    "inventory record query access panel manage track sale price item list"
+).split()
+
+CODE_LINES = [
+    "final ref = FirebaseDatabase.instance.ref('orders');",
+    "ref.child(orderId).update({'status': status});",
+    "if (snapshot.exists) {",
+    "  items.add(Item.fromJson(snapshot.value));",
+    "}",
+    "await Navigator.pushNamed(context, '/details');",
+]
+
+def sentence(rng, words=12):
+    text = ' '.join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + '.'
+
+def paragraph(rng):
+    text = ' '.join(sentence(rng, rng.randint(8, 16)) for _ in range(rng.randint(3, 6)))
+    # Sprinkle in some inline markup
+    word = rng.choice(WORDS)
+    return text.replace(f' {word} ', f' **{word}** ', 1)
+
+def write_png(path, width, height, seed):
+    """Write an RGB gradient PNG using only the standard library."""
+    rows = []
+    for y in range(height):
+        row = bytearray(b'\0')
+        for x in range(width):
+            row += bytes(((x + seed) % 256, (y * 2) % 256, (x + y + seed * 7) % 256))
+        rows.append(bytes(row))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+        f.write(chunk(b'IDAT', zlib.compress(b''.join(rows))))
+        f.write(chunk(b'IEND', b''))
+
+def generate_corpus(contents_dir, files, sections, paragraphs, code_blocks, lists, images, seed=0):
+    """
+    Write a synthetic contents directory in the format of the real one.
+    Returns the total size of the content files in bytes.
+    """
+    rng = random.Random(seed)
+    image_dir = os.path.join(os.path.dirname(contents_dir), 'images')
+    os.makedirs(contents_dir, exist_ok=True)
+    os.makedirs(image_dir, exist_ok=True)
+    total = 0
+
+    for n in range(files):
+        # Extra blocks are spread over the sections of the file
+        extras = ['code'] * code_blocks + ['list'] * lists + ['image'] * images
+        rng.shuffle(extras)
+        lines = [f"# Chapter {n + 1}: {sentence(rng, 3)[:-1]}", ""]
+        for s in range(sections):
+            lines += [f"## {n + 1}.{s + 1} {sentence(rng, 4)[:-1]}", ""]
+            for p in range(paragraphs):
+                if p == paragraphs // 2:
+                    lines += [f"### {sentence(rng, 3)[:-1]}", ""]
+                lines += [paragraph(rng), ""]
+            for kind in extras[s::sections]:
+                if kind == 'code':
+                    lines += ["```"] + rng.sample(CODE_LINES, 4) + ["```", ""]
+                elif kind == 'list':
+                    lines += [f"- {sentence(rng, 6)}" for _ in range(rng.randint(3, 6))] + [""]
+                else:
+                    image_path = os.path.join(image_dir, f"figure_{n}_{len(lines)}.png")
+                    write_png(image_path, 240, 160, n)
+                    lines += [f"![Figure {n + 1}]({image_path})", ""]
+
+        file_path = os.path.join(contents_dir, f"{n:04d}_section.txt")
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines))
+        total += os.path.getsize(file_path)
+    return total
+
+def stage_paths(work_dir):
+    return {
+        'contents': os.path.join(work_dir, 'contents'),
+        'report': os.path.join(work_dir, 'projectReport.pdf'),
+        'acknowledgement': os.path.join(work_dir, 'acknowledgement.pdf'),
+        'index': os.path.join(work_dir, 'index.pdf'),
+        'merged': os.path.join(work_dir, 'merged.pdf'),
+        'final': os.path.join(work_dir, 'finalReport.pdf'),
+    }
+
+def run_stage(name, work_dir):
+    """Run one pipeline stage in this process and return its measurements."""
+    from tracing import peak_rss_mb
+    paths = stage_paths(work_dir)
+    output = None
+
+    if name == 'create_pdf':
+        from report import create_pdf
+        from heading_manifest import heading_manifest_path
+        # Start from scratch so the single-pass build has nothing to reuse
+        if os.path.exists(heading_manifest_path(paths['report'])):
+            os.remove(heading_manifest_path(paths['report']))
+        func = lambda: create_pdf(paths['report'], paths['contents'])
+        output = paths['report']
+    elif name == 'extract_headings':
+        from create_index import extract_headings
+        func = lambda: extract_headings(paths['report'])
+    elif name == 'create_index_pdf':
+        from create_index import create_index_pdf
+        func = lambda: create_index_pdf(paths['index'], paths['report'], paths['acknowledgement'])
+        output = paths['index']
+    elif name == 'merge_pdfs':
+        from merge_pdfs import merge_pdfs
+        func = lambda: merge_pdfs(paths['merged'], paths['acknowledgement'], paths['report'])
+        output = paths['merged']
+    elif name == 'combine_pdfs':
+        from create_final_report import combine_pdfs
+        func = lambda: combine_pdfs(paths['final'], paths['report'], paths['acknowledgement'], paths['index'])
+        output = paths['final']
+    elif name == 'acknowledgement':
+        from acknowledgement import create_acknowledgement
+        func = lambda: create_acknowledgement(paths['acknowledgement'])
+    else:
+        raise ValueError(f"Unknown stage: {name}")
+
+    # Modules are loaded up front so the timing covers the work only
+    import_rss = peak_rss_mb()
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+    result = {'seconds': seconds, 'import_rss_mb': import_rss, 'peak_rss_mb': peak_rss_mb()}
+    if output is not None:
+        result['output_bytes'] = os.path.getsize(output)
+    return result
+
+def measure(name, work_dir, cache_dir):
+    """Run a stage in a fresh interpreter so its peak memory is its own."""
+    env = dict(os.environ, REPORT_CACHE_DIR=cache_dir)
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--run-stage', name, '--work-dir', work_dir],
+        cwd=REPORT_DIR, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Stage {name} failed:\n{result.stderr}")
+    # The stage's own messages come first; the measurements are the last line
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def page_count(pdf_path):
+    from PyPDF2 import PdfReader
+    with open(pdf_path, 'rb') as f:
+        return len(PdfReader(f).pages)
+
+def bench_corpus(name, shape, work_dir, runs, warm, seed):
+    """Generate one corpus and measure every stage on it."""
+    paths = stage_paths(work_dir)
+    input_bytes = generate_corpus(paths['contents'], seed=seed, **shape)
+    cache_dir = os.path.join(work_dir, 'cache')
+    print(f"\n{name}: {shape['files']} files, {input_bytes / 1024:.0f} KB of markdown")
+
+    measure('acknowledgement', work_dir, cache_dir)
+    stages = {}
+    for stage in STAGES:
+        samples = []
+        for _ in range(runs):
+            if not warm:
+                shutil.rmtree(cache_dir, ignore_errors=True)
+            samples.append(measure(stage, work_dir, cache_dir))
+        seconds = [s['seconds'] for s in samples]
+        stages[stage] = {
+            'seconds': seconds,
+            'best_seconds': min(seconds),
+            'peak_rss_mb': max(s['peak_rss_mb'] or 0 for s in samples),
+            'import_rss_mb': samples[0]['import_rss_mb'],
+        }
+        if 'output_bytes' in samples[0]:
+            stages[stage]['output_bytes'] = samples[0]['output_bytes']
+        print(f"  {stage:<18} {min(seconds):8.3f}s  peak {stages[stage]['peak_rss_mb']:7.1f} MB")
+
+    return {
+        'name': name,
+        'shape': shape,
+        'seed': seed,
+        'input_bytes': input_bytes,
+        'report_pages': page_count(paths['report']),
+        'stages': stages,
+    }
+
+def git_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPORT_DIR,
+                                capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+def compare(results, baseline_path, threshold, min_delta):
+    """Print per-stage time ratios against a baseline; returns the regressed stages."""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    previous = {corpus['name']: corpus for corpus in baseline['corpora']}
+
+    print(f"\nCompared with {baseline.get('commit') or baseline_path}:")
+    regressions = []
+    for corpus in results['corpora']:
+        old = previous.get(corpus['name'])
+        if old is None or old['shape'] != corpus['shape']:
+            print(f"  {corpus['name']}: no matching corpus in baseline")
+            continue
+        for stage, current in corpus['stages'].items():
+            if stage not in old['stages']:
+                continue
+            old_seconds = old['stages'][stage]['best_seconds']
+            ratio = current['best_seconds'] / max(old_seconds, 1e-9)
+            flag = ''
+            # Very short stages are mostly noise, so they also need an absolute slowdown
+            if ratio > 1 + threshold and current['best_seconds'] - old_seconds > min_delta:
+                flag = '  REGRESSION'
+                regressions.append(f"{corpus['name']}/{stage}")
+            print(f"  {corpus['name']}/{stage:<18} {ratio:6.2f}x{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the report pipeline on synthetic corpora.")
+    parser.add_argument("--corpus", nargs='+', choices=sorted(CORPORA), default=['small', 'medium'],
+                        help="corpus shapes to benchmark")
+    parser.add_argument("--files", type=int, help="override the number of content files")
+    parser.add_argument("--sections", type=int, help="override the sections per file")
+    parser.add_argument("--paragraphs", type=int, help="override the paragraphs per section")
+    parser.add_argument("--code-blocks", type=int, help="override the code blocks per file")
+    parser.add_argument("--lists", type=int, help="override the lists per file")
+    parser.add_argument("--images", type=int, help="override the images per file")
+    parser.add_argument("--runs", type=int, default=3, help="timed runs per stage (best is kept)")
+    parser.add_argument("--warm", action="store_true", help="keep build caches between runs")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the generated text")
+    parser.add_argument("--output", default="bench_results.json", help="where to write the results")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="slowdown ratio above which a stage counts as regressed")
+    parser.add_argument("--min-delta", type=float, default=0.05,
+                        help="smallest slowdown in seconds that counts as a regression")
+    parser.add_argument("--keep", action="store_true", help="keep the generated corpora and PDFs")
+    parser.add_argument("--run-stage", help=argparse.SUPPRESS)
+    parser.add_argument("--work-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Child process: run a single stage and report on the last line
+    if args.run_stage:
+        result = run_stage(args.run_stage, args.work_dir)
+        print(json.dumps(result))
+        return
+
+    overrides = {key: getattr(args, key) for key in CORPORA['small']
+                 if getattr(args, key) is not None}
+    root = tempfile.mkdtemp(prefix='report-bench-')
+    results = {
+        'commit': git_commit(),
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'runs': args.runs,
+        'warm': args.warm,
+        'corpora': [],
+    }
+    try:
+        for name in args.corpus:
+            shape = dict(CORPORA[name], **overrides)
+            work_dir = os.path.join(root, name)
+            results['corpora'].append(bench_corpus(name, shape, work_dir, args.runs, args.warm, args.seed))
+    finally:
+        if args.keep:
+            print(f"\nCorpora and PDFs kept in: {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to: {args.output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold, args.min_delta)
+        if regressions:
+            print(f"\nSlower than baseline: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
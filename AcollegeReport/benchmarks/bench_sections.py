@@ -0,0 +1,61 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_pipeline import CODE_LINES, measure, paragraph, sentence, stage_paths
+
+def write_section(contents_dir, size_bytes, seed=0):
+    """Write one content file whose single section holds about size_bytes of markdown."""
+    rng = random.Random(seed)
+    os.makedirs(contents_dir, exist_ok=True)
+    lines = ["# Large Section", "", "## Everything Below This Heading", ""]
+    size = 0
+    n = 0
+    while size < size_bytes:
+        n += 1
+        if n % 10 == 0:
+            block = [f"- {sentence(rng, 8)}" for _ in range(8)]
+        elif n % 15 == 0:
+            block = ["```"] + [rng.choice(CODE_LINES) for _ in range(30)] + ["```"]
+        else:
+            block = [paragraph(rng)]
+        lines += block + [""]
+        size += sum(len(line) + 1 for line in block) + 1
+    with open(os.path.join(contents_dir, "large_section.txt"), 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines))
+    return size
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how create_pdf scales with the size of one section.")
+    parser.add_argument("--sizes", type=float, nargs='+', default=[0.25, 0.5, 1, 2],
+                        help="section sizes in MB")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    root = tempfile.mkdtemp(prefix='report-sections-')
+    try:
+        print(f"{'section':>10}  {'time':>9}  {'per MB':>9}  {'peak RSS':>9}")
+        for size_mb in args.sizes:
+            work_dir = os.path.join(root, f"{size_mb}MB")
+            size = write_section(stage_paths(work_dir)['contents'], int(size_mb * 1024 * 1024))
+            result = measure('create_pdf', work_dir, os.path.join(work_dir, 'cache'))
+            per_mb = result['seconds'] / (size / (1024 * 1024))
+            results.append(dict(result, section_bytes=size))
+            print(f"{size / (1024 * 1024):8.2f}MB  {result['seconds']:8.2f}s  {per_mb:8.2f}s  "
+                  f"{result['peak_rss_mb']:7.1f}MB")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
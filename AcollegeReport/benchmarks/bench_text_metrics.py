@@ -0,0 +1,69 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_pipeline import CORPORA, generate_corpus, measure, stage_paths
+
+# Width cache settings compared, as (label, REPORT_WIDTH_CACHE, keep the saved widths)
+MODES = [
+    ('off', 'off', False),
+    ('memory', 'memory', False),
+    ('disk, cold', 'disk', False),
+    ('disk, warm', 'disk', True),
+]
+
+def bench_corpus(name, work_dir, runs, seed):
+    """Measure create_pdf on one corpus with every width cache mode."""
+    paths = stage_paths(work_dir)
+    input_bytes = generate_corpus(paths['contents'], seed=seed, **CORPORA[name])
+    cache_dir = os.path.join(work_dir, 'cache')
+    widths_dir = os.path.join(cache_dir, 'text_metrics')
+    print(f"\n{name}: {CORPORA[name]['files']} files, {input_bytes / 1024:.0f} KB of markdown")
+
+    # Parse the sections once so every mode measures layout, not parsing
+    os.environ['REPORT_WIDTH_CACHE'] = 'off'
+    measure('create_pdf', work_dir, cache_dir)
+
+    results = {}
+    for label, mode, keep in MODES:
+        os.environ['REPORT_WIDTH_CACHE'] = mode
+        seconds = []
+        for _ in range(runs):
+            if not keep:
+                shutil.rmtree(widths_dir, ignore_errors=True)
+            seconds.append(measure('create_pdf', work_dir, cache_dir)['seconds'])
+        results[label] = min(seconds)
+        if label == 'off':
+            print(f"  {label:<12} {results[label]:7.2f}s")
+        else:
+            print(f"  {label:<12} {results[label]:7.2f}s  ({1 - results[label] / results['off']:.0%} faster)")
+    return {'input_bytes': input_bytes, 'seconds': results}
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure what the string width cache saves in create_pdf.")
+    parser.add_argument("--corpora", nargs='+', default=['medium', 'large'], choices=sorted(CORPORA),
+                        help="corpus sizes to generate")
+    parser.add_argument("--runs", type=int, default=1, help="runs per mode; the best one is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = {}
+    root = tempfile.mkdtemp(prefix='report-text-metrics-')
+    try:
+        for name in args.corpora:
+            results[name] = bench_corpus(name, os.path.join(root, name), args.runs, args.seed)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+REPORT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_payload(contents_dir):
+    """Build a render request from the content files of a report."""
+    names = sorted(name for name in os.listdir(contents_dir) if name.endswith('.txt'))
+    sections = []
+    for name in names:
+        with open(os.path.join(contents_dir, name), 'r', encoding='utf-8') as f:
+            sections.append({'name': os.path.splitext(name)[0], 'markdown': f.read()})
+    return {'sections': sections, 'cover': {'prepared_by': "Load Test"}}
+
+def post(url, body, timeout):
+    """POST body and return (status, response bytes)."""
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+def get_json(url):
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return json.load(response)
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))] if values else float('nan')
+
+def run(url, payload, requests, concurrency, timeout):
+    """Send requests from concurrency threads; returns (latencies of successes, status counts, seconds)."""
+    body = json.dumps(payload).encode('utf-8')
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+    remaining = [requests]
+
+    def worker():
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            start = time.perf_counter()
+            try:
+                status, data = post(url + '/render', body, timeout)
+            except OSError:
+                status, data = 'error', b''
+            elapsed = time.perf_counter() - start
+            with lock:
+                statuses[status] += 1
+                if status == 200 and data.startswith(b'%PDF'):
+                    latencies.append(elapsed)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test a running render_service.py.")
+    parser.add_argument("--url", default="http://127.0.0.1:8765", help="base URL of the service")
+    parser.add_argument("--requests", "-n", type=int, default=20, help="total number of render requests")
+    parser.add_argument("--concurrency", "-c", type=int, default=4, help="requests in flight at once")
+    parser.add_argument("--contents", default=os.path.join(REPORT_DIR, "contents"),
+                        help="directory whose content files are sent as the sections")
+    parser.add_argument("--timeout", type=float, default=300, help="client timeout per request in seconds")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    payload = load_payload(args.contents)
+    print(f"Sending {args.requests} requests ({len(payload['sections'])} sections each) "
+          f"with {args.concurrency} in flight to {args.url}")
+    latencies, statuses, elapsed = run(args.url, payload, args.requests, args.concurrency, args.timeout)
+
+    print(f"\n{len(latencies)} of {args.requests} succeeded in {elapsed:.1f}s "
+          f"({len(latencies) / elapsed * 60:.1f} reports/min)")
+    print("Status codes: " + ', '.join(f"{status}: {count}" for status, count in sorted(statuses.items(), key=str)))
+    if latencies:
+        print(f"Latency: p50 {percentile(latencies, 50):.2f}s, p95 {percentile(latencies, 95):.2f}s, "
+              f"p99 {percentile(latencies, 99):.2f}s, max {max(latencies):.2f}s")
+    metrics = get_json(args.url + '/metrics')
+    print(f"Service metrics: {json.dumps(metrics)}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'requests': args.requests,
+                'concurrency': args.concurrency,
+                'seconds': elapsed,
+                'statuses': {str(status): count for status, count in statuses.items()},
+                'latencies': latencies,
+                'service_metrics': metrics,
+            }, f, indent=2)
+    return 0 if len(latencies) == args.requests else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
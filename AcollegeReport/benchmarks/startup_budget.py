@@ -0,0 +1,69 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+REPORT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that are only needed once real work starts
+HEAVY_MODULES = ['reportlab', 'PyPDF2', 'markdown2']
+
+# Longest import each entry point may take, in milliseconds
+BUDGET_MS = 50.0
+
+# Entry points that must start without loading any heavy module; tests/test_startup_budget.py checks them too
+LIGHT_ENTRY_POINTS = [
+    'generate_complete_report',
+    'report',
+    'acknowledgement',
+    'create_index',
+    'merge_pdfs',
+    'create_final_report',
+]
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = sorted(m for m in {heavy!r} if m in sys.modules)
+print(json.dumps({{"import_ms": elapsed * 1000, "heavy": heavy}}))
+'''
+
+def probe(module):
+    """Import module in a fresh interpreter and report its import time and heavy imports."""
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=REPORT_DIR, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout)
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the report scripts start within their time budget.")
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS,
+                        help="maximum import time for each entry point")
+    parser.add_argument("--runs", type=int, default=5, help="imports per entry point (best is kept)")
+    args = parser.parse_args()
+
+    failures = []
+    for module in LIGHT_ENTRY_POINTS:
+        results = [probe(module) for _ in range(args.runs)]
+        import_ms = min(r['import_ms'] for r in results)
+        heavy = results[0]['heavy']
+        status = 'ok'
+        if heavy:
+            status = f"imports {', '.join(heavy)}"
+            failures.append(module)
+        elif import_ms > args.budget_ms:
+            status = f"over budget ({args.budget_ms:.0f} ms)"
+            failures.append(module)
+        print(f"{module:<28} {import_ms:7.1f} ms  {status}")
+
+    if failures:
+        print(f"\nStartup budget exceeded by: {', '.join(failures)}")
+        sys.exit(1)
+    print("\nAll entry points are within the startup budget.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# REPORT_CACHE_DIR lets benchmarks and batch runs keep their caches elsewhere
+CACHE_DIR = os.environ.get('REPORT_CACHE_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+
+# Entries also kept in process memory, keyed by (cache path, key); see keep_in_memory
+_memory = None
+_memory_max_entries = 0
+_memory_lock = threading.Lock()
+
+def keep_in_memory(max_entries=4096):
+    """
+    Keep cache entries in process memory as well as on disk, for long-running
+    processes such as the watch mode. Values handed out are shared and must
+    not be modified.
+    """
+    global _memory, _memory_max_entries
+    if _memory is None:
+        _memory = OrderedDict()
+    _memory_max_entries = max_entries
+
+def _recall(memory_key):
+    with _memory_lock:
+        value = _memory.get(memory_key)
+        if value is not None:
+            _memory.move_to_end(memory_key)
+        return value
+
+def _remember(memory_key, value):
+    with _memory_lock:
+        _memory[memory_key] = value
+        _memory.move_to_end(memory_key)
+        while len(_memory) > _memory_max_entries:
+            _memory.popitem(last=False)
+
+def hash_bytes(*parts):
+    """Return a sha256 hex digest over one or more bytes/str parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        digest.update(part)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+def hash_file(path):
+    """Return the sha256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class BuildCache:
+    """
+    Persistent key/value store under .cache/<name>/, one JSON file per key.
+    Keys are content hashes, so entries never go stale; once the directory
+    grows past max_bytes the least recently used entries are evicted.
+    """
+    def __init__(self, name, max_bytes=32 * 1024 * 1024, cache_dir=CACHE_DIR):
+        self.path = os.path.join(cache_dir, name)
+        self.max_bytes = max_bytes
+        self._size = None
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, f"{key}.json")
+
+    def get(self, key):
+        """Return the cached value for key, or None if it is not cached."""
+        if _memory is not None:
+            value = _recall((self.path, key))
+            if value is not None:
+                self.hits += 1
+                return value
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        # Touch the entry so eviction sees it as recently used
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        self.hits += 1
+        if _memory is not None:
+            _remember((self.path, key), value)
+        return value
+
+    def put(self, key, value):
+        """Store a JSON-serialisable value under key."""
+        os.makedirs(self.path, exist_ok=True)
+        entry_path = self._entry_path(key)
+        data = json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+        # Write to a temporary file first so readers never see partial entries
+        tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, entry_path)
+        if _memory is not None:
+            _remember((self.path, key), value)
+
+        if self._size is None:
+            self._size = self._disk_usage()
+        else:
+            self._size += len(data)
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def file_path(self, key, suffix):
+        """Return the path of a file stored alongside the entry for key."""
+        return os.path.join(self.path, f"{key}{suffix}")
+
+    def get_file(self, key, suffix):
+        """Return the path of a cached file for key, or None if it is not cached."""
+        path = self.file_path(key, suffix)
+        try:
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def put_file(self, key, suffix, src_path):
+        """Move a finished file into the cache under key and return its new path."""
+        os.makedirs(self.path, exist_ok=True)
+        path = self.file_path(key, suffix)
+        os.replace(src_path, path)
+        if self._size is None:
+            self._size = self._disk_usage()
+        else:
+            self._size += os.path.getsize(path)
+        if self._size > self.max_bytes:
+            self._evict()
+        return path
+
+    def _entries(self):
+        entries = []
+        if not os.path.isdir(self.path):
+            return entries
+        for name in os.listdir(self.path):
+            if name.endswith('.tmp'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.path, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def _disk_usage(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits in half its budget."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes // 2
+        for _, size, name in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                continue
+            total -= size
+        self._size = total
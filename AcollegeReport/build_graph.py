@@ -0,0 +1,195 @@
+import json
+import multiprocessing
+import os
+import pickle
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.connection import wait
+import tracing
+from build_cache import CACHE_DIR, hash_bytes, hash_file
+
+STATE_PATH = os.path.join(CACHE_DIR, 'build_state.json')
+
+def _expand_paths(paths):
+    """Expand directories into the sorted list of files below them."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                files.extend(os.path.join(root, name) for name in sorted(names))
+        else:
+            files.append(path)
+    return files
+
+class Stage:
+    """One step of the build: a callable plus the files it reads and writes."""
+    def __init__(self, name, func, inputs=(), outputs=(), code=(), deps=(), params=None, description=None):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.code = list(code)
+        self.deps = list(deps)
+        self.params = params or {}
+        self.description = description or name
+
+    def fingerprint(self):
+        """Hash the stage's inputs, code and parameters."""
+        parts = [self.name, json.dumps(self.params, sort_keys=True)]
+        for path in _expand_paths(self.inputs + self.code):
+            file_hash = hash_file(path) if os.path.exists(path) else 'missing'
+            parts.append(f"{path}:{file_hash}")
+        return hash_bytes(*parts)
+
+    def outputs_exist(self):
+        return all(os.path.exists(path) for path in self.outputs)
+
+    def run(self):
+        with tracing.span(self.name, 'stage', memory=True):
+            return self.func()
+
+def process_pool(jobs, **kw):
+    """
+    Return a process pool for the work inside a stage. Workers are started
+    fresh (spawn) rather than forked, since forking a process that already
+    runs threads (such as a pool's own manager thread) can deadlock.
+    """
+    return ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('spawn'), **kw)
+
+def _run_stage_process(stage, conn, trace=None):
+    """Run a stage in a child process and send back whether it succeeded and what it traced."""
+    if trace and not tracing.enabled():
+        # A spawned child starts without the parent's tracer
+        tracing.resume(trace)
+    mark = tracing.mark()
+    error = None
+    try:
+        ok = stage.run() is not False
+    except Exception:
+        ok, error = False, traceback.format_exc()
+    conn.send((ok, error, tracing.events_since(mark, f"stage {stage.name}")))
+    conn.close()
+
+class BuildGraph:
+    """
+    Runs stages in dependency order. With more than one job, every stage
+    runs in a process of its own, so independent stages really run in
+    parallel (the rendering is CPU-bound Python). Where fork is available
+    the processes are forked from this one and start with the modules and
+    caches it has warmed; elsewhere they are spawned, which needs stages
+    that can be pickled. With one job, stages run here one after the other. A stage is skipped when its fingerprint
+    matches the last successful run and its outputs are still on disk.
+    """
+    def __init__(self, stages, state_path=STATE_PATH):
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_path = state_path
+        for stage in stages:
+            for dep in stage.deps:
+                if dep not in self.stages:
+                    raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dep}'")
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, state):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+    def run(self, jobs=1, force=False):
+        """
+        Run every stage and return a dict of stage name -> result, where the
+        result is 'built', 'up to date', 'failed' or 'blocked'.
+        """
+        state = self._load_state()
+        pending = dict(self.stages)
+        results = {}
+        parallel = jobs > 1
+        method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+        context = multiprocessing.get_context(method)
+        trace = None
+        if parallel and method != 'fork':
+            try:
+                pickle.dumps(list(self.stages.values()))
+            except Exception as e:
+                print(f"Warning: Running stages one at a time: without fork they are pickled into "
+                      f"new processes, and that failed ({e})")
+                parallel = False
+            trace = tracing.settings()
+        running = {}
+
+        def finish(stage, fingerprint, ok, error=None):
+            if error:
+                print(f"Error in stage '{stage.name}':\n{error}")
+            if ok:
+                results[stage.name] = 'built'
+                state[stage.name] = fingerprint
+            else:
+                results[stage.name] = 'failed'
+                state.pop(stage.name, None)
+            self._save_state(state)
+
+        while pending or running:
+            ready = [stage for stage in pending.values()
+                     if all(dep in results for dep in stage.deps)]
+
+            for stage in ready:
+                # Wait for a free job before starting another stage
+                if parallel and len(running) >= jobs:
+                    break
+                del pending[stage.name]
+
+                # Don't run anything downstream of a failure
+                if any(results[dep] in ('failed', 'blocked') for dep in stage.deps):
+                    print(f"Skipping {stage.name} stage: a required stage failed.")
+                    results[stage.name] = 'blocked'
+                    continue
+
+                fingerprint = stage.fingerprint()
+                if not force and state.get(stage.name) == fingerprint and stage.outputs_exist():
+                    print(f"Skipping {stage.name} stage: inputs unchanged.")
+                    results[stage.name] = 'up to date'
+                    continue
+
+                print(f"{stage.description}...")
+                if not parallel:
+                    try:
+                        ok, error = stage.run() is not False, None
+                    except Exception:
+                        ok, error = False, traceback.format_exc()
+                    finish(stage, fingerprint, ok, error)
+                    continue
+                receiver, sender = context.Pipe(duplex=False)
+                process = context.Process(target=_run_stage_process, args=(stage, sender, trace),
+                                          name=stage.name)
+                process.start()
+                sender.close()
+                running[receiver] = (process, stage, fingerprint)
+
+            if not running:
+                if pending and not ready:
+                    names = ', '.join(sorted(pending))
+                    raise ValueError(f"Dependency cycle between stages: {names}")
+                continue
+
+            for receiver in wait(list(running)):
+                process, stage, fingerprint = running.pop(receiver)
+                try:
+                    ok, error, recorded = receiver.recv()
+                except EOFError:
+                    ok, error, recorded = False, None, None
+                receiver.close()
+                process.join()
+                if recorded is None and not ok and process.exitcode:
+                    error = f"stage process exited with code {process.exitcode}"
+                tracing.merge(recorded)
+                finish(stage, fingerprint, ok, error)
+
+        return results
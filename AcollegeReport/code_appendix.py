@@ -0,0 +1,230 @@
+import os
+import sys
+from html import escape
+from reportlab.lib import colors
+from reportlab.platypus import Flowable, Paragraph
+from build_cache import BuildCache, hash_bytes, hash_file
+from build_graph import process_pool
+from report_styles import CODE_COLORS, frame_size, get_styles, make_doc_template
+
+# Bump when tokenization changes so cached listings are rebuilt
+TOKEN_FORMAT_VERSION = 1
+
+# The app sources live next to this directory
+DEFAULT_SOURCE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lib')
+
+SOURCE_EXTENSIONS = ('.dart',)
+
+# Heading of the appendix; the index points at its page
+CODE_APPENDIX_TITLE = "Implementation Code"
+
+TAB_SIZE = 4
+
+# Pygments token types (most specific first) and the kind they are coloured as
+TOKEN_KINDS = [
+    ('Comment', 'comment'),
+    ('Literal.String', 'string'),
+    ('Literal.Number', 'number'),
+    ('Keyword', 'keyword'),
+    ('Name.Builtin', 'builtin'),
+    ('Name.Decorator', 'builtin'),
+    ('Name.Function', 'function'),
+    ('Name.Class', 'class'),
+]
+
+def list_source_files(source_dir, extensions=SOURCE_EXTENSIONS):
+    """Return the source files below source_dir in a stable order."""
+    files = []
+    for root, dirs, names in os.walk(source_dir):
+        dirs.sort()
+        files.extend(os.path.join(root, name) for name in sorted(names) if name.endswith(extensions))
+    return files
+
+def _lexer_for(path):
+    """Return a Pygments lexer for path, or None if Pygments isn't installed or knows no lexer."""
+    try:
+        from pygments.lexers import get_lexer_for_filename
+        from pygments.util import ClassNotFound
+    except ImportError:
+        return None
+    try:
+        # Keep leading and trailing blank lines so line numbers match the file
+        return get_lexer_for_filename(path, stripnl=False, ensurenl=False)
+    except ClassNotFound:
+        return None
+
+def _token_kinds():
+    from pygments.token import string_to_tokentype
+    return [(string_to_tokentype(name), kind) for name, kind in TOKEN_KINDS]
+
+def tokenize_source(path):
+    """
+    Split a source file into lines of [kind, text] runs, where kind is one of
+    the TOKEN_KINDS kinds or '' for plain text.
+    """
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        text = f.read().expandtabs(TAB_SIZE)
+
+    lexer = _lexer_for(path)
+    if lexer is None:
+        return [[['', line]] if line else [] for line in text.split('\n')]
+
+    kinds = _token_kinds()
+    lines = [[]]
+    for ttype, value in lexer.get_tokens(text):
+        kind = next((kind for parent, kind in kinds if ttype in parent), '')
+        for i, part in enumerate(value.split('\n')):
+            if i:
+                lines.append([])
+            if not part:
+                continue
+            runs = lines[-1]
+            if runs and runs[-1][0] == kind:
+                runs[-1][1] += part
+            else:
+                runs.append([kind, part])
+    if not lines[-1] and len(lines) > 1:
+        lines.pop()
+    return lines
+
+def _tokenizer_version():
+    try:
+        import pygments
+    except ImportError:
+        return 'plain'
+    return pygments.__version__
+
+def tokenize_files(paths, jobs=None, use_cache=True):
+    """
+    Return the tokenized lines of every file in paths. Results are cached by
+    file hash, so an unchanged file is never tokenized again; the rest are
+    tokenized on a process pool.
+    """
+    cache = BuildCache('code', max_bytes=128 * 1024 * 1024) if use_cache else None
+    version = _tokenizer_version()
+    keys = [hash_bytes(hash_file(path), os.path.splitext(path)[1], version, str(TOKEN_FORMAT_VERSION))
+            for path in paths]
+    results = [cache.get(key) if cache is not None else None for key in keys]
+
+    missing = [i for i, lines in enumerate(results) if lines is None]
+    jobs = min(jobs or os.cpu_count() or 1, len(missing))
+    missing_paths = [paths[i] for i in missing]
+    if jobs <= 1:
+        tokenized = list(map(tokenize_source, missing_paths))
+    else:
+        with process_pool(jobs) as pool:
+            tokenized = list(pool.map(tokenize_source, missing_paths, chunksize=max(1, len(missing_paths) // (jobs * 4))))
+
+    for i, lines in zip(missing, tokenized):
+        results[i] = lines
+        if cache is not None:
+            cache.put(keys[i], lines)
+    print(f"Code tokenized: {len(paths)} files, {len(missing)} not cached")
+    return results
+
+def listing_rows(lines, columns):
+    """
+    Turn tokenized lines into display rows of (line number, runs), breaking
+    lines longer than columns characters onto continuation rows without a number.
+    """
+    rows = []
+    for number, runs in enumerate(lines, 1):
+        row = []
+        used = 0
+        for kind, text in runs:
+            while used + len(text) > columns:
+                cut = columns - used
+                row.append((kind, text[:cut]))
+                rows.append((number, row))
+                number, row, used, text = None, [], 0, text[cut:]
+            if text:
+                row.append((kind, text))
+                used += len(text)
+        rows.append((number, row))
+    return rows
+
+# Fill colours of the token kinds, resolved once
+_COLORS = {kind: colors.HexColor(value) for kind, value in CODE_COLORS.items()}
+
+class CodeListing(Flowable):
+    """
+    A syntax-highlighted listing with line numbers. It is drawn row by row
+    with one text object and splits between any two rows, so files of any
+    length flow across pages.
+    """
+    def __init__(self, rows, style, number_width):
+        Flowable.__init__(self)
+        self.rows = rows
+        self.style = style
+        self.number_width = number_width
+
+    def wrap(self, availWidth, availHeight):
+        self.width = availWidth
+        self.height = len(self.rows) * self.style.leading
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        n = int(availHeight // self.style.leading)
+        if n < 1 or n >= len(self.rows):
+            return []
+        return [CodeListing(self.rows[:n], self.style, self.number_width),
+                CodeListing(self.rows[n:], self.style, self.number_width)]
+
+    def draw(self):
+        style = self.style
+        char_width = 0.6 * style.fontSize  # Courier
+        gutter = (self.number_width + 1) * char_width
+        text = self.canv.beginText()
+        text.setFont(style.fontName, style.fontSize)
+        current = None
+        y = self.height - style.leading + (style.leading - style.fontSize) / 2 + 0.2 * style.fontSize
+        for number, runs in self.rows:
+            if number is not None:
+                text.setTextOrigin(0, y)
+                if current != 'line_number':
+                    text.setFillColor(_COLORS['line_number'])
+                    current = 'line_number'
+                text.textOut(str(number).rjust(self.number_width))
+            text.setTextOrigin(gutter, y)
+            for kind, run in runs:
+                if kind != current:
+                    text.setFillColor(_COLORS.get(kind, _COLORS['']))
+                    current = kind
+                text.textOut(run)
+            y -= style.leading
+        self.canv.drawText(text)
+
+def code_appendix_flowables(source_dir, styles, jobs=None, use_cache=True):
+    """Return the appendix title and a listing per source file below source_dir."""
+    paths = list_source_files(source_dir)
+    style = styles['CodeListing']
+    content = [Paragraph(CODE_APPENDIX_TITLE, styles['CustomTitle'])]
+    for path, lines in zip(paths, tokenize_files(paths, jobs, use_cache)):
+        number_width = len(str(len(lines)))
+        columns = int(frame_size()[0] / (0.6 * style.fontSize)) - number_width - 1
+        content.append(Paragraph(escape(os.path.relpath(path, os.path.dirname(source_dir))), styles['CodeFile']))
+        content.append(CodeListing(listing_rows(lines, columns), style, number_width))
+    return content
+
+def create_code_appendix(output_path, source_dir=DEFAULT_SOURCE_DIR, jobs=None, use_cache=True):
+    """Create a PDF listing the source files below source_dir."""
+    from report import DocTemplate
+
+    # Set up the document
+    doc = make_doc_template(output_path, doc_class=DocTemplate)
+
+    # Get the styles
+    styles = get_styles()
+
+    # Build the PDF
+    doc.build(code_appendix_flowables(source_dir, styles, jobs, use_cache))
+    print(f"Code appendix generated at: {output_path} ({doc.page_count} pages)")
+    return doc.page_count
+
+if __name__ == "__main__":
+    source_dir = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_SOURCE_DIR
+    if not os.path.isdir(source_dir):
+        print(f"Error: Source directory not found at {source_dir}")
+        sys.exit(1)
+    output_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "code_appendix.pdf")
+    create_code_appendix(output_path, source_dir)
@@ -1,34 +1,64 @@
 import os
-from PyPDF2 import PdfMerger, PdfReader
+import sys
 
-def combine_pdfs(output_path, report_pdf_path, acknowledgement_pdf_path, index_pdf_path):
+def combine_pdfs(output_path, report_pdf_path, acknowledgement_pdf_path, index_pdf_path, optimize=True,
+                 code_appendix_pdf_path=None, incremental=False, data_appendix_pdf_path=None, linearize=False):
     """
     Combine PDFs in the following order:
     1. Cover page from projectReport.pdf
     2. Index page
     3. Acknowledgement page
     4. Rest of projectReport.pdf (skipping cover page)
+    5. Code appendix, if given
+    6. Data appendix, if given
+
+    With optimize, objects repeated across the PDFs (fonts, images) are written
+    once and streams are stored compressed.
+
+    With incremental, only the pages that changed since the last build are
+    appended to the existing output as an update section (see pdf_update).
+
+    With linearize, the output is written linearized ("fast web view") so a
+    viewer can show the cover before the rest of the file has arrived; it is
+    checked afterwards. Updates appended later would undo that, so it can't
+    be combined with incremental.
     """
-    merger = PdfMerger()
-    
-    # Add first page from project report (cover page)
-    report_reader = PdfReader(report_pdf_path)
-    merger.append(report_reader, pages=(0, 1))
-    
-    # Add index page
-    merger.append(index_pdf_path)
-    
-    # Add acknowledgement page
-    merger.append(acknowledgement_pdf_path)
+    if incremental and linearize:
+        raise ValueError("Incremental updates can't keep a PDF linearized")
+    from pdf_assembly import assemble_pdf, format_savings, format_stats
     
-    # Add rest of the report (skip first page)
-    merger.append(report_reader, pages=(1, len(report_reader.pages)))
-    
-    # Write the merged PDF to file
-    merger.write(output_path)
-    merger.close()
+    parts = [
+        (report_pdf_path, 0, 1),
+        (index_pdf_path, 0, None),
+        (acknowledgement_pdf_path, 0, None),
+        (report_pdf_path, 1, None),
+    ]
+    if code_appendix_pdf_path:
+        parts.append((code_appendix_pdf_path, 0, None))
+    if data_appendix_pdf_path:
+        parts.append((data_appendix_pdf_path, 0, None))
+    if incremental:
+        from pdf_update import format_update, update_pdf
+        stats = update_pdf(output_path, parts)
+        print(f"Final report updated at: {output_path}")
+        print(f"  {format_update(stats)}")
+        return stats
+    stats = assemble_pdf(output_path, parts, optimize=optimize, linearize=linearize)
     
     print(f"Final report generated successfully at: {output_path}")
+    print(f"  {format_stats(stats)}")
+    if optimize:
+        print(f"  Optimized: {format_savings(stats)}")
+    if linearize:
+        from pdf_linearize import check_linearization, format_linearization
+        check = check_linearization(output_path)
+        print(f"  Linearized: {format_linearization(check)}")
+        if check['problems']:
+            print(f"Warning: {output_path} is not a valid linearized PDF")
+    if stats['unsubset_fonts']:
+        print(f"Warning: Fonts embedded in full instead of as subsets, copied as they are: "
+              f"{', '.join(stats['unsubset_fonts'])}")
+    return stats
 
 def main():
     # Define paths
@@ -37,6 +67,10 @@ def main():
     acknowledgement_pdf_path = os.path.join(dir_path, "acknowledgement.pdf")
     index_pdf_path = os.path.join(dir_path, "index.pdf")
     final_report_path = os.path.join(dir_path, "finalReport.pdf")
+    # Optional: only appended with --code-appendix, so a stale appendix isn't picked up
+    code_appendix_pdf_path = os.path.join(dir_path, "code_appendix.pdf") if '--code-appendix' in sys.argv[1:] else None
+    # Optional: only appended with --data-appendix
+    data_appendix_pdf_path = os.path.join(dir_path, "data_appendix.pdf") if '--data-appendix' in sys.argv[1:] else None
     
     # Check if necessary files exist
     missing_files = []
@@ -50,6 +84,12 @@ def main():
     if not os.path.exists(index_pdf_path):
         missing_files.append(f"Index (index.pdf)")
     
+    if code_appendix_pdf_path and not os.path.exists(code_appendix_pdf_path):
+        missing_files.append(f"Code appendix (code_appendix.pdf)")
+    
+    if data_appendix_pdf_path and not os.path.exists(data_appendix_pdf_path):
+        missing_files.append(f"Data appendix (data_appendix.pdf)")
+    
     if missing_files:
         print("Error: The following required files are missing:")
         for file in missing_files:
@@ -61,10 +101,25 @@ def main():
             print("- acknowledgement.py")
         if "Index" in str(missing_files):
             print("- create_index.py")
+        if "Code appendix" in str(missing_files):
+            print("- code_appendix.py")
+        if "Data appendix" in str(missing_files):
+            print("- data_tables.py")
+        return False
+    
+    incremental = '--incremental' in sys.argv[1:]
+    linearize = '--linearize' in sys.argv[1:]
+    if incremental and linearize:
+        print("Error: --incremental and --linearize can't be combined")
         return False
     
-    # Combine PDFs
-    combine_pdfs(final_report_path, report_pdf_path, acknowledgement_pdf_path, index_pdf_path)
+    # Combine PDFs; --incremental appends only the changed pages to the existing finalReport.pdf,
+    # --linearize writes it so the cover shows before the whole file has been downloaded
+    combine_pdfs(final_report_path, report_pdf_path, acknowledgement_pdf_path, index_pdf_path,
+                 code_appendix_pdf_path=code_appendix_pdf_path,
+                 incremental=incremental,
+                 data_appendix_pdf_path=data_appendix_pdf_path,
+                 linearize=linearize)
     return True
 
 if __name__ == "__main__":
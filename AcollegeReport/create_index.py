@@ -1,15 +1,48 @@
 import os
-from PyPDF2 import PdfReader
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
 import re
+from heading_manifest import heading_manifest_path, load_heading_manifest
+from report_styles import get_styles, make_doc_template
+
+def headings_from_manifest(pdf_path, first_page=1):
+    """Return top-level (heading, page) pairs from the manifest written at render time."""
+    entries = load_heading_manifest(heading_manifest_path(pdf_path), pdf_path)
+    if not entries:
+        return None
+    return [(text, page) for level, text, page, _ in entries if level == 0 and page >= first_page]
+
+def headings_from_outline(reader, first_page=1):
+    """Return top-level (heading, page) pairs from the PDF's bookmarks."""
+    headings = []
+    for item in reader.outline:
+        # Nested lists hold the children of the previous entry
+        if isinstance(item, list):
+            continue
+        page = reader.get_destination_page_number(item) + 1
+        if page >= first_page:
+            headings.append((item.title, page))
+    return headings
 
 def extract_headings(pdf_path):
     """Extract headings from a PDF file."""
+    # Skip first page for projectReport.pdf
+    start_page = 1 if "projectReport" in pdf_path else 0
+    
+    # Prefer the exact heading/page map recorded when the PDF was rendered
+    headings = headings_from_manifest(pdf_path, start_page + 1)
+    if headings:
+        return headings
+    
+    from PyPDF2 import PdfReader
     reader = PdfReader(pdf_path)
+    headings = headings_from_outline(reader, start_page + 1)
+    if headings:
+        return headings
+    
+    # No outline: fall back to guessing headings from the page text
+    return extract_headings_from_text(reader, pdf_path)
+
+def extract_headings_from_text(reader, pdf_path):
+    """Guess one heading per page from the first short line of its text."""
     headings = []
     
     # Skip first page for projectReport.pdf
@@ -18,10 +51,11 @@ def extract_headings(pdf_path):
     # Only examine pages 1-20 for headings, as specified by the user
     end_page = min(20, len(reader.pages)) if "projectReport" in pdf_path else len(reader.pages)
     
-    for i in range(start_page, end_page):
-        page = reader.pages[i]
-        text = page.extract_text()
-        
+    # Page text is extracted in parallel and cached per file hash and page
+    from text_extraction import extract_page_texts
+    page_texts = extract_page_texts(pdf_path, start_page, end_page)
+    
+    for i, text in zip(range(start_page, end_page), page_texts):
         # Try to find the main heading on each page
         lines = text.split('\n')
         if lines:
@@ -34,56 +68,14 @@ def extract_headings(pdf_path):
     
     return headings
 
-def create_index_pdf(output_path, report_pdf_path, acknowledgement_pdf_path):
-    """Create an index PDF with entries from both PDFs."""
-    # Get headings from both PDFs
-    report_headings = extract_headings(report_pdf_path)
-    ack_headings = extract_headings(acknowledgement_pdf_path)
-    
-    # Set up the document
-    doc = SimpleDocTemplate(
-        output_path,
-        pagesize=A4,
-        rightMargin=60,
-        leftMargin=60,
-        topMargin=50,
-        bottomMargin=50
-    )
-    
-    # Get the styles
-    styles = getSampleStyleSheet()
-    
-    # Create custom styles with improved formatting
-    styles.add(ParagraphStyle(
-        name='IndexTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        alignment=TA_CENTER,
-        spaceAfter=15,
-        fontName='Helvetica-Bold'
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='IndexEntry',
-        parent=styles['Normal'],
-        fontSize=10,
-        leading=12,
-        alignment=TA_LEFT,
-        spaceAfter=2,
-        leftIndent=20,
-        fontName='Helvetica'
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='IndexSection',
-        parent=styles['Heading2'],
-        fontSize=12,
-        leading=14,
-        alignment=TA_LEFT,
-        spaceBefore=6,
-        spaceAfter=3,
-        fontName='Helvetica-Bold'
-    ))
+def index_flowables(styles, report_headings, acknowledgement_page=None, code_page=None):
+    """
+    Return the flowables of the index page for (heading, page) pairs of the
+    report, with an acknowledgement entry if its page is given and the first
+    page of the code appendix if there is one.
+    """
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Paragraph, Spacer
     
     # List of content to add to the PDF
     content = []
@@ -94,9 +86,9 @@ def create_index_pdf(output_path, report_pdf_path, acknowledgement_pdf_path):
     content.append(Spacer(1, 0.1*inch))
     
     # 1. Add acknowledgement entry if available
-    if ack_headings:
+    if acknowledgement_page is not None:
         content.append(Paragraph("ACKNOWLEDGEMENT", styles['IndexSection']))
-        content.append(Paragraph(f"Acknowledgement ................................. Page 1", styles['IndexEntry']))
+        content.append(Paragraph(f"Acknowledgement ................................. Page {acknowledgement_page}", styles['IndexEntry']))
     
     # 2. Add report entries (pages 1-20)
     content.append(Paragraph("PROJECT REPORT", styles['IndexSection']))
@@ -115,10 +107,29 @@ def create_index_pdf(output_path, report_pdf_path, acknowledgement_pdf_path):
     
     # 4. Add code section (starting from page 36)
     content.append(Paragraph("CODE", styles['IndexSection']))
-    content.append(Paragraph(f"Implementation Code ............................ Page 36", styles['IndexEntry']))
+    content.append(Paragraph(f"Implementation Code ............................ Page {code_page or 36}", styles['IndexEntry']))
+    return content
+
+def create_index_pdf(output_path, report_pdf_path, acknowledgement_pdf_path, code_appendix_pdf_path=None):
+    """Create an index PDF with entries from both PDFs."""
+    # Get headings from both PDFs
+    report_headings = extract_headings(report_pdf_path)
+    ack_headings = extract_headings(acknowledgement_pdf_path)
+    
+    # The code appendix follows the report, so it starts on the page after its last one
+    code_page = None
+    if code_appendix_pdf_path and os.path.exists(code_appendix_pdf_path):
+        from PyPDF2 import PdfReader
+        code_page = len(PdfReader(report_pdf_path).pages) + 1
+    
+    # Set up the document
+    doc = make_doc_template(output_path, layout='index')
+    
+    # Get the shared styles (IndexTitle, IndexEntry, IndexSection)
+    styles = get_styles()
     
     # Build the PDF
-    doc.build(content)
+    doc.build(index_flowables(styles, report_headings, 1 if ack_headings else None, code_page))
     print(f"Index page generated at: {output_path}")
 
 if __name__ == "__main__":
@@ -127,6 +138,7 @@ if __name__ == "__main__":
     report_pdf_path = os.path.join(dir_path, "projectReport.pdf")
     acknowledgement_pdf_path = os.path.join(dir_path, "acknowledgement.pdf")
     index_pdf_path = os.path.join(dir_path, "index.pdf")
+    code_appendix_pdf_path = os.path.join(dir_path, "code_appendix.pdf")
     
     # Check if necessary files exist
     if not os.path.exists(report_pdf_path):
@@ -140,4 +152,4 @@ if __name__ == "__main__":
         exit(1)
     
     # Create the index PDF
-    create_index_pdf(index_pdf_path, report_pdf_path, acknowledgement_pdf_path)
\ No newline at end of file
+    create_index_pdf(index_pdf_path, report_pdf_path, acknowledgement_pdf_path, code_appendix_pdf_path)
\ No newline at end of file
@@ -0,0 +1,381 @@
+import csv
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from itertools import islice
+from reportlab.lib import colors
+from reportlab.platypus import Flowable, LongTable, Paragraph, TableStyle
+from reportlab.platypus.doctemplate import NullActionFlowable
+from report_styles import DATA_TABLE_COLORS, frame_size, get_styles, make_doc_template
+
+# Database exports (inventory, sales, employees) live next to the report scripts
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+DATA_EXTENSIONS = ('.csv', '.jsonl', '.json')
+
+# Heading of the appendix
+DATA_APPENDIX_TITLE = "Data Appendix"
+
+# Rows read up front to size the columns
+SAMPLE_ROWS = 200
+
+# Rows laid out per volume; the canvas keeps every page of a volume until it is
+# saved, so the volumes are built one at a time and joined afterwards
+VOLUME_ROWS = 20000
+
+# Column a JSON object's keys (Firebase record IDs) are shown in
+KEY_COLUMN = 'id'
+
+JSON_BLOCK_SIZE = 1 << 16
+
+def list_data_files(data_dir):
+    """Return the export files in data_dir in a stable order."""
+    return [os.path.join(data_dir, name) for name in sorted(os.listdir(data_dir)) if name.endswith(DATA_EXTENSIONS)]
+
+def iter_json_items(f, block_size=JSON_BLOCK_SIZE):
+    """
+    Yield (key, value) for each item of the top-level array (key None) or
+    object in a JSON file, reading it in blocks so the whole file is never
+    in memory at once.
+    """
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    eof = False
+
+    def more():
+        nonlocal buf, pos, eof
+        block = f.read(block_size)
+        eof = not block
+        buf, pos = buf[pos:] + block, 0
+        return not eof
+
+    def skip_space():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buf) or not more():
+                return
+
+    def decode():
+        nonlocal pos
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                # The value continues in the next block
+                if not more():
+                    raise
+                continue
+            # A number at the end of the buffer may go on in the next block, even
+            # when the block ends on its decimal point or exponent
+            if not eof and not buf[end:].lstrip('0123456789+-.eE') and more():
+                continue
+            pos = end
+            return value
+
+    def expect(chars):
+        nonlocal pos
+        skip_space()
+        char = buf[pos:pos + 1]
+        if not char or char not in chars:
+            raise ValueError(f"Expected one of {chars!r} at offset {pos} of the block, found {char!r}")
+        pos += 1
+        return char
+
+    opener = expect('[{')
+    closer = ']' if opener == '[' else '}'
+    skip_space()
+    if buf[pos:pos + 1] == closer:
+        return
+    while True:
+        key = None
+        if opener == '{':
+            skip_space()
+            key = decode()
+            expect(':')
+        skip_space()
+        yield key, decode()
+        if expect(',' + closer) == closer:
+            return
+
+def _records(path):
+    """Yield the records of a JSON or JSONL export as dicts."""
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    yield record if isinstance(record, dict) else {'value': record}
+            return
+        for key, value in iter_json_items(f):
+            record = value if isinstance(value, dict) else {'value': value}
+            # Firebase exports are objects keyed by record ID
+            yield record if key is None else dict({KEY_COLUMN: key}, **record)
+
+def format_value(value):
+    """Return the text a cell shows for a value from an export."""
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'yes' if value else 'no'
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    if isinstance(value, dict):
+        # Nested records such as an employee's attendance
+        return f"{len(value)} entries"
+    if isinstance(value, list):
+        return f"{len(value)} items"
+    return ' '.join(str(value).split())
+
+def _is_number(text):
+    try:
+        float(text.replace(',', ''))
+    except ValueError:
+        return False
+    return True
+
+class DataSource:
+    """
+    One export file. Its columns come from the CSV header or, for JSON, from
+    the keys of all records in the order they first appear; rows() reads it
+    from the start again every time it is called.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.columns = self._columns()
+        self.rows_read = 0
+        # StreamingTable left at the end of a full volume
+        self.pending = None
+
+    def _columns(self):
+        if self.path.endswith('.csv'):
+            with open(self.path, 'r', encoding='utf-8', newline='') as f:
+                return next(csv.reader(f), [])
+        # Records may leave out keys, so one streaming pass collects every column
+        columns = {}
+        for record in _records(self.path):
+            for column in record:
+                columns.setdefault(column, None)
+        return list(columns)
+
+    def rows(self):
+        """Yield every row as a list of cell texts, one per column."""
+        columns = self.columns
+        self.rows_read = 0
+        if self.path.endswith('.csv'):
+            with open(self.path, 'r', encoding='utf-8', newline='') as f:
+                reader = csv.reader(f)
+                next(reader, None)
+                for row in reader:
+                    if not row:
+                        continue
+                    self.rows_read += 1
+                    row = [' '.join(value.split()) for value in row[:len(columns)]]
+                    yield row + [''] * (len(columns) - len(row))
+            return
+        for record in _records(self.path):
+            self.rows_read += 1
+            yield [format_value(record.get(column)) for column in columns]
+
+class DataTableLayout:
+    """Column widths, alignment and table style of a source, worked out from a sample of its rows."""
+    def __init__(self, source, styles, width):
+        from reportlab.pdfbase.pdfmetrics import getFont
+        self.header_style = styles['DataHeader']
+        self.cell_style = styles['DataCell']
+        # Cell values are measured by the font itself, not through the shared
+        # width cache: they are mostly unique and would crowd out the report's words
+        header_font = getFont(self.header_style.fontName)
+        self.cell_font = getFont(self.cell_style.fontName)
+        padding = 6
+        rows = source.rows()
+        sample = list(islice(rows, SAMPLE_ROWS))
+        rows.close()
+        header = [column.replace('_', ' ').title() for column in source.columns]
+        self.header = header
+
+        # Widest value of each column in the sample, then scaled to fill the frame
+        natural = []
+        for i, title in enumerate(header):
+            widest = header_font.stringWidth(title, self.header_style.fontSize)
+            for row in sample:
+                widest = max(widest, self.cell_font.stringWidth(row[i], self.cell_style.fontSize))
+            natural.append(min(widest, width / 2) + padding)
+        scale = width / sum(natural) if natural else 1
+        self.col_widths = [value * scale for value in natural]
+        self.text_widths = [value - padding for value in self.col_widths]
+        self.row_height = self.cell_style.leading + 3
+
+        self.numeric = [bool(sample) and all(_is_number(row[i]) for row in sample if row[i])
+                        for i in range(len(header))]
+        commands = [
+            ('FONT', (0, 0), (-1, 0), self.header_style.fontName, self.header_style.fontSize),
+            ('FONT', (0, 1), (-1, -1), self.cell_style.fontName, self.cell_style.fontSize),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(DATA_TABLE_COLORS['header'])),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor(DATA_TABLE_COLORS['stripe'])]),
+            ('GRID', (0, 0), (-1, -1), 0.25, colors.HexColor(DATA_TABLE_COLORS['grid'])),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('TOPPADDING', (0, 0), (-1, -1), 1),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+            ('LEFTPADDING', (0, 0), (-1, -1), padding / 2),
+            ('RIGHTPADDING', (0, 0), (-1, -1), padding / 2),
+        ]
+        commands.extend(('ALIGN', (i, 0), (i, -1), 'RIGHT') for i, numeric in enumerate(self.numeric) if numeric)
+        self.style = TableStyle(commands)
+
+    def fit(self, text, i):
+        """Shorten text with an ellipsis so it stays inside column i."""
+        width = self.text_widths[i]
+        size = self.cell_style.fontSize
+        # Most values are far narrower than the column; only measure the long ones
+        if len(text) * size * 0.6 <= width:
+            return text
+        if self.cell_font.stringWidth(text, size) <= width:
+            return text
+        while text and self.cell_font.stringWidth(text + '…', size) > width:
+            text = text[:-1]
+        return text + '…'
+
+    def table(self, rows):
+        """Return a LongTable of rows with the header, which repeats on every page it spans."""
+        data = [self.header]
+        fit = self.fit
+        for row in rows:
+            data.append([fit(text, i) for i, text in enumerate(row)])
+        return LongTable(data, colWidths=self.col_widths, rowHeights=[self.row_height] * len(data),
+                         style=self.style, repeatRows=1)
+
+class StreamingTable(Flowable):
+    """
+    A table whose rows are read from an export while the document is laid
+    out. Each split takes as many rows as fit in the space left on the page
+    into a LongTable with the header row, and leaves a StreamingTable for the
+    rest, so only a page of rows is held at a time whatever the size of the
+    export. Chunks always fit where they are placed, so they are never
+    postponed (which would keep them alive until the end of the layout pass).
+
+    With a budget, the table stops after that many rows and leaves the rest
+    in source.pending for the next volume.
+    """
+    def __init__(self, source, layout, rows=None, head=(), budget=None):
+        Flowable.__init__(self)
+        self.source = source
+        self.layout = layout
+        self.rows = rows
+        self.head = list(head)
+        self.budget = budget
+
+    def wrap(self, availWidth, availHeight):
+        # Never fits whole, so the frame asks for split()
+        return availWidth, availHeight + 1
+
+    def split(self, availWidth, availHeight):
+        # Rows that fit below the header in the space left
+        fit = int(availHeight // self.layout.row_height) - 1
+        if fit < 1:
+            return []
+        if self.budget is not None:
+            fit = min(fit, self.budget)
+        rows = self.rows
+        if rows is None:
+            # The start of the table: every layout pass reads the export again
+            rows = self.source.rows()
+        chunk = self.head + list(islice(rows, fit + 1 - len(self.head)))
+        # A null action first puts the whole list back on the story instead of
+        # requiring the first part to fit in what is left of the frame
+        content = [NullActionFlowable(), self.layout.table(chunk[:fit])]
+        if len(chunk) > fit:
+            budget = None if self.budget is None else self.budget - fit
+            rest = StreamingTable(self.source, self.layout, rows, chunk[fit:], budget)
+            if budget == 0:
+                self.source.pending = rest
+            else:
+                content.append(rest)
+        return content
+
+    def drawOn(self, canvas, x, y, _sW=0):
+        pass
+
+def data_sources(data_dir):
+    """Return a DataSource for every export below data_dir that has columns."""
+    sources = []
+    for path in list_data_files(data_dir):
+        source = DataSource(path)
+        if not source.columns:
+            print(f"Warning: No columns found in {path}")
+            continue
+        sources.append(source)
+    return sources
+
+def source_flowables(source, styles, budget=None):
+    """Return the heading and streaming table of an export."""
+    title = os.path.splitext(source.name)[0].replace('_', ' ').title()
+    return [
+        Paragraph(f"{title} ({source.name})", styles['CustomHeading1']),
+        StreamingTable(source, DataTableLayout(source, styles, frame_size()[0]), budget=budget),
+    ]
+
+def create_data_appendix(output_path, data_dir=DEFAULT_DATA_DIR, volume_rows=VOLUME_ROWS):
+    """
+    Create a PDF of the exports below data_dir; returns the statistics of the run.
+
+    Every export starts a new volume, and a new volume is started after every
+    volume_rows rows. Each volume is its own document, so memory use depends on
+    volume_rows and not on the size of the exports; the volumes are then joined
+    into output_path.
+    """
+    from report import DocTemplate
+    from pdf_assembly import assemble_pdf
+
+    # Get the styles
+    styles = get_styles()
+
+    start = time.perf_counter()
+    sources = data_sources(data_dir)
+    title = [Paragraph(DATA_APPENDIX_TITLE, styles['CustomTitle'])]
+    work_dir = tempfile.mkdtemp(prefix='report-data-')
+    try:
+        parts = []
+        pages = 0
+        # Without exports the appendix is just its title
+        for source in sources or [None]:
+            story = source_flowables(source, styles, volume_rows) if source else []
+            while True:
+                if not parts:
+                    story = title + story
+                part_path = os.path.join(work_dir, f"volume_{len(parts):04d}.pdf")
+                # Build the volume; the tables are filled in while the pages are laid out
+                doc = make_doc_template(part_path, doc_class=DocTemplate)
+                doc.build(story)
+                pages += doc.page_count
+                parts.append((part_path, 0, None))
+                if source is None or source.pending is None:
+                    break
+                # Carry on with the rows the volume had no room for
+                story = [source.pending]
+                story[0].budget = volume_rows
+                source.pending = None
+        assemble_pdf(output_path, parts, optimize=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    elapsed = time.perf_counter() - start
+
+    rows = sum(source.rows_read for source in sources)
+    print(f"Data appendix generated at: {output_path} ({pages} pages, {len(sources)} tables, "
+          f"{rows} rows in {elapsed:.2f}s, {rows / elapsed:.0f} rows/s, {len(parts)} volumes)")
+    return {'pages': pages, 'tables': len(sources), 'rows': rows, 'volumes': len(parts),
+            'seconds': elapsed, 'rows_per_second': rows / elapsed if elapsed else None}
+
+if __name__ == "__main__":
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DATA_DIR
+    if not os.path.isdir(data_dir):
+        print(f"Error: Data directory not found at {data_dir}")
+        sys.exit(1)
+    output_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data_appendix.pdf")
+    create_data_appendix(output_path, data_dir)
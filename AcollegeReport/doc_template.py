@@ -0,0 +1,108 @@
+import tracing
+from reportlab.platypus import SimpleDocTemplate, Paragraph
+
+class DocTemplate(SimpleDocTemplate):
+    # Headings on pages before this one (the cover) are not listed in the TOC
+    toc_first_page = 2
+    
+    # KeywordIndex fed with the text of every flowable as it is laid out, if any
+    keyword_index = None
+    
+    def __init__(self, filename, **kw):
+        SimpleDocTemplate.__init__(self, filename, **kw)
+        self.title_list = []
+        
+    def build(self, flowables, **kw):
+        """Lay the story out once; multiBuild calls this for every pass."""
+        with tracing.span('layout pass', 'layout', memory=True, flowables=len(flowables)):
+            SimpleDocTemplate.build(self, flowables, **kw)
+        
+    def beforeDocument(self):
+        """Start every layout pass with an empty heading list."""
+        self.title_list = []
+        self.page_count = 0
+        if self.keyword_index is not None:
+            self.keyword_index.clear()
+        
+    def handle_flowable(self, flowables):
+        """Lay out the next story flowable, letting the keyword index follow the parts it is split into."""
+        if self.keyword_index is None:
+            return SimpleDocTemplate.handle_flowable(self, flowables)
+        following = flowables[1] if len(flowables) > 1 else None
+        self.keyword_index.start_flowable(flowables[0])
+        SimpleDocTemplate.handle_flowable(self, flowables)
+        # Whatever now comes before the next story flowable was split off this one
+        parts = []
+        for flowable in flowables:
+            if flowable is following:
+                break
+            parts.append(flowable)
+        self.keyword_index.add_parts(parts)
+        
+    def beforePage(self):
+        tracing.begin('page', 'layout', page=self.page)
+        
+    def afterPage(self):
+        """Keep track of how many pages have been laid out."""
+        self.page_count = self.page
+        tracing.end('page', 'layout')
+        
+    def afterFlowable(self, flowable):
+        """Register TOC entries and index the words of the flowable."""
+        if self.keyword_index is not None and self.page >= self.toc_first_page:
+            self.keyword_index.add_flowable(flowable, self.page)
+        if isinstance(flowable, Paragraph):
+            text = flowable.getPlainText()
+            style = flowable.style.name
+            if style == 'CustomTitle':
+                level = 0
+            elif style == 'CustomHeading1':
+                level = 1
+            elif style == 'CustomHeading2':
+                level = 2
+            else:
+                return
+            key = 'h%d-%s' % (level + 1, text)
+            self.title_list.append((level, text, self.page, key))
+            tracing.instant(text, 'heading', level=level, page=self.page)
+            self.canv.bookmarkPage(key)
+            self.canv.addOutlineEntry(text, key, level, 0)
+            if self.page >= self.toc_first_page:
+                self.notify('TOCEntry', (level, text, self.page, key))
+    
+    def toc_entries(self, headings):
+        """Return the recorded headings the TOC lists."""
+        # The cover page is never listed, so only seed entries the TOC itself records
+        return [entry for entry in headings if entry[2] >= self.toc_first_page]
+    
+    def singlePassBuild(self, story, toc, previous_entries):
+        """
+        Lay the story out once with the TOC pre-filled from the previous build.
+        Falls back to multiBuild only if the page numbers have shifted.
+        Returns the number of layout passes used.
+        """
+        if not previous_entries:
+            return self.multiBuild(story)
+        
+        toc._entries = self.toc_entries(previous_entries)
+        self._indexingFlowables = [flowable for flowable in story if flowable.isIndexing()]
+        for flowable in self._indexingFlowables:
+            flowable.beforeBuild()
+        self._doSave = 0
+        
+        # Collect per-pass edits (e.g. postponed flowable markers) like multiBuild does
+        edits = []
+        self._multiBuildEdits = edits.append
+        try:
+            self.build(story[:])
+        finally:
+            del self._multiBuildEdits
+        for flowable in self._indexingFlowables:
+            flowable.afterBuild()
+        for edit in edits:
+            edit[0](*edit[1:])
+        
+        if self._allSatisfied():
+            self.canv.save()
+            return 1
+        return 1 + self.multiBuild(story)
@@ -1,55 +1,252 @@
+import argparse
+import functools
 import os
-import subprocess
 import sys
+import tracing
+from build_graph import BuildGraph, Stage
 
-def run_script(script_path):
-    """Run a Python script and return True if successful."""
-    try:
-        result = subprocess.run([sys.executable, script_path], check=True)
-        return result.returncode == 0
-    except subprocess.CalledProcessError:
-        return False
-    except Exception as e:
-        print(f"Error running {script_path}: {e}")
-        return False
+def build_images(contents_dir, jobs=None):
+    from images import prepare_images
+    prepare_images(contents_dir, jobs)
+
+def build_report(output_path, sharded=False, jobs=None, keywords=False):
+    if sharded:
+        from sharded_report import create_pdf_sharded
+        create_pdf_sharded(output_path, jobs=jobs)
+    else:
+        from report import create_pdf
+        create_pdf(output_path, keywords=keywords)
+
+def build_acknowledgement(output_path):
+    from acknowledgement import create_acknowledgement
+    create_acknowledgement(output_path)
+
+def build_index(output_path, report_pdf_path, acknowledgement_pdf_path, code_appendix_pdf_path=None):
+    from create_index import create_index_pdf
+    create_index_pdf(output_path, report_pdf_path, acknowledgement_pdf_path, code_appendix_pdf_path)
+
+def build_final_report(output_path, report_pdf_path, acknowledgement_pdf_path, index_pdf_path, code_appendix_pdf_path=None,
+                       incremental=False, data_appendix_pdf_path=None, linearize=False):
+    from create_final_report import combine_pdfs
+    combine_pdfs(output_path, report_pdf_path, acknowledgement_pdf_path, index_pdf_path,
+                 code_appendix_pdf_path=code_appendix_pdf_path, incremental=incremental,
+                 data_appendix_pdf_path=data_appendix_pdf_path, linearize=linearize)
+
+def build_code_appendix(output_path, source_dir, jobs=None):
+    from code_appendix import create_code_appendix
+    create_code_appendix(output_path, source_dir, jobs)
+
+def build_data_appendix(output_path, data_dir):
+    from data_tables import create_data_appendix
+    create_data_appendix(output_path, data_dir)
+
+def build_complete_report(output_path, contents_dir, source_dir=None, jobs=None, keywords=False):
+    from single_document import create_complete_pdf
+    create_complete_pdf(output_path, contents_dir, source_dir=source_dir, jobs=jobs, keywords=keywords)
+
+def create_stages(dir_path, sharded=False, jobs=None, single_build=False, incremental=False, linearize=False,
+                  keyword_index=False):
+    """
+    Declare the report build as a graph of stages. Their functions are
+    partials of the module-level build_* functions, so a stage can be
+    pickled into a spawned process. With single_build the
+    final report is rendered as one document, without intermediate PDFs.
+    With incremental, the combine stage appends only the changed pages to the
+    existing final report. With linearize, the combine stage writes it
+    linearized for fast web view. With keyword_index, the report ends with a
+    keyword index and gets a search sidecar; sharded builds have none.
+    """
+    if keyword_index and sharded:
+        raise ValueError("A sharded build lays out each content file on its own, so it can't have a keyword index")
+    if keyword_index:
+        from keyword_index import search_index_path
+    contents_dir = os.path.join(dir_path, "contents")
+    report_pdf_path = os.path.join(dir_path, "projectReport.pdf")
+    acknowledgement_pdf_path = os.path.join(dir_path, "acknowledgement.pdf")
+    index_pdf_path = os.path.join(dir_path, "index.pdf")
+    code_appendix_pdf_path = os.path.join(dir_path, "code_appendix.pdf")
+    data_appendix_pdf_path = os.path.join(dir_path, "data_appendix.pdf")
+    final_report_path = os.path.join(dir_path, "finalReport.pdf")
+
+    # The app sources for the code appendix; without them there is no appendix
+    source_dir = os.path.join(os.path.dirname(dir_path), "lib")
+    if not os.path.isdir(source_dir):
+        source_dir = None
+
+    # Database exports for the data appendix; without them there is no appendix
+    data_dir = os.path.join(dir_path, "data")
+    if not os.path.isdir(data_dir):
+        data_dir = None
+
+    def code(*names):
+        return [os.path.join(dir_path, name) for name in names]
+
+    # Images live outside contents/, so the referenced ones are inputs too
+    from images import referenced_images
+    image_paths = referenced_images(contents_dir) if os.path.isdir(contents_dir) else []
+
+    images_stage = Stage(
+        'images',
+        functools.partial(build_images, contents_dir, jobs),
+        inputs=[contents_dir] + image_paths,
+        code=code("images.py", "report_styles.py", "text_metrics.py", "tracing.py", "build_cache.py"),
+        description="Preparing images"
+    )
+    if single_build:
+        return [
+            images_stage,
+            Stage(
+                'final',
+                functools.partial(build_complete_report, final_report_path, contents_dir, source_dir, jobs, keyword_index),
+                inputs=[contents_dir] + image_paths + ([source_dir] if source_dir else []),
+                outputs=[final_report_path] + ([search_index_path(final_report_path)] if keyword_index else []),
+                code=code("single_document.py", "report.py", "doc_template.py", "acknowledgement.py",
+                          "create_index.py", "code_appendix.py", "report_styles.py", "text_metrics.py", "tracing.py",
+                          "markdown_flowables.py", "images.py", "build_cache.py", "heading_manifest.py",
+                          "keyword_index.py"),
+                deps=['images'],
+                params={'keywords': keyword_index},
+                description="Generating complete report"
+            ),
+        ]
+
+    stages = [
+        images_stage,
+        Stage(
+            'report',
+            functools.partial(build_report, report_pdf_path, sharded, jobs, keyword_index),
+            inputs=[contents_dir] + image_paths,
+            outputs=[report_pdf_path] + ([search_index_path(report_pdf_path)] if keyword_index else []),
+            code=code("report.py", "doc_template.py", "report_styles.py", "text_metrics.py", "tracing.py",
+                      "markdown_flowables.py", "images.py", "build_cache.py", "heading_manifest.py",
+                      "sharded_report.py", "pdf_assembly.py", "keyword_index.py"),
+            deps=['images'],
+            params={'sharded': sharded, 'keywords': keyword_index},
+            description="Generating main project report"
+        ),
+        Stage(
+            'acknowledgement',
+            functools.partial(build_acknowledgement, acknowledgement_pdf_path),
+            outputs=[acknowledgement_pdf_path],
+            code=code("acknowledgement.py", "report_styles.py", "text_metrics.py", "tracing.py"),
+            description="Generating acknowledgement page"
+        ),
+    ]
+    final_inputs = [report_pdf_path, acknowledgement_pdf_path, index_pdf_path]
+    final_deps = ['report', 'acknowledgement', 'index']
+    if source_dir:
+        stages.append(Stage(
+            'code',
+            functools.partial(build_code_appendix, code_appendix_pdf_path, source_dir, jobs),
+            inputs=[source_dir],
+            outputs=[code_appendix_pdf_path],
+            code=code("code_appendix.py", "report.py", "doc_template.py", "report_styles.py", "text_metrics.py",
+                      "tracing.py", "build_cache.py"),
+            description="Generating code appendix"
+        ))
+        final_inputs.append(code_appendix_pdf_path)
+        final_deps.append('code')
+    else:
+        code_appendix_pdf_path = None
+    if data_dir:
+        stages.append(Stage(
+            'data',
+            functools.partial(build_data_appendix, data_appendix_pdf_path, data_dir),
+            inputs=[data_dir],
+            outputs=[data_appendix_pdf_path],
+            code=code("data_tables.py", "report.py", "doc_template.py", "report_styles.py", "text_metrics.py",
+                      "tracing.py", "pdf_assembly.py"),
+            description="Generating data appendix"
+        ))
+        final_inputs.append(data_appendix_pdf_path)
+        final_deps.append('data')
+    else:
+        data_appendix_pdf_path = None
+
+    stages.extend([
+        Stage(
+            'index',
+            functools.partial(build_index, index_pdf_path, report_pdf_path, acknowledgement_pdf_path,
+                              code_appendix_pdf_path),
+            inputs=[report_pdf_path, acknowledgement_pdf_path] + ([code_appendix_pdf_path] if source_dir else []),
+            outputs=[index_pdf_path],
+            code=code("create_index.py", "report_styles.py", "text_metrics.py", "tracing.py", "heading_manifest.py",
+                      "text_extraction.py", "build_cache.py"),
+            deps=['report', 'acknowledgement'] + (['code'] if source_dir else []),
+            description="Generating index page"
+        ),
+        Stage(
+            'combine',
+            functools.partial(build_final_report, final_report_path, report_pdf_path, acknowledgement_pdf_path,
+                              index_pdf_path, code_appendix_pdf_path, incremental, data_appendix_pdf_path, linearize),
+            inputs=final_inputs,
+            outputs=[final_report_path],
+            code=code("create_final_report.py", "pdf_assembly.py", "pdf_update.py", "pdf_linearize.py", "tracing.py",
+                      "build_cache.py"),
+            deps=final_deps,
+            params={'linearize': linearize},
+            description="Combining documents"
+        ),
+    ])
+    return stages
+
+def main(argv=None):
+    """Generate the complete project report with index and acknowledgement pages."""
+    parser = argparse.ArgumentParser(description="Generate the complete project report.")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1,
+                        help="number of stages to run at the same time")
+    parser.add_argument("--force", action="store_true",
+                        help="rebuild every stage even if its inputs have not changed")
+    parser.add_argument("--sharded", action="store_true",
+                        help="render each content file separately on a process pool and stitch the results")
+    parser.add_argument("--single-build", action="store_true",
+                        help="render cover, index, acknowledgement and body as one document, without intermediate PDFs")
+    parser.add_argument("--incremental", action="store_true",
+                        help="append only the changed pages to the existing finalReport.pdf, compacting it now and then")
+    parser.add_argument("--linearize", action="store_true",
+                        help="write finalReport.pdf linearized, so viewers show the cover before it has fully downloaded")
+    parser.add_argument("--keyword-index", action="store_true",
+                        help="end the report with a keyword index and write a .search.json sidecar for keyword_index.py")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="write a Chrome trace (chrome://tracing, Perfetto) of the build to PATH")
+    parser.add_argument("--trace-flowables", action="store_true",
+                        help="also time the wrap, split and draw of every flowable (slow)")
+    args = parser.parse_args(argv)
+    if args.sharded and args.single_build:
+        parser.error("--sharded and --single-build can't be combined")
+    if args.incremental and args.single_build:
+        parser.error("--incremental only applies to the combine stage, which --single-build doesn't have")
+    if args.linearize and args.single_build:
+        parser.error("--linearize only applies to the combine stage, which --single-build doesn't have")
+    if args.linearize and args.incremental:
+        parser.error("--incremental and --linearize can't be combined")
+    if args.keyword_index and args.sharded:
+        parser.error("--keyword-index needs the report laid out as one document, which --sharded doesn't do")
+    
+    if args.trace:
+        tracing.enable(args.trace, flowables=args.trace_flowables)
 
-def main():
-    """Generate the complete project report with acknowledgement page."""
     # Get the directory of this script
     dir_path = os.path.dirname(os.path.abspath(__file__))
+
+    # Run the stages, independent ones in parallel
+    graph = BuildGraph(create_stages(dir_path, sharded=args.sharded, jobs=args.jobs, single_build=args.single_build,
+                                     incremental=args.incremental, linearize=args.linearize,
+                                     keyword_index=args.keyword_index))
+    results = graph.run(jobs=args.jobs, force=args.force)
     
-    # Define paths to scripts
-    report_script = os.path.join(dir_path, "report.py")
-    acknowledgement_script = os.path.join(dir_path, "acknowledgement.py")
-    merge_script = os.path.join(dir_path, "merge_pdfs.py")
-    
-    # Check if all required scripts exist
-    for script in [report_script, acknowledgement_script, merge_script]:
-        if not os.path.exists(script):
-            print(f"Error: Required script not found: {script}")
-            return False
-    
-    # Step 1: Generate the main report
-    print("Generating main project report...")
-    if not run_script(report_script):
-        print("Error: Failed to generate main project report.")
-        return False
-    
-    # Step 2: Generate the acknowledgement page
-    print("Generating acknowledgement page...")
-    if not run_script(acknowledgement_script):
-        print("Error: Failed to generate acknowledgement page.")
-        return False
-    
-    # Step 3: Merge the PDFs
-    print("Merging documents...")
-    if not run_script(merge_script):
-        print("Error: Failed to merge PDFs.")
+    trace_path = tracing.save()
+    if trace_path:
+        print(f"Trace written to: {trace_path}")
+
+    failed = [name for name, result in results.items() if result in ('failed', 'blocked')]
+    if failed:
+        print(f"Error: Failed stages: {', '.join(failed)}")
         return False
-    
+
     # Final output
     output_path = os.path.join(dir_path, "finalReport.pdf")
-    print(f"\nComplete project report with acknowledgement has been generated:")
+    print(f"\nComplete project report with index and acknowledgement has been generated:")
     print(f"-> {output_path}")
     print("\nProcess completed successfully!")
     return True
@@ -59,4 +256,4 @@ if __name__ == "__main__":
     if not success:
         print("\nReport generation process failed. Please check the errors above.")
         sys.exit(1)
-    sys.exit(0) 
\ No newline at end of file
+    sys.exit(0)
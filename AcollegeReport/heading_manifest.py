@@ -0,0 +1,39 @@
+import json
+import os
+from build_cache import hash_file
+
+def heading_manifest_path(pdf_path):
+    """Return the path of the heading/page manifest written next to a PDF."""
+    return os.path.splitext(pdf_path)[0] + '.headings.json'
+
+def load_heading_manifest(manifest_path, pdf_path=None):
+    """
+    Load the (level, text, page, key) entries recorded by a previous build.
+    When pdf_path is given, a manifest recorded for different file contents
+    is ignored with a warning.
+    """
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if pdf_path is not None:
+        try:
+            # The size check is only a shortcut; the content hash decides
+            matches = (manifest.get('pdf_bytes') == os.path.getsize(pdf_path)
+                       and manifest.get('pdf_sha256') == hash_file(pdf_path))
+        except OSError:
+            return None
+        if not matches:
+            print(f"Warning: {manifest_path} was written for a different {os.path.basename(pdf_path)}; ignoring it.")
+            return None
+    return [tuple(entry) for entry in manifest.get('headings', [])]
+
+def write_heading_manifest(manifest_path, headings, pdf_path=None):
+    """Record the heading/page map of a finished build."""
+    manifest = {'headings': headings}
+    if pdf_path is not None:
+        manifest['pdf_bytes'] = os.path.getsize(pdf_path)
+        manifest['pdf_sha256'] = hash_file(pdf_path)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
@@ -0,0 +1,204 @@
+import os
+import re
+import tempfile
+from html import unescape
+from build_cache import BuildCache, hash_bytes, hash_file
+from report_styles import frame_size
+
+# Bump when image processing changes so cached images are rebuilt
+IMAGE_FORMAT_VERSION = 1
+
+# Resolution images are resampled to for print
+TARGET_DPI = 150
+
+# Screenshots and icons carry no reliable DPI; their natural size assumes a screen
+SOURCE_DPI = 96
+
+JPEG_QUALITY = 85
+
+# Share of the frame height one image may take, leaving room for the text around it
+MAX_HEIGHT_SHARE = 0.75
+
+# Image references in content files: markdown images and <img> tags
+_IMAGE_REF = re.compile(r'!\[[^\]]*\]\(([^)\s]+)|<img\b[^>]*\bsrc="([^"]+)"')
+
+# Directory images must come from when set; see restrict_images
+_image_root = None
+
+def restrict_images(root):
+    """
+    Take relative image references from root instead of the content file's
+    directory, and leave out any image outside root (absolute paths, ../ and
+    symlinks leading elsewhere). Used when the content comes from untrusted
+    clients, such as the render service.
+    """
+    global _image_root
+    _image_root = os.path.realpath(root)
+
+def _image_path(src, base_dir):
+    """Return the file an image reference points at, or None if it may not be read."""
+    if _image_root is None:
+        return src if os.path.isabs(src) else os.path.join(base_dir or os.getcwd(), src)
+    path = os.path.realpath(os.path.join(_image_root, src))
+    if os.path.commonpath([path, _image_root]) != _image_root:
+        print(f"Warning: Image outside {_image_root}: {src}; left out")
+        return None
+    return path
+
+def display_size(width_px, height_px, max_width, max_height):
+    """Return the printed size in points: natural size, shrunk to fit the box."""
+    width = width_px * 72 / SOURCE_DPI
+    height = height_px * 72 / SOURCE_DPI
+    scale = min(1.0, max_width / width, max_height / height)
+    return width * scale, height * scale
+
+def _is_flat(img):
+    """True for images with few colours (screenshots, icons), which compress best as PNG."""
+    thumb = img.convert('RGB')
+    thumb.thumbnail((256, 256))
+    return thumb.getcolors(maxcolors=1024) is not None
+
+def _process(src_path, out_path, max_width, max_height, dpi):
+    """Resample an image to dpi at its printed size and recompress it; returns (width, height, ext)."""
+    from PIL import Image
+    with Image.open(src_path) as img:
+        img.load()
+        width, height = display_size(img.width, img.height, max_width, max_height)
+        target = (max(1, round(width / 72 * dpi)), max(1, round(height / 72 * dpi)))
+        # Never upscale; small images are embedded at their own resolution
+        if target[0] < img.width:
+            img = img.resize(target, Image.LANCZOS)
+
+        has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+        if has_alpha or _is_flat(img):
+            if img.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+                img = img.convert('RGBA' if has_alpha else 'RGB')
+            img.save(out_path, 'PNG', optimize=True)
+            ext = '.png'
+        else:
+            img.convert('RGB').save(out_path, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+            ext = '.jpg'
+    return width, height, ext
+
+def prepare_image(src_path, max_width, max_height, dpi=TARGET_DPI, use_cache=True):
+    """
+    Return (path, width, height) of a print-ready copy of an image that fits
+    max_width x max_height points. Copies are cached by the hash of the
+    source bytes and the settings, so identical images share one file (and
+    so one XObject in the PDF).
+    """
+    key = hash_bytes(hash_file(src_path), f"{max_width:.1f}x{max_height:.1f}", str(dpi), str(IMAGE_FORMAT_VERSION))
+    cache = BuildCache('images', max_bytes=256 * 1024 * 1024) if use_cache else None
+    if cache is not None:
+        meta = cache.get(key)
+        if meta is not None:
+            path = cache.get_file(key, meta['ext'])
+            if path is not None:
+                return path, meta['width'], meta['height']
+        os.makedirs(cache.path, exist_ok=True)
+        tmp_path = cache.file_path(key, f'.{os.getpid()}.tmp')
+    else:
+        tmp_path = os.path.join(tempfile.gettempdir(), f"report-image-{key}.tmp")
+
+    width, height, ext = _process(src_path, tmp_path, max_width, max_height, dpi)
+    if cache is None:
+        path = tmp_path[:-len('.tmp')] + ext
+        os.replace(tmp_path, path)
+        return path, width, height
+    path = cache.put_file(key, ext, tmp_path)
+    cache.put(key, {'width': width, 'height': height, 'ext': ext})
+    return path, width, height
+
+def image_box(layout='report'):
+    """Return the largest (width, height) in points an image may take in a layout."""
+    width, height = frame_size(layout)
+    return width, height * MAX_HEIGHT_SHARE
+
+def image_flowable(src, base_dir=None):
+    """Return an Image flowable for a content file's image reference, or None if it is missing."""
+    from reportlab.platypus import Image
+    path = _image_path(unescape(src), base_dir)
+    if path is None:
+        return None
+    if not os.path.exists(path):
+        print(f"Warning: Image not found: {path}")
+        return None
+    processed, width, height = prepare_image(path, *image_box())
+    return Image(processed, width=width, height=height)
+
+_INLINE_IMG = re.compile(r'<img\b[^>]*/?>')
+_ATTR = re.compile(r'\b(src|width|height|valign)="([^"]*)"')
+
+def resolve_inline_images(markup, base_dir):
+    """
+    Point inline <img> tags in paragraph markup at print-ready copies. Relative
+    src paths are taken from base_dir instead of the working directory, and
+    tags without a size get the image's printed size.
+    """
+    if '<img' not in markup:
+        return markup
+
+    def replace(match):
+        tag = match.group(0)
+        attrs = dict(_ATTR.findall(tag))
+        src = attrs.get('src')
+        if not src:
+            # ReportLab would still read a src it parses some other way
+            return tag if _image_root is None else ''
+        # The value is markup, so a file name with & or " in it arrives escaped
+        path = _image_path(unescape(src), base_dir)
+        if path is None:
+            return ''
+        if not os.path.exists(path):
+            # Like a missing block image: warn and leave it out instead of failing the report
+            print(f"Warning: Image not found: {path}")
+            return ''
+        processed, width, height = prepare_image(path, *image_box())
+        attrs['src'] = processed
+        attrs.setdefault('width', f"{width:.1f}")
+        attrs.setdefault('height', f"{height:.1f}")
+        return '<img ' + ' '.join(f'{name}="{value}"' for name, value in attrs.items()) + '/>'
+
+    return _INLINE_IMG.sub(replace, markup)
+
+def image_references(file_path):
+    """Return the paths of the images one content file references, whether they exist or not."""
+    base_dir = os.path.dirname(file_path)
+    with open(file_path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    paths = []
+    for match in _IMAGE_REF.finditer(text):
+        src = match.group(1) or match.group(2)
+        path = src if os.path.isabs(src) else os.path.join(base_dir, src)
+        if path not in paths:
+            paths.append(path)
+    return paths
+
+def referenced_images(contents_dir):
+    """Return the existing image files referenced by the content files, in order."""
+    images = []
+    for name in sorted(os.listdir(contents_dir)):
+        if not name.endswith('.txt'):
+            continue
+        for path in image_references(os.path.join(contents_dir, name)):
+            if os.path.exists(path) and path not in images:
+                images.append(path)
+    return images
+
+def _prepare(path):
+    return prepare_image(path, *image_box())
+
+def prepare_images(contents_dir, jobs=None):
+    """Process every image the content files reference, in parallel, ahead of layout."""
+    from build_graph import process_pool
+    images = referenced_images(contents_dir)
+    jobs = min(jobs or os.cpu_count() or 1, len(images))
+    if jobs <= 1:
+        results = list(map(_prepare, images))
+    else:
+        with process_pool(jobs) as pool:
+            results = list(pool.map(_prepare, images))
+    before = sum(os.path.getsize(path) for path in images)
+    after = sum(os.path.getsize(path) for path in {path for path, _, _ in results})
+    print(f"Images prepared: {len(images)} files, {before / 1024:.0f} KB -> {after / 1024:.0f} KB")
+    return results
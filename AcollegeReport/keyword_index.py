@@ -0,0 +1,248 @@
+import json
+import os
+import re
+import sys
+from html import escape, unescape
+from reportlab.platypus import Flowable, Paragraph
+
+# Bump when the sidecar layout changes
+SEARCH_INDEX_VERSION = 1
+
+# Paragraph styles whose text is indexed; front matter, the index pages and code are not
+INDEXED_STYLES = ('CustomNormal', 'CustomTitle', 'CustomHeading1', 'CustomHeading2')
+
+# Body styles whose emphasized phrases become entries of the printed index
+ENTRY_STYLES = ('CustomNormal',)
+
+# Longest emphasized run (in words) that is still taken as a term
+MAX_PHRASE_WORDS = 4
+
+KEYWORD_INDEX_TITLE = "Keyword Index"
+
+_WORD = re.compile(r"[A-Za-z][A-Za-z0-9_+#'-]*[A-Za-z0-9+#]")
+
+_TAG = re.compile(r'<(/?)([A-Za-z]+)([^>]*)>')
+
+# Paragraph markup tags whose text is emphasized
+EMPHASIS_TAGS = ('b', 'i', 'strong', 'em', 'code')
+
+STOPWORDS = frozenset("""
+a about above after again all also an and any are as at be because been before being below between both
+but by can could did do does doing down during each few for from further had has have having he her here
+hers him his how if in into is it its itself just let me more most my no nor not now of off on once only
+or other our ours out over own same she should so some such than that the their theirs them then there
+these they this those through to too under until up upon us very was we were what when where which while
+who whom why will with would you your yours
+""".split())
+
+def search_index_path(pdf_path):
+    """Return the path of the search sidecar written next to a PDF."""
+    return os.path.splitext(pdf_path)[0] + '.search.json'
+
+def markup_runs(markup):
+    """Yield (text, emphasized) runs of paragraph markup, with entities decoded."""
+    # One entry per open tag: whether it emphasizes its text
+    open_tags = []
+    pos = 0
+    for match in _TAG.finditer(markup):
+        if match.start() > pos:
+            yield unescape(markup[pos:match.start()]), any(open_tags)
+        pos = match.end()
+        closing, name, attrs = match.groups()
+        name = name.lower()
+        if name == 'br':
+            yield ' ', any(open_tags)
+        elif closing:
+            if open_tags:
+                open_tags.pop()
+        elif not attrs.rstrip().endswith('/'):
+            open_tags.append(name in EMPHASIS_TAGS or (name == 'font' and 'courier' in attrs.lower()))
+    if pos < len(markup):
+        yield unescape(markup[pos:]), any(open_tags)
+
+def indexed_paragraphs(flowable):
+    """
+    Return the paragraphs whose markup a flowable shows: the paragraph itself,
+    or those recorded in its index_paragraphs (lists, and the parts of a
+    flowable split across frames). None for anything else. A list also
+    records in index_parts the paragraphs of each part it splits into, one
+    per flowable of each item.
+    """
+    paragraphs = getattr(flowable, 'index_paragraphs', None)
+    if paragraphs is None and isinstance(flowable, Paragraph) and getattr(flowable, 'text', None):
+        paragraphs = (flowable,)
+    return paragraphs
+
+class KeywordIndex:
+    """
+    Term -> page postings collected while the document is laid out. Flowables
+    arrive in page order, so a page is only appended when it differs from the
+    last one and every posting list stays sorted without further work.
+    """
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """Forget everything; called at the start of each layout pass."""
+        # Story flowable being laid out and its paragraphs, see start_flowable
+        self.splitting = None
+        self.current = None
+        self.terms = {}
+        self.phrases = {}
+        self.labels = {}
+        self.last_page = 0
+        # Set once the printed index starts, so its own pages are not indexed
+        self.closed = False
+
+    def _post(self, postings, key, page):
+        pages = postings.get(key)
+        if pages is None:
+            postings[key] = [page]
+        elif pages[-1] != page:
+            pages.append(page)
+
+    def start_flowable(self, flowable):
+        """Note the story flowable the document starts laying out; a part split off it is indexed as its source."""
+        self.splitting = flowable
+        self.current = indexed_paragraphs(flowable)
+
+    def add_parts(self, parts):
+        """Record the source paragraphs on the parts a split put back into the story."""
+        if self.current is None:
+            return
+        # A list's parts get their own paragraphs; any other split gives each part all of them
+        part_paragraphs = getattr(self.splitting, 'index_parts', None)
+        if part_paragraphs is None or len(part_paragraphs) != len(parts):
+            part_paragraphs = [self.current] * len(parts)
+        for part, paragraphs in zip(parts, part_paragraphs):
+            if indexed_paragraphs(part) is None:
+                part.index_paragraphs = paragraphs
+
+    def add_flowable(self, flowable, page):
+        """
+        Index the text of a flowable that was just laid out on page. A paragraph
+        split across pages is indexed in full on each of them.
+        """
+        if self.closed:
+            return
+        for paragraph in indexed_paragraphs(flowable) or self.current or ():
+            style = paragraph.style.name
+            if style in INDEXED_STYLES:
+                self.add_paragraph(paragraph, page, style in ENTRY_STYLES)
+
+    def add_paragraph(self, paragraph, page, entries=True):
+        self.last_page = max(self.last_page, page)
+        phrase = []
+        for text, emphasized in markup_runs(paragraph.text):
+            if entries and emphasized and text.strip():
+                phrase.append(text)
+            elif phrase:
+                self._add_phrase(''.join(phrase), page)
+                phrase = []
+            for word in _WORD.findall(text):
+                word = word.lower()
+                if len(word) > 2 and word not in STOPWORDS:
+                    self._post(self.terms, word, page)
+        if phrase:
+            self._add_phrase(''.join(phrase), page)
+
+    def _add_phrase(self, phrase, page):
+        phrase = ' '.join(phrase.split()).strip(' .,:;()')
+        words = phrase.split()
+        if not words or len(words) > MAX_PHRASE_WORDS or len(phrase) < 3 or not _WORD.search(phrase):
+            return
+        key = phrase.lower()
+        self.labels.setdefault(key, phrase)
+        self._post(self.phrases, key, page)
+
+    def entries(self):
+        """Return the printed index as (label, pages) pairs in alphabetical order."""
+        return [(self.labels[key], self.phrases[key]) for key in sorted(self.phrases)]
+
+    def save(self, path, pdf_path=None):
+        """Write the postings as a sidecar search file, with delta-encoded page lists."""
+        def encode(pages):
+            return [page - previous for previous, page in zip([0] + pages, pages)]
+
+        index = {
+            'version': SEARCH_INDEX_VERSION,
+            'pages': self.last_page,
+            'terms': {term: encode(pages) for term, pages in sorted(self.terms.items())},
+            'phrases': {self.labels[key]: encode(pages) for key, pages in sorted(self.phrases.items())},
+        }
+        if pdf_path is not None:
+            index['pdf_bytes'] = os.path.getsize(pdf_path)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, separators=(',', ':'))
+
+def load_search_index(path):
+    """Read a sidecar search file back into {'terms': {term: pages}, 'phrases': {label: pages}}."""
+    with open(path, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    if index.get('version') != SEARCH_INDEX_VERSION:
+        raise ValueError(f"Unsupported search index version in {path}")
+
+    def decode(deltas):
+        pages = []
+        page = 0
+        for delta in deltas:
+            page += delta
+            pages.append(page)
+        return pages
+
+    for name in ('terms', 'phrases'):
+        index[name] = {key: decode(deltas) for key, deltas in index[name].items()}
+    return index
+
+def search(index, query):
+    """Return the pages that contain every word of query."""
+    pages = None
+    for word in _WORD.findall(query):
+        word = word.lower()
+        if len(word) <= 2 or word in STOPWORDS:
+            continue
+        found = set(index['terms'].get(word, ()))
+        pages = found if pages is None else pages & found
+    return sorted(pages or ())
+
+class KeywordIndexSection(Flowable):
+    """
+    The printed keyword index. It sits at the end of the story, so when the
+    frame reaches it every earlier page has been laid out in this pass and the
+    entries are built from postings that are already complete.
+    """
+    def __init__(self, keyword_index, styles):
+        Flowable.__init__(self)
+        self.keyword_index = keyword_index
+        self.styles = styles
+
+    def wrap(self, availWidth, availHeight):
+        # Never fits whole, so the frame asks for split() and lays the entries out one by one
+        return availWidth, availHeight + 1
+
+    def split(self, availWidth, availHeight):
+        self.keyword_index.closed = True
+        content = [Paragraph(KEYWORD_INDEX_TITLE, self.styles['KeywordIndexTitle'])]
+        letter = None
+        for label, pages in self.keyword_index.entries():
+            initial = label[0].upper() if label[0].isalpha() else '#'
+            if initial != letter:
+                letter = initial
+                content.append(Paragraph(letter, self.styles['IndexSection']))
+            content.append(Paragraph(f"{escape(label, quote=False)}, {', '.join(map(str, pages))}", self.styles['KeywordEntry']))
+        return content
+
+    def drawOn(self, canvas, x, y, _sW=0):
+        pass
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python keyword_index.py REPORT.pdf WORD [WORD ...]")
+        sys.exit(1)
+    index = load_search_index(search_index_path(sys.argv[1]))
+    query = ' '.join(sys.argv[2:])
+    pages = search(index, query)
+    if pages:
+        print(f"'{query}' is on pages: {', '.join(map(str, pages))}")
+    else:
+        print(f"'{query}' was not found.")
@@ -0,0 +1,226 @@
+import re
+from images import image_flowable, resolve_inline_images
+
+# Report styles used for markdown heading levels 1-3; deeper levels are bold body text, as in report.py
+HEADING_STYLES = ['CustomTitle', 'CustomHeading1', 'CustomHeading2']
+
+_HEADING = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+_FENCE = re.compile(r'^\s*(```|~~~)')
+_RULE = re.compile(r'^\s{0,3}([-*_])(\s*\1){2,}\s*$')
+_LIST_ITEM = re.compile(r'^(\s*)([-*+]|\d+[.)])\s+(.*)$')
+_IMAGE_ONLY = re.compile(r'^!\[[^\]]*\]\(([^)\s]+)(?:\s+"[^"]*")?\)$')
+_INLINE = re.compile(
+    r'`([^`]+)`'                                # code span
+    r'|\*\*(.+?)\*\*|__(.+?)__'                 # bold
+    r'|\*(?!\s)(.+?)\*|(?<!\w)_(?!\s)(.+?)_(?!\w)'  # italic
+    r'|!\[([^\]]*)\]\(([^)\s]+)(?:\s+"[^"]*")?\)'  # image
+    r'|\[([^\]]+)\]\(([^)\s]+)\)'               # link
+)
+
+# An & that doesn't start a character or entity reference
+_BARE_AMPERSAND = re.compile(r'&(?!#[0-9]+;|#[xX][0-9a-fA-F]+;|[A-Za-z][A-Za-z0-9]*;)')
+
+def _escape(text):
+    """Escape markup characters, leaving entity references such as &amp;amp; as written."""
+    return _BARE_AMPERSAND.sub('&amp;', text).replace('<', '&lt;').replace('>', '&gt;')
+
+def _escape_attribute(text):
+    """Escape an attribute value, which sits between double quotes."""
+    return _escape(text).replace('"', '&quot;')
+
+def _escape_code(text):
+    """Escape code span text, where entity references are literal text."""
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+def inline_markup(text):
+    """Convert inline markdown (code, bold, italic, images, links) to ReportLab paragraph markup."""
+    parts = []
+    pos = 0
+    for match in _INLINE.finditer(text):
+        parts.append(_escape(text[pos:match.start()]))
+        code, bold, bold_alt, em, em_alt, _, src, link_text, href = match.groups()
+        if code is not None:
+            parts.append(f'<font face="Courier">{_escape_code(code)}</font>')
+        elif bold is not None or bold_alt is not None:
+            parts.append(f'<b>{inline_markup(bold or bold_alt)}</b>')
+        elif em is not None or em_alt is not None:
+            parts.append(f'<i>{inline_markup(em or em_alt)}</i>')
+        elif src is not None:
+            parts.append(f'<img src="{_escape_attribute(src)}"/>')
+        else:
+            parts.append(f'<a href="{_escape_attribute(href)}">{inline_markup(link_text)}</a>')
+        pos = match.end()
+    parts.append(_escape(text[pos:]))
+    return ''.join(parts)
+
+def _nest_list(items):
+    """Turn (indent, ordered, text) list lines into a nested list block."""
+    root = {'ordered': items[0][1], 'items': []}
+    stack = [(items[0][0], root)]
+    for indent, ordered, text in items:
+        while len(stack) > 1 and indent < stack[-1][0]:
+            stack.pop()
+        current = stack[-1][1]
+        if indent > stack[-1][0] and current['items']:
+            child = {'ordered': ordered, 'items': []}
+            current['items'][-1][1] = child
+            stack.append((indent, child))
+            current = child
+        current['items'].append([inline_markup(text), None])
+    return root
+
+def parse_markdown(markdown_text):
+    """
+    Tokenize markdown into a list of JSON-serialisable blocks in one pass over
+    its lines: ['heading', level, markup], ['paragraph', markup],
+    ['list', nested list], ['code', text], ['image', src] and ['rule'].
+    A paragraph holding nothing but an image becomes an image block.
+    """
+    blocks = []
+    paragraph = []
+    lines = markdown_text.splitlines()
+    n = len(lines)
+    i = 0
+
+    def flush_paragraph():
+        if paragraph:
+            text = ' '.join(paragraph)
+            image = _IMAGE_ONLY.match(text)
+            if image:
+                blocks.append(['image', image.group(1)])
+            else:
+                blocks.append(['paragraph', inline_markup(text)])
+            paragraph.clear()
+
+    while i < n:
+        line = lines[i]
+        stripped = line.strip()
+
+        fence = _FENCE.match(line)
+        if fence:
+            flush_paragraph()
+            code = []
+            i += 1
+            while i < n and not lines[i].strip().startswith(fence.group(1)):
+                code.append(lines[i])
+                i += 1
+            blocks.append(['code', '\n'.join(code)])
+            i += 1
+            continue
+
+        if not stripped:
+            flush_paragraph()
+            i += 1
+            continue
+
+        # Indented code blocks can't interrupt a paragraph
+        if not paragraph and (line.startswith('    ') or line.startswith('\t')):
+            code = []
+            while i < n and (not lines[i].strip() or lines[i].startswith('    ') or lines[i].startswith('\t')):
+                code.append(lines[i][4:] if lines[i].startswith('    ') else lines[i][1:])
+                i += 1
+            while code and not code[-1].strip():
+                code.pop()
+            blocks.append(['code', '\n'.join(code)])
+            continue
+
+        heading = _HEADING.match(line)
+        if heading:
+            flush_paragraph()
+            blocks.append(['heading', len(heading.group(1)), inline_markup(heading.group(2))])
+            i += 1
+            continue
+
+        if _RULE.match(line):
+            flush_paragraph()
+            blocks.append(['rule'])
+            i += 1
+            continue
+
+        item = _LIST_ITEM.match(line)
+        if item:
+            flush_paragraph()
+            items = []
+            while i < n:
+                line = lines[i]
+                item = _LIST_ITEM.match(line)
+                if item:
+                    indent, marker, text = item.groups()
+                    items.append((len(indent.expandtabs(4)), marker[0].isdigit(), text))
+                elif not line.strip():
+                    # A blank line only continues the list if another item follows
+                    j = i + 1
+                    while j < n and not lines[j].strip():
+                        j += 1
+                    if j >= n or not _LIST_ITEM.match(lines[j]):
+                        break
+                elif _HEADING.match(line) or _FENCE.match(line):
+                    break
+                else:
+                    # Continuation line of the previous item
+                    indent, ordered, text = items[-1]
+                    items[-1] = (indent, ordered, f"{text} {line.strip()}")
+                i += 1
+            blocks.append(['list', _nest_list(items)])
+            continue
+
+        paragraph.append(stripped)
+        i += 1
+
+    flush_paragraph()
+    return blocks
+
+def list_flowable(block, styles, base_dir=None):
+    """Build a (possibly nested) ListFlowable from a list block."""
+    from reportlab.platypus import ListFlowable, ListItem, Paragraph
+    items = []
+    # The paragraphs of each flowable of each item, for the keyword index (see keyword_index.indexed_paragraphs)
+    part_paragraphs = []
+    for markup, child in block['items']:
+        flowables = [Paragraph(resolve_inline_images(markup, base_dir), styles['CustomNormal'])]
+        part_paragraphs.append((flowables[0],))
+        if child is not None:
+            flowables.append(list_flowable(child, styles, base_dir))
+            part_paragraphs.append(flowables[-1].index_paragraphs)
+        items.append(ListItem(flowables))
+    bullet_type = '1' if block['ordered'] else 'bullet'
+    flowable = ListFlowable(items, bulletType=bullet_type, leftIndent=18)
+    flowable.index_parts = part_paragraphs
+    flowable.index_paragraphs = tuple(paragraph for paragraphs in part_paragraphs for paragraph in paragraphs)
+    return flowable
+
+def blocks_to_flowables(blocks, styles, base_dir=None):
+    """Turn parsed markdown blocks into report flowables; image paths are relative to base_dir."""
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Paragraph, Preformatted, Spacer
+    from reportlab.platypus.flowables import HRFlowable
+    content = []
+    for block in blocks:
+        kind = block[0]
+        if kind == 'heading' and block[1] > len(HEADING_STYLES):
+            content.append(Paragraph(f'<b>{block[2]}</b>', styles['CustomNormal']))
+            content.append(Spacer(1, 0.1*inch))
+        elif kind == 'heading':
+            content.append(Paragraph(block[2], styles[HEADING_STYLES[block[1] - 1]]))
+        elif kind == 'paragraph':
+            content.append(Paragraph(resolve_inline_images(block[1], base_dir), styles['CustomNormal']))
+            content.append(Spacer(1, 0.1*inch))
+        elif kind == 'list':
+            content.append(list_flowable(block[1], styles, base_dir))
+            content.append(Spacer(1, 0.1*inch))
+        elif kind == 'code':
+            # Preformatted splits across pages line by line
+            content.append(Preformatted(block[1], styles['CustomCode']))
+            content.append(Spacer(1, 0.1*inch))
+        elif kind == 'image':
+            image = image_flowable(block[1], base_dir)
+            if image is not None:
+                content.append(image)
+                content.append(Spacer(1, 0.1*inch))
+        elif kind == 'rule':
+            content.append(HRFlowable(width='100%', thickness=0.5, spaceBefore=4, spaceAfter=4))
+    return content
+
+def markdown_to_flowables(markdown_text, styles, base_dir=None):
+    """Convert markdown straight to report flowables, without an HTML round trip."""
+    return blocks_to_flowables(parse_markdown(markdown_text), styles, base_dir)
@@ -1,30 +1,35 @@
 import os
-from PyPDF2 import PdfMerger
+import sys
 
-def merge_pdfs(output_path, acknowledgement_path, main_report_path):
+def merge_pdfs(output_path, acknowledgement_path, main_report_path, optimize=True, linearize=False):
     """
     Merge the acknowledgement PDF and main report PDF into a single document.
     Places the acknowledgement page after the cover page and before TOC.
+    With linearize, the output is written linearized ("fast web view").
     """
-    merger = PdfMerger()
+    from pdf_assembly import assemble_pdf, format_savings, format_stats
     
-    # Get information about the PDFs
-    # We'll insert the acknowledgement after the first page (cover page)
-    
-    # Add first page from main report (cover page)
-    merger.append(main_report_path, pages=(0, 1))
-    
-    # Add acknowledgement page
-    merger.append(acknowledgement_path)
-    
-    # Add rest of the main report
-    merger.append(main_report_path, pages=(1, None))
-    
-    # Write the merged PDF to file
-    merger.write(output_path)
-    merger.close()
+    # Each source is opened once; the main report contributes two page ranges
+    stats = assemble_pdf(output_path, [
+        (main_report_path, 0, 1),         # First page from main report (cover page)
+        (acknowledgement_path, 0, None),  # Acknowledgement page
+        (main_report_path, 1, None),      # Rest of the main report
+    ], optimize=optimize, linearize=linearize)
     
     print(f"PDFs successfully merged to: {output_path}")
+    print(f"  {format_stats(stats)}")
+    if optimize:
+        print(f"  Optimized: {format_savings(stats)}")
+    if linearize:
+        from pdf_linearize import check_linearization, format_linearization
+        check = check_linearization(output_path)
+        print(f"  Linearized: {format_linearization(check)}")
+        if check['problems']:
+            print(f"Warning: {output_path} is not a valid linearized PDF")
+    if stats['unsubset_fonts']:
+        print(f"Warning: Fonts embedded in full instead of as subsets, copied as they are: "
+              f"{', '.join(stats['unsubset_fonts'])}")
+    return stats
 
 if __name__ == "__main__":
     # Define paths
@@ -45,4 +50,4 @@ if __name__ == "__main__":
         exit(1)
     
     # Merge the PDFs
-    merge_pdfs(merged_output_path, acknowledgement_path, main_report_path) 
\ No newline at end of file
+    merge_pdfs(merged_output_path, acknowledgement_path, main_report_path, linearize='--linearize' in sys.argv[1:]) 
\ No newline at end of file
@@ -0,0 +1,535 @@
+import base64
+import hashlib
+import io
+import os
+import re
+import time
+import zlib
+from collections import deque
+import PyPDF2
+from PyPDF2 import PdfReader
+from PyPDF2.generic import (
+    ArrayObject, DictionaryObject, IndirectObject, NameObject, NullObject,
+    NumberObject, StreamObject, TextStringObject
+)
+from tracing import peak_rss_mb, traced
+
+def ref(num):
+    """Return an indirect reference to object num in the output file."""
+    return IndirectObject(num, 0, None)
+
+# Set once release_parsed_objects has warned that it can't release anything
+_release_unsupported = False
+
+def release_parsed_objects(reader):
+    """
+    Let a PdfReader drop the objects it has parsed so far; they are parsed
+    again if they are read again. PyPDF2 has no public call for this, so it
+    clears the reader's private resolved_objects dict (PyPDF2 1.x to 3.x).
+    If the attribute is gone, nothing is dropped and memory grows with the
+    document; that is reported once.
+    """
+    global _release_unsupported
+    cache = getattr(reader, 'resolved_objects', None)
+    if isinstance(cache, dict):
+        cache.clear()
+    elif not _release_unsupported:
+        _release_unsupported = True
+        print(f"Warning: PyPDF2 {PyPDF2.__version__} keeps its parsed objects where they can't be released; "
+              f"large documents will use more memory")
+
+class PdfStreamWriter:
+    """
+    Writes PDF objects straight to an open binary file as they are produced.
+    Only the byte offset of each object is kept in memory.
+    """
+    def __init__(self, stream, version='1.4', next_num=1, prev_xref=None):
+        self.stream = stream
+        self.offsets = {}
+        self.next_num = next_num
+        # With prev_xref the objects are an incremental update appended to an existing file
+        self.prev_xref = prev_xref
+        self.xref_offset = None
+        if prev_xref is None:
+            self.stream.write(f"%PDF-{version}\n".encode('ascii'))
+            self.stream.write(b"%\xe2\xe3\xcf\xd3\n")
+
+    def reserve(self):
+        """Reserve an object number to be written later."""
+        num = self.next_num
+        self.next_num += 1
+        return num
+
+    def write_object(self, num, obj):
+        """Write obj (whose references already point into this file) as object num."""
+        self.offsets[num] = self.stream.tell()
+        self.stream.write(f"{num} 0 obj\n".encode('ascii'))
+        obj.write_to_stream(self.stream, None)
+        self.stream.write(b"\nendobj\n")
+
+    def finish(self, root_num, info_num=None):
+        """Write the cross-reference table and trailer."""
+        xref_offset = self.stream.tell()
+        size = self.next_num
+        if self.prev_xref is None:
+            lines = [f"xref\n0 {size}\n", "0000000000 65535 f \n"]
+            for num in range(1, size):
+                offset = self.offsets.get(num)
+                if offset is None:
+                    lines.append("0000000000 00000 f \n")
+                else:
+                    lines.append(f"{offset:010d} 00000 n \n")
+        else:
+            # An update lists only the objects it writes, in runs of consecutive numbers
+            lines = ["xref\n"]
+            nums = sorted(self.offsets)
+            start = 0
+            for i in range(1, len(nums) + 1):
+                if i == len(nums) or nums[i] != nums[i - 1] + 1:
+                    lines.append(f"{nums[start]} {i - start}\n")
+                    lines.extend(f"{self.offsets[num]:010d} 00000 n \n" for num in nums[start:i])
+                    start = i
+        self.stream.write(''.join(lines).encode('ascii'))
+
+        trailer = DictionaryObject({
+            NameObject('/Size'): NumberObject(size),
+            NameObject('/Root'): ref(root_num),
+        })
+        if info_num is not None:
+            trailer[NameObject('/Info')] = ref(info_num)
+        if self.prev_xref is not None:
+            trailer[NameObject('/Prev')] = NumberObject(self.prev_xref)
+        self.stream.write(b"trailer\n")
+        trailer.write_to_stream(self.stream, None)
+        self.stream.write(f"\nstartxref\n{xref_offset}\n%%EOF\n".encode('ascii'))
+        self.xref_offset = xref_offset
+
+def write_outline(writer, entries, page_nums):
+    """
+    Write an outline tree for (title, page index, level) entries and return
+    the object number of its root, or None if there are no entries.
+    """
+    if not entries:
+        return None
+
+    root = {'children': [], 'num': writer.reserve()}
+    stack = [(-1, root)]
+    for title, page_index, level in entries:
+        while stack[-1][0] >= level:
+            stack.pop()
+        node = {'title': title, 'page': page_index, 'children': [], 'num': writer.reserve()}
+        stack[-1][1]['children'].append(node)
+        stack.append((level, node))
+
+    def descendants(node):
+        return sum(1 + descendants(child) for child in node['children'])
+
+    def write_children(parent):
+        children = parent['children']
+        for i, node in enumerate(children):
+            item = DictionaryObject({
+                NameObject('/Title'): TextStringObject(node['title']),
+                NameObject('/Parent'): ref(parent['num']),
+                NameObject('/Dest'): ArrayObject([ref(page_nums[node['page']]), NameObject('/Fit')]),
+            })
+            if i > 0:
+                item[NameObject('/Prev')] = ref(children[i - 1]['num'])
+            if i + 1 < len(children):
+                item[NameObject('/Next')] = ref(children[i + 1]['num'])
+            if node['children']:
+                item[NameObject('/First')] = ref(node['children'][0]['num'])
+                item[NameObject('/Last')] = ref(node['children'][-1]['num'])
+                item[NameObject('/Count')] = NumberObject(descendants(node))
+            writer.write_object(node['num'], item)
+            write_children(node)
+
+    write_children(root)
+    writer.write_object(root['num'], DictionaryObject({
+        NameObject('/Type'): NameObject('/Outlines'),
+        NameObject('/First'): ref(root['children'][0]['num']),
+        NameObject('/Last'): ref(root['children'][-1]['num']),
+        NameObject('/Count'): NumberObject(descendants(root)),
+    }))
+    return root['num']
+
+def source_outline(reader, start, end, offset):
+    """
+    Return the outline entries of reader that point into pages [start, end),
+    as (title, output page index, level) tuples.
+    """
+    entries = []
+
+    def walk(items, level):
+        for item in items:
+            if isinstance(item, list):
+                walk(item, level + 1)
+                continue
+            page_index = reader.get_destination_page_number(item)
+            if start <= page_index < end:
+                entries.append((item.title, offset + page_index - start, level))
+
+    try:
+        walk(reader.outline, 0)
+    except Exception:
+        # A damaged outline shouldn't stop the pages from being assembled
+        return []
+    return entries
+
+# A font program embedded as a subset has a name like ABCDEF+DejaVuSans
+_SUBSET_NAME = re.compile(r'^/[A-Z]{6}\+')
+
+# Streams shorter than this are not worth a compression filter
+MIN_COMPRESS_BYTES = 64
+
+def _filters(obj):
+    """Return the /Filter and /DecodeParms of a stream as lists."""
+    filters = obj.get('/Filter')
+    params = obj.get('/DecodeParms')
+    if filters is None:
+        return [], []
+    if not isinstance(filters, ArrayObject):
+        filters, params = [filters], [params]
+    elif not isinstance(params, ArrayObject):
+        params = [params] * len(filters)
+    return list(filters), [NullObject() if value is None else value for value in params]
+
+def _serialize(obj):
+    out = io.BytesIO()
+    obj.write_to_stream(out, None)
+    return out.getvalue()
+
+class _ObjectCopier:
+    """
+    Copies objects from source readers into a PdfStreamWriter, once each.
+
+    With optimize, objects that are identical across (or within) the sources,
+    such as the fonts every ReportLab build writes again, are written once;
+    ASCII85 encoding is removed from streams and uncompressed streams are
+    compressed.
+    """
+    def __init__(self, writer, readers, optimize=False):
+        self.writer = writer
+        self.readers = readers
+        self.optimize = optimize
+        self.numbers = {}
+        self.pages = {}
+        self.queue = deque()
+        self.objects_written = 0
+        # Content digest of each source object (None if it can't be shared) and
+        # the output object written for each digest
+        self.digests = {}
+        self.by_digest = {}
+        self.sizes = {}
+        self.duplicates = 0
+        self.duplicate_bytes = 0
+        self.streams_compressed = 0
+        self.compression_bytes = 0
+        self.unsubset_fonts = set()
+
+    def _digest(self, source, reference):
+        """
+        Return a digest of an object and everything it references, or None for
+        objects that must not be shared (pages, and objects in reference cycles).
+        Two objects with the same digest write the same bytes to the output.
+        """
+        key = (source, reference.idnum, reference.generation)
+        if key in self.digests:
+            return self.digests[key]
+        # Marks the object as in progress, so a cycle back to it yields None
+        self.digests[key] = None
+        obj = self.readers[source].get_object(reference)
+        if isinstance(obj, DictionaryObject) and obj.get('/Type') in ('/Page', '/Pages'):
+            return None
+
+        parts = []
+
+        def walk(value):
+            if isinstance(value, IndirectObject):
+                page_num = self.pages.get((source, value.idnum, value.generation))
+                if page_num is not None:
+                    parts.append(b'P%d' % page_num)
+                    return True
+                digest = self._digest(source, value)
+                if digest is None:
+                    return False
+                parts.append(b'R' + digest)
+                return True
+            if isinstance(value, DictionaryObject):
+                parts.append(b'<<')
+                for name in sorted(value):
+                    if name == '/Length':
+                        continue
+                    parts.append(name.encode('utf-8'))
+                    if not walk(value[name]):
+                        return False
+                parts.append(b'>>')
+                if isinstance(value, StreamObject):
+                    parts.append(b'S' + hashlib.sha256(value._data).digest())
+                return True
+            if isinstance(value, ArrayObject):
+                parts.append(b'[')
+                for item in value:
+                    if not walk(item):
+                        return False
+                parts.append(b']')
+                return True
+            parts.append(type(value).__name__.encode('ascii') + _serialize(value))
+            return True
+
+        if not walk(obj):
+            return None
+        digest = hashlib.sha256(b' '.join(parts)).digest()
+        self.digests[key] = digest
+        size = sum(len(part) for part in parts)
+        if isinstance(obj, StreamObject):
+            size += len(obj._data)
+        self.sizes[digest] = size
+        return digest
+
+    def _number_for(self, source, reference):
+        key = (source, reference.idnum, reference.generation)
+        if key in self.pages:
+            return self.pages[key]
+        num = self.numbers.get(key)
+        if num is None:
+            digest = self._digest(source, reference) if self.optimize else None
+            num = self.by_digest.get(digest) if digest is not None else None
+            if num is not None:
+                self.duplicates += 1
+                self.duplicate_bytes += self.sizes.get(digest, 0)
+            else:
+                num = self.writer.reserve()
+                self.queue.append((source, reference, num))
+                if digest is not None:
+                    self.by_digest[digest] = num
+            self.numbers[key] = num
+        return num
+
+    def _optimize_stream(self, copy):
+        """Drop ASCII85 encoding from a copied stream and compress it if it is uncompressed."""
+        filters, params = _filters(copy)
+        data = copy._data
+        if filters and filters[0] in ('/ASCII85Decode', '/A85'):
+            data = base64.a85decode(data, adobe=True)
+            filters, params = filters[1:], params[1:]
+        if not filters and len(data) >= MIN_COMPRESS_BYTES:
+            compressed = zlib.compress(data, 9)
+            if len(compressed) < len(data):
+                data = compressed
+                filters, params = [NameObject('/FlateDecode')], []
+                self.streams_compressed += 1
+        if data is copy._data:
+            return
+        self.compression_bytes += len(copy._data) - len(data)
+        copy._data = data
+        for name, values in (('/Filter', filters), ('/DecodeParms', params)):
+            if any(not isinstance(value, NullObject) for value in values):
+                copy[NameObject(name)] = values[0] if len(values) == 1 else ArrayObject(values)
+            elif name in copy:
+                del copy[name]
+
+    def remap(self, obj, source):
+        """Return a copy of obj whose indirect references point into the output."""
+        if isinstance(obj, IndirectObject):
+            return ref(self._number_for(source, obj))
+        if isinstance(obj, StreamObject):
+            copy = obj.__class__()
+            copy._data = obj._data
+            for key, value in obj.items():
+                if key != '/Length':
+                    copy[NameObject(key)] = self.remap(value, source)
+            if self.optimize:
+                self._optimize_stream(copy)
+            return copy
+        if isinstance(obj, DictionaryObject):
+            return DictionaryObject({NameObject(key): self.remap(value, source) for key, value in obj.items()})
+        if isinstance(obj, ArrayObject):
+            return ArrayObject(self.remap(value, source) for value in obj)
+        return obj
+
+    def _check_font(self, obj):
+        """Note embedded fonts that carry the whole font program; they are copied as they are, not subset."""
+        if any(name in obj for name in ('/FontFile', '/FontFile2', '/FontFile3')):
+            font_name = str(obj.get('/FontName', ''))
+            if not _SUBSET_NAME.match(font_name):
+                self.unsubset_fonts.add(font_name.lstrip('/'))
+
+    def drain(self):
+        """Write every object queued so far, following references as they appear."""
+        while self.queue:
+            source, reference, num = self.queue.popleft()
+            obj = self.readers[source].get_object(reference)
+            # Pages that weren't selected (and their page tree nodes) are not copied
+            if isinstance(obj, DictionaryObject) and obj.get('/Type') in ('/Page', '/Pages'):
+                obj = NullObject()
+            elif isinstance(obj, DictionaryObject) and obj.get('/Type') == '/FontDescriptor':
+                self._check_font(obj)
+            self.writer.write_object(num, self.remap(obj, source))
+            self.objects_written += 1
+
+@traced('pdf', memory=True)
+def assemble_pdf(output_path, parts, outline=None, optimize=False, layout=None, linearize=False):
+    """
+    Assemble pages from several PDFs into one file.
+
+    parts is a list of (pdf_path, start, end) page ranges, with end=None meaning
+    the last page. Each source is opened and parsed once, objects shared between
+    its pages (fonts, images) are copied once, and stream data is copied as-is.
+    Objects are written to the output as soon as they are reached, so memory use
+    does not grow with the size of the output.
+
+    outline is a list of (title, page index, level) entries; by default the
+    outlines of the sources are carried over.
+
+    With optimize, identical objects from different sources are written once and
+    streams are stored compressed without ASCII85 encoding.
+
+    Fonts are not subset here: font programs are copied as the sources embed
+    them. ReportLab already embeds TrueType fonts as subsets and its standard
+    fonts not at all, so only fonts embedded in full by other tools are left
+    as they are; their names are listed in the unsubset_fonts statistic.
+
+    layout, if given, is filled with the object numbers of the pages, page tree,
+    outline and catalog of the output and the digests of the objects written,
+    which is what pdf_update needs to update the file in place later.
+
+    With linearize, the assembled file is rewritten as a linearized PDF (see
+    pdf_linearize) so a viewer can show the first page before the rest has
+    arrived. Its object numbers differ, so no layout can be recorded.
+
+    Returns a dict of statistics about the run.
+    """
+    if linearize and layout is not None:
+        raise ValueError("The layout of a linearized PDF can't be recorded for updates")
+    start_time = time.perf_counter()
+    files = {}
+    readers = {}
+    # Linearizing reorders the whole file, so assemble it next to the output first
+    assembled_path = f"{output_path}.{os.getpid()}.tmp" if linearize else output_path
+    try:
+        for pdf_path, _, _ in parts:
+            if pdf_path not in readers:
+                files[pdf_path] = open(pdf_path, 'rb')
+                readers[pdf_path] = PdfReader(files[pdf_path])
+
+        version = max(reader.pdf_header[5:8] for reader in readers.values())
+        with open(assembled_path, 'wb') as out:
+            writer = PdfStreamWriter(out, version)
+            copier = _ObjectCopier(writer, readers, optimize)
+            catalog_num = writer.reserve()
+            pages_num = writer.reserve()
+
+            # Number every selected page first so links between them can be resolved
+            selected = []
+            source_entries = []
+            for pdf_path, start, end in parts:
+                reader = readers[pdf_path]
+                end = len(reader.pages) if end is None else min(end, len(reader.pages))
+                if outline is None:
+                    source_entries.extend(source_outline(reader, start, end, len(selected)))
+                for i in range(start, end):
+                    page = reader.pages[i]
+                    num = writer.reserve()
+                    reference = page.indirect_reference
+                    copier.pages[(pdf_path, reference.idnum, reference.generation)] = num
+                    selected.append((pdf_path, page, num))
+
+            # Copy each page, then everything it references that isn't written yet
+            for pdf_path, page, num in selected:
+                page_copy = copier.remap(DictionaryObject({
+                    key: value for key, value in page.items() if key != '/Parent'
+                }), pdf_path)
+                page_copy[NameObject('/Parent')] = ref(pages_num)
+                writer.write_object(num, page_copy)
+                copier.drain()
+                # Let the reader drop the objects it parsed for this page
+                release_parsed_objects(readers[pdf_path])
+
+            page_nums = [num for _, _, num in selected]
+            writer.write_object(pages_num, DictionaryObject({
+                NameObject('/Type'): NameObject('/Pages'),
+                NameObject('/Kids'): ArrayObject(ref(num) for num in page_nums),
+                NameObject('/Count'): NumberObject(len(page_nums)),
+            }))
+
+            if outline is None:
+                outline = source_entries
+            outline_num = write_outline(writer, outline, page_nums)
+            catalog = DictionaryObject({
+                NameObject('/Type'): NameObject('/Catalog'),
+                NameObject('/Pages'): ref(pages_num),
+            })
+            if outline_num is not None:
+                catalog[NameObject('/Outlines')] = ref(outline_num)
+            writer.write_object(catalog_num, catalog)
+
+            # Keep the document information of the first source
+            info_num = None
+            info = readers[parts[0][0]].trailer.get('/Info')
+            if info is not None:
+                info_num = writer.reserve()
+                writer.write_object(info_num, copier.remap(info.get_object(), parts[0][0]))
+                copier.drain()
+
+            writer.finish(catalog_num, info_num)
+            output_bytes = out.tell()
+
+        if layout is not None:
+            layout.update({
+                'page_objects': page_nums,
+                'pages_object': pages_num,
+                'catalog_object': catalog_num,
+                'info_object': info_num,
+                'outline_object': outline_num,
+                'outline': [list(entry) for entry in outline],
+                'size': writer.next_num,
+                'xref': writer.xref_offset,
+                'bytes': output_bytes,
+                'objects': {digest.hex(): num for digest, num in copier.by_digest.items()},
+            })
+        if linearize:
+            from pdf_linearize import linearize_pdf
+            linearized = linearize_pdf(assembled_path, output_path)
+            output_bytes = linearized['bytes']
+    finally:
+        for f in files.values():
+            f.close()
+        if linearize and os.path.exists(assembled_path):
+            os.remove(assembled_path)
+
+    elapsed = time.perf_counter() - start_time
+    return {
+        'linearized': linearize,
+        'first_page_bytes': linearized['first_page_bytes'] if linearize else output_bytes,
+        'pages': len(page_nums),
+        'objects': writer.next_num - 1,
+        'bytes': output_bytes,
+        'seconds': elapsed,
+        'pages_per_second': len(page_nums) / elapsed if elapsed else None,
+        'mb_per_second': output_bytes / (1024 * 1024) / elapsed if elapsed else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'source_bytes': sum(os.path.getsize(pdf_path) for pdf_path in readers),
+        'duplicates': copier.duplicates,
+        'duplicate_bytes': copier.duplicate_bytes,
+        'streams_compressed': copier.streams_compressed,
+        'compression_bytes': copier.compression_bytes,
+        'unsubset_fonts': sorted(copier.unsubset_fonts),
+    }
+
+def format_stats(stats):
+    """Return a one-line summary of assemble_pdf statistics."""
+    summary = f"{stats['pages']} pages, {stats['bytes'] / 1024:.1f} KB in {stats['seconds']:.3f}s"
+    # The rates are None when the run was too quick for the clock to measure
+    if stats['pages_per_second'] is not None:
+        summary += f" ({stats['pages_per_second']:.0f} pages/s, {stats['mb_per_second']:.2f} MB/s)"
+    if stats['peak_rss_mb'] is not None:
+        summary += f", peak RSS {stats['peak_rss_mb']:.1f} MB"
+    return summary
+
+def format_savings(stats):
+    """Return a one-line summary of what optimization saved, from assemble_pdf statistics."""
+    saved = stats['source_bytes'] - stats['bytes']
+    return (f"{stats['source_bytes'] / 1024:.1f} KB of sources -> {stats['bytes'] / 1024:.1f} KB "
+            f"({saved / 1024:.1f} KB saved): {stats['duplicates']} duplicate objects "
+            f"({stats['duplicate_bytes'] / 1024:.1f} KB), {stats['compression_bytes'] / 1024:.1f} KB "
+            f"from stream encoding ({stats['streams_compressed']} streams compressed)")
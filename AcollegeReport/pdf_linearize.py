@@ -0,0 +1,607 @@
+import bisect
+import os
+import re
+import sys
+import tempfile
+import time
+import zlib
+from collections import deque
+from PyPDF2 import PdfReader
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, NullObject, StreamObject
+from pdf_assembly import ref, release_parsed_objects
+from tracing import traced
+
+# The linearization dictionary and the first-page trailer are written before
+# the offsets they record are known, so both are padded to a fixed size
+LINEARIZATION_DICT_BYTES = 200
+FIRST_TRAILER_BYTES = 200
+
+# Catalog entries a viewer reads before the first page; with /PageMode
+# /UseOutlines the outline is needed up front as well
+DOCUMENT_KEYS = ('/ViewerPreferences', '/OpenAction', '/AcroForm', '/Threads')
+
+# A viewer must find the linearization dictionary within the first KB
+LINEARIZATION_WINDOW = 1024
+
+class _BitWriter:
+    """Packs unsigned integers into bytes, most significant bit first."""
+    def __init__(self):
+        self.data = bytearray()
+        self.value = 0
+        self.count = 0
+
+    def write(self, value, nbits):
+        for shift in range(nbits - 1, -1, -1):
+            self.value = (self.value << 1) | ((value >> shift) & 1)
+            self.count += 1
+            if self.count == 8:
+                self.data.append(self.value)
+                self.value = self.count = 0
+
+    def flush(self):
+        """Pad to a byte boundary; every item array of a hint table starts on one."""
+        if self.count:
+            self.data.append(self.value << (8 - self.count))
+            self.value = self.count = 0
+
+class _BitReader:
+    def __init__(self, data, offset=0):
+        self.data = data
+        self.bit = offset * 8
+
+    def read(self, nbits):
+        value = 0
+        for _ in range(nbits):
+            byte = self.data[self.bit // 8]
+            value = (value << 1) | ((byte >> (7 - self.bit % 8)) & 1)
+            self.bit += 1
+        return value
+
+    def flush(self):
+        self.bit = (self.bit + 7) // 8 * 8
+
+def _references(value, found):
+    """Append the (number, generation) of every object value references."""
+    if isinstance(value, IndirectObject):
+        found.append((value.idnum, value.generation))
+    elif isinstance(value, DictionaryObject):
+        for item in value.values():
+            _references(item, found)
+    elif isinstance(value, ArrayObject):
+        for item in value:
+            _references(item, found)
+
+def _renumber(obj, numbers):
+    """Return a copy of obj whose indirect references use the new object numbers."""
+    if isinstance(obj, IndirectObject):
+        num = numbers.get((obj.idnum, obj.generation))
+        return ref(num) if num is not None else NullObject()
+    if isinstance(obj, StreamObject):
+        copy = obj.__class__()
+        copy._data = obj._data
+        for key, value in obj.items():
+            if key != '/Length':
+                copy[NameObject(key)] = _renumber(value, numbers)
+        return copy
+    if isinstance(obj, DictionaryObject):
+        return DictionaryObject({NameObject(key): _renumber(value, numbers) for key, value in obj.items()})
+    if isinstance(obj, ArrayObject):
+        return ArrayObject(_renumber(value, numbers) for value in obj)
+    return obj
+
+class _ObjectGraph:
+    """
+    Every object reachable from the trailer of a PDF and what each one
+    references. References from a page to its parent, and from anything to a
+    page or page tree node, are not followed when working out which objects
+    a page needs.
+    """
+    def __init__(self, reader):
+        self.reader = reader
+        self.refs = {}
+        self.kinds = {}
+        self.order = []
+        self.root = self._key(reader.trailer.raw_get('/Root'))
+        info = reader.trailer.raw_get('/Info') if '/Info' in reader.trailer else None
+        self.info = self._key(info) if isinstance(info, IndirectObject) else None
+        self.pages = [self._key(page.indirect_reference) for page in reader.pages]
+
+        queue = deque(key for key in (self.root, self.info) if key is not None)
+        queued = set(queue)
+        while queue:
+            key = queue.popleft()
+            obj = self.get(key)
+            if obj is None or isinstance(obj, NullObject):
+                continue
+            found = []
+            kind = obj.get('/Type') if isinstance(obj, DictionaryObject) else None
+            if kind in ('/Page', '/Pages', '/Catalog'):
+                self.kinds[key] = kind
+            for name, value in (obj.items() if isinstance(obj, DictionaryObject) else ()):
+                if not (kind == '/Page' and name == '/Parent'):
+                    _references(value, found)
+            if isinstance(obj, ArrayObject):
+                _references(obj, found)
+            self.refs[key] = found
+            self.order.append(key)
+            for target in found:
+                if target not in queued:
+                    queued.add(target)
+                    queue.append(target)
+            # Objects are read again when written; don't keep them all parsed
+            release_parsed_objects(self.reader)
+
+    @staticmethod
+    def _key(reference):
+        return (reference.idnum, reference.generation)
+
+    def get(self, key):
+        return self.reader.get_object(IndirectObject(key[0], key[1], self.reader))
+
+    def contents(self, page):
+        """Return the content stream objects of a page, in drawing order."""
+        found = []
+        obj = self.get(page)
+        if '/Contents' in obj:
+            _references(obj.raw_get('/Contents'), found)
+        streams = []
+        for key in found:
+            # /Contents may point at an array of streams
+            if isinstance(self.get(key), ArrayObject):
+                streams.extend(self.refs.get(key, ()))
+            else:
+                streams.append(key)
+        release_parsed_objects(self.reader)
+        return streams
+
+    def closure(self, keys):
+        """Return keys and everything they need, in the order they are reached, without other pages."""
+        order = [key for key in keys if key in self.refs]
+        seen = set(order)
+        for key in order:
+            for target in self.refs[key]:
+                if target not in seen and target in self.refs and target not in self.kinds:
+                    seen.add(target)
+                    order.append(target)
+        return order
+
+    def document_objects(self):
+        """Return the catalog and the objects a viewer needs from it before the first page."""
+        catalog = self.get(self.root)
+        found = []
+        keys = DOCUMENT_KEYS + (('/Outlines',) if catalog.get('/PageMode') == '/UseOutlines' else ())
+        for name in keys:
+            if name in catalog:
+                _references(catalog.raw_get(name), found)
+        return [self.root] + [key for key in self.closure(found) if key != self.root]
+
+def _page_parts(graph):
+    """
+    Split the objects into the sections of a linearized file: the document
+    objects, the first page, the objects of each other page only it uses,
+    the objects shared by other pages, and everything else. Returns the
+    sections and, per page, the objects it uses from the first page and
+    shared sections.
+    """
+    assigned = set()
+
+    def take(keys):
+        taken = []
+        for key in keys:
+            if key not in assigned:
+                assigned.add(key)
+                taken.append(key)
+        return taken
+
+    document = take(graph.document_objects())
+    first_page = take(graph.closure(graph.pages[:1]))
+    first_page_set = set(first_page)
+
+    closures = [graph.closure([page])[1:] for page in graph.pages[1:]]
+    users = {}
+    for needed in closures:
+        for key in needed:
+            if key not in assigned:
+                users[key] = users.get(key, 0) + 1
+
+    other_pages = []
+    for page, needed in zip(graph.pages[1:], closures):
+        assigned.add(page)
+        other_pages.append([page] + take(key for key in needed if users.get(key) == 1))
+    shared = take(key for needed in closures for key in needed if users.get(key, 0) > 1)
+    shared_set = set(shared)
+    rest = take(graph.order)
+
+    page_shared = [[]] + [[key for key in needed if key in first_page_set or key in shared_set]
+                          for needed in closures]
+    return document, first_page, other_pages, shared, rest, page_shared
+
+def _bits(value):
+    return max(value, 0).bit_length()
+
+def hint_tables(pages, first_page_objects, shared_groups, shared_first_num, page_shared_ids):
+    """
+    Return the hint stream data and the offset of its shared object hint table.
+
+    pages is a list of (offset, length, object count, content stream offset,
+    content stream length) per page; offsets are positions in the file as if
+    the hint stream were not there, except the content stream offset, which
+    is relative to the start of the page (0 when the content stream is not
+    written with the page). shared_groups
+    is a list of (offset, length) for the objects of the first page followed
+    by those of the shared section, and page_shared_ids the indexes into it
+    of the shared objects each page uses.
+    """
+    w = _BitWriter()
+
+    # Page offset hint table
+    counts = [page[2] for page in pages]
+    lengths = [page[1] for page in pages]
+    content_offsets = [page[3] for page in pages]
+    content_lengths = [page[4] for page in pages]
+    least_objects = min(counts)
+    least_length = min(lengths)
+    least_content_offset = min(content_offsets)
+    least_content_length = min(content_lengths)
+    object_bits = _bits(max(counts) - least_objects)
+    length_bits = _bits(max(lengths) - least_length)
+    content_offset_bits = _bits(max(content_offsets) - least_content_offset)
+    content_length_bits = _bits(max(content_lengths) - least_content_length)
+    shared_count_bits = _bits(max(len(ids) for ids in page_shared_ids))
+    shared_id_bits = _bits(len(shared_groups) - 1)
+    for value, nbits in ((least_objects, 32), (pages[0][0], 32), (object_bits, 16), (least_length, 32),
+                         (length_bits, 16), (least_content_offset, 32), (content_offset_bits, 16),
+                         (least_content_length, 32), (content_length_bits, 16),
+                         (shared_count_bits, 16), (shared_id_bits, 16), (0, 16), (1, 16)):
+        w.write(value, nbits)
+    for items, nbits in (([count - least_objects for count in counts], object_bits),
+                         ([length - least_length for length in lengths], length_bits),
+                         ([len(ids) for ids in page_shared_ids], shared_count_bits),
+                         ([i for ids in page_shared_ids for i in ids], shared_id_bits),
+                         ([], 0),
+                         ([offset - least_content_offset for offset in content_offsets], content_offset_bits),
+                         ([length - least_content_length for length in content_lengths], content_length_bits)):
+        for value in items:
+            w.write(value, nbits)
+        w.flush()
+
+    # Shared object hint table, one object per group
+    shared_offset = len(w.data)
+    shared_section = shared_groups[first_page_objects:]
+    least_group = min(length for _, length in shared_groups)
+    group_bits = _bits(max(length for _, length in shared_groups) - least_group)
+    for value, nbits in ((shared_first_num, 32), (shared_section[0][0] if shared_section else 0, 32),
+                         (first_page_objects, 32), (len(shared_groups), 32), (0, 16),
+                         (least_group, 32), (group_bits, 16)):
+        w.write(value, nbits)
+    for _, length in shared_groups:
+        w.write(length - least_group, group_bits)
+    w.flush()
+    for _ in shared_groups:
+        w.write(0, 1)
+    w.flush()
+    return bytes(w.data), shared_offset
+
+def read_hint_tables(data, shared_offset, npages):
+    """Decode the page offset and shared object hint tables written by hint_tables()."""
+    r = _BitReader(data)
+    header = [r.read(nbits) for nbits in (32, 32, 16, 32, 16, 32, 16, 32, 16, 16, 16, 16, 16)]
+    (least_objects, first_offset, object_bits, least_length, length_bits, least_content_offset,
+     content_offset_bits, least_content_length, content_length_bits,
+     shared_count_bits, shared_id_bits, numerator_bits, _) = header
+    counts = [least_objects + r.read(object_bits) for _ in range(npages)]
+    r.flush()
+    lengths = [least_length + r.read(length_bits) for _ in range(npages)]
+    r.flush()
+    nshared = [r.read(shared_count_bits) for _ in range(npages)]
+    r.flush()
+    shared_ids = [[r.read(shared_id_bits) for _ in range(count)] for count in nshared]
+    r.flush()
+    for _ in range(sum(nshared)):
+        r.read(numerator_bits)
+    r.flush()
+    content_offsets = [least_content_offset + r.read(content_offset_bits) for _ in range(npages)]
+    r.flush()
+    content_lengths = [least_content_length + r.read(content_length_bits) for _ in range(npages)]
+    r.flush()
+    offsets = [first_offset]
+    for length in lengths[:-1]:
+        offsets.append(offsets[-1] + length)
+    pages = list(zip(offsets, lengths, counts))
+
+    r = _BitReader(data, shared_offset)
+    first_num, first_location, first_page_objects, ngroups, _, least_group, group_bits = [
+        r.read(nbits) for nbits in (32, 32, 32, 32, 16, 32, 16)]
+    groups = [least_group + r.read(group_bits) for _ in range(ngroups)]
+    return {
+        'pages': pages,
+        'content_streams': list(zip(content_offsets, content_lengths)),
+        'page_shared_ids': shared_ids,
+        'shared_first_num': first_num,
+        'shared_first_offset': first_location,
+        'first_page_objects': first_page_objects,
+        'shared_group_lengths': groups,
+    }
+
+@traced('pdf', memory=True)
+def linearize_pdf(input_path, output_path):
+    """
+    Rewrite a PDF as a linearized ("fast web view") file: the objects of the
+    first page come right after the linearization dictionary and first-page
+    cross-reference table, each other page is followed by the objects only
+    it uses, and hint tables tell a viewer where every page starts. A viewer
+    reading the file over a network can show page one once the first
+    /E bytes have arrived, and fetch any other page by range.
+
+    Objects are copied one at a time through a temporary file, so memory use
+    does not grow with the size of the document. Returns a dict of statistics.
+    """
+    start_time = time.perf_counter()
+    with open(input_path, 'rb') as f:
+        reader = PdfReader(f)
+        if reader.is_encrypted:
+            raise ValueError(f"Can't linearize encrypted PDF {input_path}")
+        if not reader.pages:
+            raise ValueError(f"No pages in {input_path}")
+        version = reader.pdf_header[5:8]
+        graph = _ObjectGraph(reader)
+        document, first_page, other_pages, shared, rest, page_shared = _page_parts(graph)
+
+        # Objects outside the first page section are numbered from 1 in file order;
+        # the first page section (dictionary, document objects, first page, hints) follows
+        main = [key for keys in other_pages for key in keys] + shared + rest
+        numbers = {key: num for num, key in enumerate(main, 1)}
+        main_size = len(main) + 1
+        linearization_num = main_size
+        for num, key in enumerate(document + first_page, linearization_num + 1):
+            numbers[key] = num
+        hint_num = linearization_num + len(document) + len(first_page) + 1
+        size = hint_num + 1
+
+        with tempfile.TemporaryFile() as spool:
+            # Serialize every object once, in file order, and note its length
+            lengths = {}
+            for key in document + first_page + main:
+                num = numbers[key]
+                obj = _renumber(graph.get(key), numbers)
+                begin = spool.tell()
+                spool.write(f"{num} 0 obj\n".encode('ascii'))
+                obj.write_to_stream(spool, None)
+                spool.write(b"\nendobj\n")
+                lengths[num] = spool.tell() - begin
+                release_parsed_objects(reader)
+
+            header = f"%PDF-{version}\n".encode('ascii') + b"%\xe2\xe3\xcf\xd3\n"
+            first_xref_offset = len(header) + LINEARIZATION_DICT_BYTES
+            first_xref_head = f"xref\n{linearization_num} {size - linearization_num}\n".encode('ascii')
+            first_xref_bytes = (len(first_xref_head) + 20 * (size - linearization_num)
+                                + len(b"trailer\n") + FIRST_TRAILER_BYTES + len(b"\nstartxref\n0\n%%EOF\n"))
+
+            # Offsets of everything as if the hint stream were not there, which is how hint tables give them
+            offsets = {}
+            position = first_xref_offset + first_xref_bytes
+            for key in document:
+                offsets[numbers[key]] = position
+                position += lengths[numbers[key]]
+            hint_position = position
+            for key in first_page + main:
+                offsets[numbers[key]] = position
+                position += lengths[numbers[key]]
+
+            def span(keys):
+                """Return the hint table entry of the page whose section is keys (the page object first)."""
+                start = offsets[numbers[keys[0]]]
+                streams = graph.contents(keys[0])
+                content_length = sum(lengths[numbers[key]] for key in streams if key in numbers)
+                content_offset = offsets[numbers[streams[0]]] - start if streams and streams[0] in keys else 0
+                return (start, sum(lengths[numbers[key]] for key in keys), len(keys), content_offset,
+                        content_length)
+
+            shared_ids = {key: i for i, key in enumerate(first_page + shared)}
+            data, shared_table = hint_tables(
+                [span(first_page)] + [span(keys) for keys in other_pages],
+                len(first_page),
+                [(offsets[numbers[key]], lengths[numbers[key]]) for key in first_page + shared],
+                numbers[shared[0]] if shared else 0,
+                [[shared_ids[key] for key in keys] for keys in page_shared],
+            )
+            data = zlib.compress(data, 9)
+            hint = (f"{hint_num} 0 obj\n<< /Filter /FlateDecode /Length {len(data)} /S {shared_table} >>\nstream\n"
+                    .encode('ascii') + data + b"\nendstream\nendobj\n")
+
+            def final(offset):
+                return offset + len(hint) if offset >= hint_position else offset
+
+            end_of_first_page = final(hint_position + sum(lengths[numbers[key]] for key in first_page))
+            main_xref_offset = final(position)
+            main_xref = [f"xref\n0 {main_size}\n", "0000000000 65535 f \n"]
+            main_xref.extend(f"{final(offsets[num]):010d} 00000 n \n" for num in range(1, main_size))
+            main_trailer = f"trailer\n<< /Size {main_size} >>\nstartxref\n{first_xref_offset}\n%%EOF\n"
+            total = main_xref_offset + sum(len(line) for line in main_xref) + len(main_trailer)
+
+            # /T is the offset of the line end just before the first entry of the main xref table
+            first_entry = main_xref_offset + len(main_xref[0]) - 1
+            linearization = (f"{linearization_num} 0 obj\n<< /Linearized 1 /L {total} /H [ {hint_position} {len(hint)} ] "
+                             f"/O {numbers[graph.pages[0]]} /E {end_of_first_page} /N {len(graph.pages)} "
+                             f"/T {first_entry} >>")
+            linearization = linearization.ljust(LINEARIZATION_DICT_BYTES - len("\nendobj\n")) + "\nendobj\n"
+
+            trailer = f"<< /Size {size} /Root {numbers[graph.root]} 0 R"
+            if graph.info is not None and graph.info in numbers:
+                trailer += f" /Info {numbers[graph.info]} 0 R"
+            trailer = (trailer + f" /Prev {main_xref_offset} >>").ljust(FIRST_TRAILER_BYTES)
+            if len(linearization) != LINEARIZATION_DICT_BYTES or len(trailer) != FIRST_TRAILER_BYTES:
+                raise ValueError("Offsets too large for the space reserved for the linearization dictionary")
+            first_xref = [first_xref_head.decode('ascii'), f"{len(header):010d} 00000 n \n"]
+            first_xref.extend(f"{final(offsets[num]):010d} 00000 n \n" for num in range(linearization_num + 1, hint_num))
+            first_xref.append(f"{hint_position:010d} 00000 n \n")
+            first_xref.append(f"trailer\n{trailer}\nstartxref\n0\n%%EOF\n")
+
+            # Write the file: dictionary, first-page xref, document objects, hints, then the rest
+            with open(output_path, 'wb') as out:
+                out.write(header)
+                out.write(linearization.encode('ascii'))
+                out.write(''.join(first_xref).encode('ascii'))
+                spool.seek(0)
+                document_bytes = sum(lengths[numbers[key]] for key in document)
+                out.write(spool.read(document_bytes))
+                out.write(hint)
+                while True:
+                    block = spool.read(1 << 20)
+                    if not block:
+                        break
+                    out.write(block)
+                out.write(''.join(main_xref).encode('ascii'))
+                out.write(main_trailer.encode('ascii'))
+                output_bytes = out.tell()
+
+    if output_bytes != total:
+        raise ValueError(f"Linearized {output_path} is {output_bytes} bytes, expected {total}")
+    return {
+        'pages': len(graph.pages),
+        'objects': size - 1,
+        'bytes': output_bytes,
+        'first_page_bytes': end_of_first_page,
+        'hint_bytes': len(hint),
+        'shared_objects': len(shared),
+        'seconds': time.perf_counter() - start_time,
+    }
+
+def linearization_parameters(path):
+    """Return the linearization dictionary of a PDF as a dict of ints (H as a list), or None if it has none."""
+    with open(path, 'rb') as f:
+        head = f.read(LINEARIZATION_WINDOW)
+    match = re.search(rb'^\s*%PDF-\d\.\d[^\n]*\n(?:%[^\n]*\n)?\s*(\d+) 0 obj\s*<<(.*?)>>', head, re.S)
+    if not match or b'/Linearized' not in match.group(2):
+        return None
+    body = match.group(2).decode('latin-1')
+    params = {'object': int(match.group(1))}
+    for name, value in re.findall(r'/(\w+)\s*(\[[^\]]*\]|[\d.]+)', body):
+        numbers = [int(float(number)) for number in re.findall(r'[\d.]+', value)]
+        params[name] = numbers if value.startswith('[') else numbers[0]
+    return params
+
+def check_linearization(path):
+    """
+    Check that a PDF is a valid linearized file and measure how much of it a
+    viewer needs for the first page. Returns a dict with 'linearized',
+    'problems' (empty when the file is valid), 'bytes' and 'first_page_bytes',
+    which is the whole file when it is not linearized: a viewer then has to
+    read the cross-reference table at the end before it can find page one.
+    """
+    size = os.path.getsize(path)
+    result = {'linearized': False, 'problems': [], 'bytes': size, 'first_page_bytes': size}
+    problems = result['problems']
+    params = linearization_parameters(path)
+    if params is None:
+        problems.append("No linearization dictionary in the first 1024 bytes")
+        return result
+    result['linearized'] = True
+    for name in ('L', 'H', 'O', 'E', 'N', 'T'):
+        if name not in params:
+            problems.append(f"Linearization dictionary has no /{name}")
+    if problems:
+        return result
+    if params['L'] != size:
+        problems.append(f"/L is {params['L']}, but the file is {size} bytes")
+
+    with open(path, 'rb') as f:
+        reader = PdfReader(f)
+        graph = _ObjectGraph(reader)
+        pages = len(graph.pages)
+        result['pages'] = pages
+        if params['N'] != pages:
+            problems.append(f"/N is {params['N']}, but the file has {pages} pages")
+        if not pages:
+            return result
+        if params['O'] != graph.pages[0][0]:
+            problems.append(f"/O is {params['O']}, but the first page is object {graph.pages[0][0]}")
+
+        # Everything the first page needs must be within the first /E bytes
+        offsets = reader.xref.get(0, {})
+        first_page_keys = graph.document_objects() + graph.closure(graph.pages[:1])
+        late = [key for key in first_page_keys if offsets.get(key[0], size) >= params['E']]
+        if late:
+            problems.append(f"{len(late)} objects of the first page are after /E")
+        result['first_page_bytes'] = params['E']
+
+        f.seek(params['T'])
+        if not re.match(rb'\s\d{10} \d{5} f', f.read(20)):
+            problems.append("/T doesn't point at the first entry of the main cross-reference table")
+
+        # The hint tables must describe where each page really starts
+        hint_offset, hint_length = params['H'][:2]
+        f.seek(hint_offset)
+        match = re.match(rb'(\d+) 0 obj\s*<<(.*?)>>\s*stream\r?\n', f.read(512), re.S)
+        if not match:
+            problems.append("/H doesn't point at the hint stream")
+            return result
+        stream = graph.get((int(match.group(1)), 0))
+        try:
+            hints = read_hint_tables(stream.get_data(), stream['/S'], pages)
+        except (IndexError, KeyError, ValueError):
+            problems.append("Hint tables can't be read")
+            return result
+
+        def adjusted(offset):
+            # Hint tables give offsets as if the hint stream were not there
+            return offset - hint_length if offset > hint_offset else offset
+
+        for i, (offset, length, count) in enumerate(hints['pages']):
+            actual = adjusted(offsets.get(graph.pages[i][0], -1))
+            if offset != actual:
+                problems.append(f"Hint tables put page {i + 1} at offset {offset}, but it is at {actual}")
+                break
+
+        # An object runs up to the next object, the hint stream or the main cross-reference table
+        f.seek(max(params['T'] - 32, 0))
+        before_t = f.read(min(params['T'], 32))
+        ends = sorted(set(offsets.values()) | {hint_offset, params['T'] - len(before_t) + before_t.rfind(b'xref')})
+
+        def object_length(key):
+            start = offsets[key[0]]
+            return ends[bisect.bisect_right(ends, start)] - start
+
+        # And where each page's content stream is and how long it is
+        for i, ((offset, length, _), (content_offset, content_length)) in enumerate(
+                zip(hints['pages'], hints['content_streams'])):
+            streams = graph.contents(graph.pages[i])
+            if any(key[0] not in offsets for key in streams):
+                continue
+            actual_length = sum(object_length(key) for key in streams)
+            if content_length != actual_length:
+                problems.append(f"Hint tables give page {i + 1} a content stream of {content_length} bytes, "
+                                f"but it is {actual_length}")
+                break
+            # Only a content stream written with its page has an offset within it
+            relative = adjusted(offsets[streams[0][0]]) - offset if streams else 0
+            actual_offset = relative if 0 <= relative < length else 0
+            if content_offset != actual_offset:
+                problems.append(f"Hint tables put the content stream of page {i + 1} at {content_offset} bytes "
+                                f"into the page, but it is at {actual_offset}")
+                break
+        if hints['first_page_objects'] > len(hints['shared_group_lengths']):
+            problems.append("Shared object hint table has fewer groups than the first page")
+        result['hint_bytes'] = hint_length
+    return result
+
+def format_linearization(result):
+    """Return a one-line summary of check_linearization()."""
+    if not result['linearized']:
+        return f"not linearized; the whole file ({result['bytes'] / 1024:.1f} KB) is needed before page one"
+    state = 'valid' if not result['problems'] else 'INVALID: ' + '; '.join(result['problems'])
+    return (f"linearized, {state}; page one needs the first {result['first_page_bytes'] / 1024:.1f} KB "
+            f"of {result['bytes'] / 1024:.1f} KB ({result['first_page_bytes'] / result['bytes']:.1%})")
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python pdf_linearize.py INPUT.pdf [OUTPUT.pdf]")
+        print("With one file, check it; with two, write a linearized copy of INPUT to OUTPUT and check that.")
+        sys.exit(1)
+    path = sys.argv[-1]
+    if len(sys.argv) == 3:
+        stats = linearize_pdf(sys.argv[1], path)
+        print(f"Linearized PDF written to: {path} ({stats['pages']} pages in {stats['seconds']:.2f}s)")
+    result = check_linearization(path)
+    print(f"{path}: {format_linearization(result)}")
+    sys.exit(1 if result['problems'] and result['linearized'] else 0)
@@ -0,0 +1,276 @@
+import hashlib
+import json
+import os
+import time
+from PyPDF2 import PdfReader
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, NumberObject, StreamObject
+from build_cache import hash_file
+from pdf_assembly import PdfStreamWriter, _ObjectCopier, _serialize, assemble_pdf, ref, source_outline, write_outline
+from tracing import traced
+
+# Bump when the state file layout changes; an old state forces a full rewrite
+UPDATE_STATE_VERSION = 2
+
+# Updates appended before the file is compacted back into a clean full rewrite
+COMPACT_EVERY = 20
+
+# Compact sooner once the appended updates grow the file by this share of its compacted size
+COMPACT_GROWTH = 0.5
+
+# When more than this share of the pages changed, a full rewrite is as cheap and leaves no garbage
+MAX_CHANGED_SHARE = 0.5
+
+def update_state_path(pdf_path):
+    """Return the path of the state file kept next to an incrementally updated PDF."""
+    return os.path.splitext(pdf_path)[0] + '.update.json'
+
+def load_update_state(state_path, pdf_path):
+    """Return the saved state of pdf_path, or None if there is none or the PDF no longer matches it."""
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get('version') != UPDATE_STATE_VERSION:
+        return None
+    # Anything else writing the PDF leaves the recorded offsets and object numbers meaningless;
+    # the size check is a shortcut, the content hash catches a rewrite to the same size
+    if not os.path.exists(pdf_path) or os.path.getsize(pdf_path) != state.get('bytes'):
+        return None
+    if hash_file(pdf_path) != state.get('sha256'):
+        return None
+    return state
+
+def save_update_state(state_path, state):
+    state['version'] = UPDATE_STATE_VERSION
+    tmp_path = f"{state_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, separators=(',', ':'))
+    os.replace(tmp_path, state_path)
+
+class _PageFingerprints:
+    """
+    Content hashes of source pages. A page's hash covers its content streams
+    and everything they reference (fonts, images), with references to other
+    selected pages hashed as their output position, so a page that did not
+    change hashes the same in every build.
+    """
+    def __init__(self, readers, page_index):
+        self.readers = readers
+        self.page_index = page_index
+        self.memo = {}
+        self.active = set()
+
+    def page(self, source, page):
+        """Return the hex digest of a page."""
+        data = self._hash(source, DictionaryObject({key: value for key, value in page.items() if key != '/Parent'}))
+        return hashlib.sha256(data).hexdigest()
+
+    def _hash(self, source, value):
+        if isinstance(value, IndirectObject):
+            key = (source, value.idnum, value.generation)
+            index = self.page_index.get(key)
+            if index is not None:
+                return b'I%d' % index
+            if key in self.memo:
+                return b'R' + self.memo[key]
+            if key in self.active:
+                # A reference cycle; the objects on it are hashed by their contents without it
+                return b'C'
+            self.active.add(key)
+            obj = self.readers[source].get_object(value)
+            if isinstance(obj, DictionaryObject) and obj.get('/Type') in ('/Page', '/Pages'):
+                # A page that isn't part of the output (or a page tree node)
+                data = b'X'
+            else:
+                data = self._hash(source, obj)
+            self.active.discard(key)
+            digest = hashlib.sha256(data).digest()
+            self.memo[key] = digest
+            return b'R' + digest
+        if isinstance(value, DictionaryObject):
+            parts = [b'<<']
+            for name in sorted(value):
+                if name != '/Length':
+                    parts.append(name.encode('utf-8'))
+                    parts.append(self._hash(source, value[name]))
+            parts.append(b'>>')
+            if isinstance(value, StreamObject):
+                parts.append(b'S' + hashlib.sha256(value._data).digest())
+            return b' '.join(parts)
+        if isinstance(value, ArrayObject):
+            return b' '.join([b'['] + [self._hash(source, item) for item in value] + [b']'])
+        return type(value).__name__.encode('ascii') + _serialize(value)
+
+def _full_rewrite(output_path, parts, outline, fingerprints, state_path, reason, start_time):
+    layout = {}
+    stats = assemble_pdf(output_path, parts, outline, optimize=True, layout=layout)
+    layout['fingerprints'] = fingerprints
+    layout['updates'] = 0
+    layout['compacted_bytes'] = layout['bytes']
+    layout['sha256'] = hash_file(output_path)
+    save_update_state(state_path, layout)
+    stats.update({'mode': 'full', 'reason': reason, 'pages_written': stats['pages'],
+                  'seconds': time.perf_counter() - start_time})
+    return stats
+
+@traced('pdf', memory=True)
+def update_pdf(output_path, parts, outline=None, compact_every=COMPACT_EVERY):
+    """
+    Bring output_path up to date with parts (as taken by assemble_pdf) by
+    appending an incremental update section: only pages whose content hash
+    differs from the previous build are written, under the object numbers
+    their old versions had, so the page tree, the outline and links to them
+    stay valid. A new page tree and outline are only written when the page
+    count or the headings change. Unchanged pages, fonts and images stay where
+    they are in the file.
+
+    The file is rewritten in full (compacted) when there is no usable state
+    from a previous build, after compact_every updates, once the updates have
+    grown the file by COMPACT_GROWTH, or when most pages changed anyway.
+
+    Returns a dict of statistics about the run; 'mode' is 'full', 'update' or
+    'unchanged'.
+    """
+    start_time = time.perf_counter()
+    state_path = update_state_path(output_path)
+    state = load_update_state(state_path, output_path)
+
+    files = {}
+    readers = {}
+    try:
+        for pdf_path, _, _ in parts:
+            if pdf_path not in readers:
+                files[pdf_path] = open(pdf_path, 'rb')
+                readers[pdf_path] = PdfReader(files[pdf_path])
+
+        # The output position of every selected page, and the outline over them
+        selected = []
+        source_entries = []
+        for pdf_path, start, end in parts:
+            reader = readers[pdf_path]
+            end = len(reader.pages) if end is None else min(end, len(reader.pages))
+            if outline is None:
+                source_entries.extend(source_outline(reader, start, end, len(selected)))
+            selected.extend((pdf_path, reader.pages[i]) for i in range(start, end))
+        if outline is None:
+            outline = source_entries
+        outline = [list(entry) for entry in outline]
+        page_index = {}
+        for i, (pdf_path, page) in enumerate(selected):
+            reference = page.indirect_reference
+            page_index[(pdf_path, reference.idnum, reference.generation)] = i
+
+        hasher = _PageFingerprints(readers, page_index)
+        fingerprints = [hasher.page(pdf_path, page) for pdf_path, page in selected]
+
+        # Step 1: decide between an update and a full rewrite
+        reason = None
+        if state is None:
+            reason = "no state from a previous build matches the file"
+        elif state['updates'] >= compact_every:
+            reason = f"compacting after {state['updates']} updates"
+        elif state['bytes'] > state['compacted_bytes'] * (1 + COMPACT_GROWTH):
+            reason = f"compacting after updates grew the file to {state['bytes'] / 1024:.0f} KB"
+        else:
+            old_fingerprints = state['fingerprints']
+            changed = [i for i, digest in enumerate(fingerprints)
+                       if i >= len(old_fingerprints) or digest != old_fingerprints[i]]
+            if len(changed) > len(selected) * MAX_CHANGED_SHARE:
+                reason = f"{len(changed)} of {len(selected)} pages changed"
+        if reason is not None:
+            for f in files.values():
+                f.close()
+            files = {}
+            return _full_rewrite(output_path, parts, outline, fingerprints, state_path, reason, start_time)
+
+        old_pages = state['page_objects']
+        outline_changed = outline != state['outline']
+        if not changed and len(selected) == len(old_pages) and not outline_changed:
+            return {'mode': 'unchanged', 'pages': len(selected), 'pages_written': 0, 'objects': 0,
+                    'bytes': state['bytes'], 'bytes_appended': 0, 'updates': state['updates'],
+                    'seconds': time.perf_counter() - start_time}
+
+        # Step 2: append the replaced pages, the page tree and the outline
+        with open(output_path, 'r+b') as out:
+            previous_bytes = out.seek(0, os.SEEK_END)
+            writer = PdfStreamWriter(out, next_num=state['size'], prev_xref=state['xref'])
+            copier = _ObjectCopier(writer, readers, optimize=True)
+            # Fonts and images already in the file are referenced instead of written again
+            copier.by_digest = {bytes.fromhex(digest): num for digest, num in state['objects'].items()}
+            pages_num = state['pages_object']
+            catalog_num = state['catalog_object']
+
+            # A replaced page takes over its old object number; only added pages get new ones
+            page_nums = old_pages[:len(selected)]
+            page_nums.extend(writer.reserve() for _ in range(len(page_nums), len(selected)))
+            for (pdf_path, page), num in zip(selected, page_nums):
+                reference = page.indirect_reference
+                copier.pages[(pdf_path, reference.idnum, reference.generation)] = num
+
+            for i in changed:
+                pdf_path, page = selected[i]
+                page_copy = copier.remap(DictionaryObject({
+                    key: value for key, value in page.items() if key != '/Parent'
+                }), pdf_path)
+                page_copy[NameObject('/Parent')] = ref(pages_num)
+                writer.write_object(page_nums[i], page_copy)
+                copier.drain()
+
+            if page_nums != old_pages:
+                writer.write_object(pages_num, DictionaryObject({
+                    NameObject('/Type'): NameObject('/Pages'),
+                    NameObject('/Kids'): ArrayObject(ref(num) for num in page_nums),
+                    NameObject('/Count'): NumberObject(len(page_nums)),
+                }))
+
+            outline_num = state['outline_object']
+            if outline_changed:
+                outline_num = write_outline(writer, outline, page_nums)
+                catalog = DictionaryObject({
+                    NameObject('/Type'): NameObject('/Catalog'),
+                    NameObject('/Pages'): ref(pages_num),
+                })
+                if outline_num is not None:
+                    catalog[NameObject('/Outlines')] = ref(outline_num)
+                writer.write_object(catalog_num, catalog)
+
+            writer.finish(catalog_num, state['info_object'])
+            output_bytes = out.tell()
+    finally:
+        for f in files.values():
+            f.close()
+
+    state.update({
+        'page_objects': page_nums,
+        'fingerprints': fingerprints,
+        'outline': outline,
+        'outline_object': outline_num,
+        'size': writer.next_num,
+        'xref': writer.xref_offset,
+        'objects': {digest.hex(): num for digest, num in copier.by_digest.items()},
+        'updates': state['updates'] + 1,
+        'bytes': output_bytes,
+        'sha256': hash_file(output_path),
+    })
+    save_update_state(state_path, state)
+    return {
+        'mode': 'update',
+        'pages': len(selected),
+        'pages_written': len(changed),
+        'objects': len(writer.offsets),
+        'bytes': output_bytes,
+        'bytes_appended': output_bytes - previous_bytes,
+        'updates': state['updates'],
+        'seconds': time.perf_counter() - start_time,
+    }
+
+def format_update(stats, compact_every=COMPACT_EVERY):
+    """Return a one-line summary of update_pdf statistics."""
+    if stats['mode'] == 'unchanged':
+        return f"no pages changed, {stats['pages']} pages left as they are ({stats['seconds']:.3f}s)"
+    if stats['mode'] == 'full':
+        return f"rewritten in full ({stats['reason']}), {stats['bytes'] / 1024:.1f} KB in {stats['seconds']:.3f}s"
+    return (f"{stats['pages_written']} of {stats['pages']} pages replaced, {stats['objects']} objects "
+            f"({stats['bytes_appended'] / 1024:.1f} KB) appended in {stats['seconds']:.3f}s "
+            f"(update {stats['updates']} of {compact_every} before compaction)")
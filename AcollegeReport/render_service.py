@@ -0,0 +1,441 @@
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import re
+import shutil
+import signal
+import tempfile
+import threading
+import time
+import traceback
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from batch import ACKNOWLEDGEMENT_FIELDS, build_report, init_worker
+from images import _IMAGE_REF, restrict_images
+
+# Largest request body accepted, in bytes
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+
+# Latencies kept for the percentiles in /metrics
+LATENCY_WINDOW = 1000
+
+_UNSAFE_NAME = re.compile(r'[^A-Za-z0-9_.-]+')
+
+# Cover fields a request may set (see report.DEFAULT_COVER)
+COVER_FIELDS = ['title', 'subtitle', 'prepared_by', 'course', 'date']
+
+# Modules the render processes start with already loaded (see init_worker)
+PRELOAD_MODULES = ['batch', 'acknowledgement', 'create_index', 'create_final_report', 'report',
+                   'single_document', 'images']
+
+# Longest error message from a failed render passed back to the client
+MAX_MESSAGE_CHARS = 300
+
+# ReportLab's paragraph parser; a ValueError raised there means markup it can't parse
+_PARAPARSER = os.path.join('platypus', 'paraparser.py')
+
+class ServiceBusy(Exception):
+    """Raised when the request queue is full."""
+
+class BadContent(Exception):
+    """Raised when a render fails because of the request's content, such as invalid markup."""
+
+class Metrics:
+    """Request counters, queue depth and recent latencies, shared by the handler threads."""
+    def __init__(self, workers):
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.counts = {'requests': 0, 'ok': 0, 'rejected': 0, 'timed_out': 0, 'failed': 0, 'bad_request': 0}
+        self.pending = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def submitted(self):
+        with self.lock:
+            self.pending += 1
+
+    def finished(self):
+        with self.lock:
+            self.pending -= 1
+
+    def record(self, seconds):
+        with self.lock:
+            self.counts['ok'] += 1
+            self.latencies.append(seconds)
+
+    def snapshot(self):
+        """Return the metrics as a JSON-ready dict."""
+        with self.lock:
+            latencies = sorted(self.latencies)
+            snapshot = dict(self.counts)
+            # Renders beyond the worker count are waiting for a free worker
+            snapshot['in_flight'] = min(self.pending, self.workers)
+            snapshot['queue_depth'] = max(0, self.pending - self.workers)
+        snapshot['uptime_seconds'] = round(time.time() - self.started, 1)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))], 4)
+
+        snapshot['latency_seconds'] = {
+            'count': len(latencies),
+            'mean': round(sum(latencies) / len(latencies), 4) if latencies else None,
+            'p50': percentile(50),
+            'p95': percentile(95),
+            'p99': percentile(99),
+            'max': round(latencies[-1], 4) if latencies else None,
+        }
+        return snapshot
+
+def parse_request(payload):
+    """
+    Validate a render request and return (sections, cover, acknowledgement).
+
+    payload is a JSON object with "sections", a list of {"name", "markdown"}
+    objects in report order, and optional "cover" and "acknowledgement"
+    objects with the same fields a batch manifest takes.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("The request must be a JSON object")
+    sections = payload.get('sections')
+    if not isinstance(sections, list) or not sections:
+        raise ValueError("'sections' must be a non-empty list")
+    for section in sections:
+        if not isinstance(section, dict) or not isinstance(section.get('markdown'), str):
+            raise ValueError("Every section needs a 'markdown' string")
+        if section.get('name') is not None and not isinstance(section['name'], str):
+            raise ValueError("A section 'name' must be a string")
+        for match in _IMAGE_REF.finditer(section['markdown']):
+            src = match.group(1) or match.group(2)
+            if os.path.isabs(src) or os.path.normpath(src).split(os.sep)[0] == '..':
+                raise ValueError(f"Image paths must be relative to the image directory: {src[:100]}")
+    cover = payload.get('cover') or {}
+    acknowledgement = payload.get('acknowledgement') or {}
+    if not isinstance(cover, dict) or not isinstance(acknowledgement, dict):
+        raise ValueError("'cover' and 'acknowledgement' must be objects")
+    for name, fields, values in (('cover', COVER_FIELDS, cover),
+                                 ('acknowledgement', ACKNOWLEDGEMENT_FIELDS, acknowledgement)):
+        unknown = set(values) - set(fields)
+        if unknown:
+            raise ValueError(f"Unknown {name} fields: {', '.join(sorted(unknown))}")
+        for key, value in values.items():
+            if value is not None and not isinstance(value, str):
+                raise ValueError(f"'{name}.{key}' must be a string")
+    return sections, cover, acknowledgement
+
+def write_sections(contents_dir, sections):
+    """Write the sections as content files whose sorted order is the request order."""
+    os.makedirs(contents_dir)
+    for i, section in enumerate(sections):
+        name = _UNSAFE_NAME.sub('_', section.get('name') or 'section')[:60]
+        with open(os.path.join(contents_dir, f"{i:04d}_{name}.txt"), 'w', encoding='utf-8') as f:
+            f.write(section['markdown'])
+
+def _worker_main(conn, single_build, image_root):
+    """Entry point of a render worker: load the modules once, then render each job it is sent."""
+    if hasattr(os, 'setpgrp'):
+        # Its own process group, so a timeout also stops any workers it started
+        os.setpgrp()
+    init_worker()
+    conn.send('ready')
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        restrict_images(image_root or job['contents'])
+        conn.send(build_report(job, False, single_build))
+
+class _Worker:
+    """A render process and the pipe to it."""
+    def __init__(self, context, single_build, image_root):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, single_build, image_root),
+                                       daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+
+    def receive(self, deadline):
+        """Return the next message from the worker; raises TimeoutError if none comes by the deadline."""
+        if not self.conn.poll(max(0, deadline - time.monotonic())):
+            raise TimeoutError()
+        return self.conn.recv()
+
+class RenderService:
+    """
+    Renders reports on a fixed set of long-lived worker processes, started
+    from a warm server process that has the report modules loaded. Each
+    worker keeps its styles and cache entries in memory from one render to
+    the next. At most workers renders run at once and workers + max_queue are accepted;
+    further requests are rejected right away instead of piling up. A render
+    that outlives the timeout is killed with its worker, which is replaced,
+    so it frees its slot.
+
+    Image references in the content are taken from image_root, and nothing
+    outside it is read; without an image_root requests can't use images.
+    """
+    def __init__(self, workers=None, max_queue=8, timeout=120, single_build=False, work_root=None,
+                 image_root=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.single_build = single_build
+        self.image_root = image_root and os.path.abspath(image_root)
+        self.work_root = work_root or tempfile.mkdtemp(prefix='report-service-')
+        self.slots = threading.BoundedSemaphore(self.workers + max_queue)
+        self.metrics = Metrics(self.workers)
+        # The handlers run in threads, and forking a threaded process can deadlock
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        self.context = multiprocessing.get_context(method)
+        if method == 'forkserver':
+            self.context.set_forkserver_preload(PRELOAD_MODULES)
+        self.lock = threading.Lock()
+        self.closed = False
+        self.pool = set()
+        self.idle = queue.Queue()
+        for _ in range(self.workers):
+            self.idle.put(self._start_worker())
+
+    def _start_worker(self):
+        worker = _Worker(self.context, self.single_build, self.image_root)
+        with self.lock:
+            self.pool.add(worker)
+        return worker
+
+    def warm_up(self):
+        """Wait for every worker to load the modules, so the first requests don't pay for it."""
+        with self.lock:
+            workers = list(self.pool)
+        for worker in workers:
+            try:
+                worker.conn.recv()
+            except EOFError:
+                worker.process.join()
+                raise RuntimeError(f"Render worker exited with code {worker.process.exitcode}") from None
+            worker.ready = True
+
+    def _kill(self, process):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (AttributeError, OSError):
+            # No process groups here, or the worker hasn't made its own yet
+            process.kill()
+
+    def _replace(self, worker):
+        """Stop a worker whose render timed out or broke, and start a new one in its place."""
+        self._kill(worker.process)
+        worker.process.join()
+        worker.conn.close()
+        with self.lock:
+            self.pool.discard(worker)
+            if self.closed:
+                return
+        self.idle.put(self._start_worker())
+
+    def _run(self, job, deadline):
+        try:
+            worker = self.idle.get(timeout=max(0, deadline - time.monotonic()))
+        except queue.Empty:
+            raise TimeoutError() from None
+        try:
+            if not worker.ready:
+                worker.receive(deadline)
+                worker.ready = True
+            worker.conn.send(job)
+            result = worker.receive(deadline)
+        except TimeoutError:
+            self._replace(worker)
+            raise
+        except (EOFError, OSError):
+            self._replace(worker)
+            raise RuntimeError(f"Render process exited with code {worker.process.exitcode}") from None
+        except BaseException:
+            self._replace(worker)
+            raise
+        self.idle.put(worker)
+        return result
+
+    def render(self, sections, cover, acknowledgement):
+        """
+        Render a report and return (pdf bytes, result). Raises ServiceBusy when
+        the queue is full, TimeoutError when waiting for a worker and rendering
+        take longer than the timeout (the render is stopped), BadContent when
+        the content can't be laid out and RuntimeError when the render fails
+        otherwise.
+        """
+        if not self.slots.acquire(blocking=False):
+            raise ServiceBusy()
+        deadline = time.monotonic() + self.timeout
+        work_dir = tempfile.mkdtemp(dir=self.work_root)
+        self.metrics.submitted()
+        try:
+            write_sections(os.path.join(work_dir, 'contents'), sections)
+            job = {
+                'name': os.path.basename(work_dir),
+                'contents': os.path.join(work_dir, 'contents'),
+                'work_dir': work_dir,
+                'output': os.path.join(work_dir, 'report.pdf'),
+                'cover': cover,
+                'acknowledgement': acknowledgement,
+            }
+            result = self._run(job, deadline)
+            if not result['ok']:
+                print(f"Error: Render {job['name']} failed:\n{result['error']}")
+                # ReportLab's paragraph parser raises ValueError for markup it can't parse;
+                # a ValueError from anywhere else is a bug, not the client's fault
+                if result['exception'] == 'ValueError' and _PARAPARSER in result['error']:
+                    raise BadContent((result['message'].strip().splitlines() or ['invalid markup'])[0][:MAX_MESSAGE_CHARS])
+                raise RuntimeError(f"{result['exception']} in render {job['name']}")
+            with open(result['output'], 'rb') as f:
+                return f.read(), result
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            self.metrics.finished()
+            self.slots.release()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            workers = list(self.pool)
+        for worker in workers:
+            self._kill(worker.process)
+        shutil.rmtree(self.work_root, ignore_errors=True)
+
+class RenderHandler(BaseHTTPRequestHandler):
+    """POST /render returns a PDF; GET /metrics and GET /health return JSON."""
+    server_version = "ReportRenderService/1.0"
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body, indent=1).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            self._send_json(200, self.server.service.metrics.snapshot())
+        elif self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        else:
+            self._send_json(404, {'error': f"Not found: {self.path}"})
+
+    def do_POST(self):
+        if self.path != '/render':
+            self._send_json(404, {'error': f"Not found: {self.path}"})
+            return
+        service = self.server.service
+        metrics = service.metrics
+        metrics.count('requests')
+        start = time.perf_counter()
+
+        try:
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+            except ValueError:
+                raise ValueError("Invalid Content-Length") from None
+            if length < 0:
+                raise ValueError("Invalid Content-Length")
+            if length > MAX_REQUEST_BYTES:
+                metrics.count('bad_request')
+                self._send_json(413, {'error': f"Request body over {MAX_REQUEST_BYTES} bytes"})
+                return
+            try:
+                payload = json.loads(self.rfile.read(length))
+            except ValueError:
+                raise ValueError("The request body must be JSON") from None
+            sections, cover, acknowledgement = parse_request(payload)
+        except ValueError as e:
+            metrics.count('bad_request')
+            self._send_json(400, {'error': str(e)})
+            return
+
+        try:
+            pdf, result = service.render(sections, cover, acknowledgement)
+        except ServiceBusy:
+            metrics.count('rejected')
+            self._send_json(503, {'error': "Render queue is full"}, {'Retry-After': '1'})
+            return
+        except TimeoutError:
+            metrics.count('timed_out')
+            self._send_json(504, {'error': f"Render took longer than {service.timeout}s and was stopped"})
+            return
+        except BadContent as e:
+            metrics.count('bad_request')
+            self._send_json(400, {'error': f"The content could not be rendered: {e}"})
+            return
+        except RuntimeError:
+            # The details are in the service log; they are no business of the client
+            metrics.count('failed')
+            self._send_json(500, {'error': "Render failed"})
+            return
+        except Exception:
+            # Such as an OSError writing the sections when the disk is full
+            print(f"Error: Render request failed:\n{traceback.format_exc()}")
+            metrics.count('failed')
+            self._send_json(500, {'error': "Render failed"})
+            return
+
+        elapsed = time.perf_counter() - start
+        metrics.record(elapsed)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/pdf')
+        self.send_header('Content-Length', str(len(pdf)))
+        self.send_header('X-Pages', str(result['pages']))
+        self.send_header('X-Render-Seconds', f"{result['seconds']:.3f}")
+        self.end_headers()
+        self.wfile.write(pdf)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+def main(argv=None):
+    """Serve report renders over HTTP on this machine."""
+    parser = argparse.ArgumentParser(description="Local HTTP service that renders reports from markdown sections.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="port to listen on")
+    parser.add_argument("--workers", "-j", type=int, default=os.cpu_count() or 1,
+                        help="render worker processes; each runs one render at a time")
+    parser.add_argument("--max-queue", type=int, default=8,
+                        help="renders allowed to wait for a worker before requests are rejected with 503")
+    parser.add_argument("--timeout", type=float, default=120,
+                        help="seconds a request may wait and render before the render is stopped with a 504")
+    parser.add_argument("--image-root",
+                        help="directory the images referenced in requests are taken from; nothing outside it is read")
+    parser.add_argument("--single-build", action="store_true",
+                        help="render each report as one document, without intermediate PDFs")
+    parser.add_argument("--quiet", action="store_true", help="don't log every request")
+    args = parser.parse_args(argv)
+
+    service = RenderService(args.workers, args.max_queue, args.timeout, args.single_build,
+                            image_root=args.image_root)
+    print("Loading report modules...")
+    service.warm_up()
+
+    server = ThreadingHTTPServer((args.host, args.port), RenderHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.quiet = args.quiet
+    print(f"Render service listening on http://{args.host}:{server.server_address[1]} "
+          f"(POST /render, GET /metrics). Press Ctrl+C to stop.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping render service.")
+    finally:
+        server.server_close()
+        service.close()
+
+if __name__ == "__main__":
+    main()
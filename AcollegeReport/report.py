@@ -1,189 +1,393 @@
 import os
 from datetime import datetime
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, PageBreak, Spacer
-from reportlab.platypus.tableofcontents import TableOfContents
-from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
-from reportlab.lib import colors
-import markdown2
 import re
+from html import escape, unescape
+import tracing
+from build_cache import BuildCache, hash_bytes
+from images import image_flowable, resolve_inline_images
+from heading_manifest import heading_manifest_path, load_heading_manifest, write_heading_manifest
+from markdown_flowables import parse_markdown, blocks_to_flowables, list_flowable
+from report_styles import get_styles, make_doc_template
+
+# Bump when the section parser changes so cached sections are rebuilt
+SECTION_FORMAT_VERSION = 5
+
+# Cover page fields; a report can override any of them
+DEFAULT_COVER = {
+    'title': "xShop Management System",
+    'subtitle': "Project Documentation Report",
+    'prepared_by': "[Your Name]",
+    'course': "[Your Course]",
+    'date': None,  # today
+}
+
+# Styles whose settings affect the parsed section cache
+CUSTOM_STYLE_NAMES = ['CustomTitle', 'CustomHeading1', 'CustomHeading2', 'CustomNormal', 'CustomCode', 'TOCHeading']
+
+# markdown2 gets slower than linear on long inputs, so big files are converted in pieces of about this size
+MARKDOWN_CHUNK_CHARS = 64 * 1024
+
+_LIST_START = re.compile(r'([-*+]|\d+[.)])\s')
+_LINK_DEFINITION = re.compile(r'^\s{0,3}\[[^\]]+\]:\s', re.MULTILINE)
+
+def markdown_chunks(markdown_text, size=MARKDOWN_CHUNK_CHARS):
+    """
+    Split markdown into pieces of at least `size` characters that convert
+    independently: cuts are only made at a blank line outside code fences
+    that is followed by an unindented line that does not continue a list.
+    """
+    # Reference-style links may point anywhere in the file, so keep it whole
+    if len(markdown_text) <= size or _LINK_DEFINITION.search(markdown_text):
+        return [markdown_text]
+    
+    lines = markdown_text.split('\n')
+    chunks = []
+    start = 0
+    length = 0
+    fence = None
+    for i, line in enumerate(lines):
+        stripped = line.lstrip()
+        if stripped.startswith('```') or stripped.startswith('~~~'):
+            if fence is None:
+                fence = stripped[:3]
+            elif stripped.startswith(fence):
+                fence = None
+        length += len(line) + 1
+        if (length >= size and fence is None and not line.strip() and i + 1 < len(lines)
+                and lines[i + 1].strip() and not lines[i + 1][0].isspace()
+                and not _LIST_START.match(lines[i + 1])):
+            chunks.append('\n'.join(lines[start:i + 1]))
+            start = i + 1
+            length = 0
+    chunks.append('\n'.join(lines[start:]))
+    return chunks
 
 def convert_markdown_to_html(markdown_text):
     """Convert markdown text to HTML for ReportLab."""
-    # Use markdown2 to convert the text
-    html = markdown2.markdown(markdown_text)
+    # Only the HTML path needs markdown2, so import it on first use
+    import markdown2
+    
+    # Use markdown2 to convert the text; fenced code becomes <pre> blocks
+    html = '\n'.join(markdown2.markdown(chunk, extras=['fenced-code-blocks'])
+                     for chunk in markdown_chunks(markdown_text))
     
     # Clean up some markdown elements not perfectly handled by reportlab
     html = html.replace('<code>', '<font face="Courier">')
     html = html.replace('</code>', '</font>')
     
-    # Replace markdown code blocks with styled text
-    code_block_pattern = r'<pre><code>(.*?)</code></pre>'
-    def code_block_replace(match):
-        code_content = match.group(1)
-        code_content = code_content.replace('\n', '<br/>')
-        return f'<font face="Courier" color="darkblue">{code_content}</font>'
+    # ReportLab's <img> only accepts src, width, height and valign
+    def image_replace(match):
+        attrs = re.findall(r'\b(src|width|height|valign)="([^"]*)"', match.group(0))
+        return '<img %s/>' % ''.join(f'{name}="{value}" ' for name, value in attrs)
     
-    html = re.sub(code_block_pattern, code_block_replace, html, flags=re.DOTALL)
+    html = re.sub(r'<img\b[^>]*>', image_replace, html)
     
     return html
 
-class DocTemplate(SimpleDocTemplate):
-    def __init__(self, filename, **kw):
-        SimpleDocTemplate.__init__(self, filename, **kw)
-        self.title_list = []
-        
-    def afterFlowable(self, flowable):
-        """Register TOC entries."""
-        if isinstance(flowable, Paragraph):
-            text = flowable.getPlainText()
-            style = flowable.style.name
-            if style == 'CustomTitle':
-                self.title_list.append((0, text, self.page))
-                key = 'h1-%s' % text
-                self.canv.bookmarkPage(key)
-                self.canv.addOutlineEntry(text, key, 0, 0)
-            elif style == 'CustomHeading1':
-                self.title_list.append((1, text, self.page))
-                key = 'h2-%s' % text
-                self.canv.bookmarkPage(key)
-                self.canv.addOutlineEntry(text, key, 1, 0)
-            elif style == 'CustomHeading2':
-                self.title_list.append((2, text, self.page))
-                key = 'h3-%s' % text
-                self.canv.bookmarkPage(key)
-                self.canv.addOutlineEntry(text, key, 2, 0)
-
-def create_pdf(output_path):
-    """Create PDF from text files in the contents directory."""
-    # Set up the document
-    doc = DocTemplate(
-        output_path,
-        pagesize=A4,
-        rightMargin=72,
-        leftMargin=72,
-        topMargin=72,
-        bottomMargin=72
-    )
+# Block-level tags markdown2 emits with matching end tags
+_BLOCK_TAG = re.compile(r'<(/?)(p|ul|ol|li|pre|blockquote|table|div)\b[^>]*>')
+_RULE_TAG = re.compile(r'<hr\s*/?>')
+_ANY_TAG = re.compile(r'<[^>]+>')
+_IMAGE_PARAGRAPH = re.compile(r'^<p><img src="([^"]*)"[^>]*/></p>$')
+
+def split_blocks(html):
+    """Split html into its top-level blocks (paragraphs, lists, code blocks, rules, loose text)."""
+    blocks = []
+    depth = 0
+    start = pos = 0
     
-    # Get the styles
-    styles = getSampleStyleSheet()
-    
-    # Create custom styles
-    styles.add(ParagraphStyle(
-        name='CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=20,
-        alignment=TA_CENTER,
-        spaceAfter=30
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='CustomHeading1',
-        parent=styles['Heading1'],
-        fontSize=16,
-        spaceAfter=12
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='CustomHeading2',
-        parent=styles['Heading2'],
-        fontSize=14,
-        spaceAfter=10
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='CustomNormal',
-        parent=styles['Normal'],
-        fontSize=11,
-        leading=14,
-        alignment=TA_JUSTIFY
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='TOCHeading',
-        parent=styles['Heading1'],
-        fontSize=18,
-        alignment=TA_CENTER,
-        spaceAfter=20
-    ))
-    
-    # List of content to add to the PDF
+    def add_loose(text):
+        # Rules have no end tag, so they are split out of the text between blocks
+        for i, part in enumerate(_RULE_TAG.split(text)):
+            if i:
+                blocks.append('<hr/>')
+            if part.strip():
+                blocks.append(part.strip())
+    
+    for match in _BLOCK_TAG.finditer(html):
+        if not match.group(1):
+            if depth == 0:
+                add_loose(html[pos:match.start()])
+                start = match.start()
+            depth += 1
+        elif depth > 0:
+            depth -= 1
+            if depth == 0:
+                blocks.append(html[start:match.end()])
+                pos = match.end()
+    add_loose(html[pos:] if depth == 0 else '')
+    if depth > 0:
+        blocks.append(html[start:])
+    return blocks
+
+def _inner(block):
+    """Return the html between a block's start and end tags."""
+    return block[block.index('>') + 1:block.rindex('<')]
+
+def _is_code(block):
+    return block.startswith('<pre') or block.startswith('<div class="codehilite"')
+
+def _code_text(block):
+    """Return the plain text of a code block, dropping any highlighting markup."""
+    return unescape(_ANY_TAG.sub('', block)).strip('\n')
+
+def parse_list(block):
+    """Turn a <ul>/<ol> block into a list block like the ones markdown_flowables builds."""
+    result = {'ordered': block.startswith('<ol'), 'items': []}
+    for item in split_blocks(_inner(block)):
+        if not item.startswith('<li'):
+            continue
+        markup = []
+        child = None
+        for part in split_blocks(_inner(item)):
+            if part.startswith('<ul') or part.startswith('<ol'):
+                nested = parse_list(part)
+                if child is None:
+                    child = nested
+                else:
+                    child['items'].extend(nested['items'])
+            elif _is_code(part):
+                code = escape(_code_text(part)).replace('\n', '<br/>')
+                markup.append(f'<font face="Courier">{code}</font>')
+            elif part.startswith('<p'):
+                markup.append(_inner(part).strip())
+            else:
+                markup.append(part)
+        result['items'].append(['<br/>'.join(markup), child])
+    return result
+
+def body_sections(html):
+    """
+    Turn the html between two headings into one section per block, so no
+    flowable grows with the length of the section.
+    """
+    parsed = []
+    for block in split_blocks(html):
+        image = _IMAGE_PARAGRAPH.match(block)
+        if image:
+            parsed.append(('image', unescape(image.group(1))))
+        elif _is_code(block):
+            parsed.append(('CustomCode', _code_text(block)))
+        elif block.startswith('<ul') or block.startswith('<ol'):
+            parsed.append(('list', parse_list(block)))
+        elif block.startswith('<hr'):
+            parsed.append(('rule', None))
+        elif block.startswith('<p>'):
+            parsed.append(('CustomNormal', _inner(block)))
+        else:
+            parsed.append(('CustomNormal', block))
+    return parsed
+
+def parse_content_file(markdown_content):
+    """
+    Convert a content file into a list of (style name, html) sections: one per
+    heading and one per paragraph, plus ('CustomCode', text), ('list', list
+    block), ('image', src) and ('rule', None) sections for code blocks, lists,
+    paragraphs holding only an image, and rules.
+    """
+    # Convert markdown to HTML
+    html_content = convert_markdown_to_html(markdown_content)
+    
+    # Split the content by headers
+    sections = re.split(r'(<h[1-6].*?</h[1-6]>)', html_content)
+    
+    parsed = []
+    for section in sections:
+        if section:
+            if re.match(r'<h1', section):
+                # This is a main heading (from # in markdown)
+                section = section.replace('<h1>', '').replace('</h1>', '')
+                parsed.append(('CustomTitle', section))
+            elif re.match(r'<h2', section):
+                # This is a secondary heading (from ## in markdown)
+                section = section.replace('<h2>', '').replace('</h2>', '')
+                parsed.append(('CustomHeading1', section))
+            elif re.match(r'<h3', section):
+                # This is a tertiary heading (from ### in markdown)
+                section = section.replace('<h3>', '').replace('</h3>', '')
+                parsed.append(('CustomHeading2', section))
+            elif re.match(r'<h[4-6]', section):
+                # Deeper headings are not listed in the TOC; show them as bold body text
+                parsed.append(('CustomNormal', '<b>%s</b>' % re.sub(r'^<h[4-6][^>]*>|</h[4-6]>$', '', section)))
+            else:
+                # Regular content, one section per block
+                parsed.extend(body_sections(section))
+    return parsed
+
+def style_fingerprint(styles, names=CUSTOM_STYLE_NAMES):
+    """Return a stable hash of the settings of the given styles."""
+    settings = []
+    for name in names:
+        style = styles[name]
+        attrs = sorted((k, repr(v)) for k, v in style.__dict__.items() if k != 'parent')
+        parent = style.parent.name if style.parent is not None else None
+        settings.append((name, parent, attrs))
+    return hash_bytes(repr((SECTION_FORMAT_VERSION, settings)))
+
+def load_sections(file_path, style_key, cache=None, parser=parse_content_file):
+    """Return the parsed sections of a content file, reusing the cache when possible."""
+    with open(file_path, 'rb') as f:
+        raw = f.read()
+    
+    key = hash_bytes(raw, style_key, parser.__name__)
+    sections = cache.get(key) if cache is not None else None
+    if sections is None:
+        with tracing.span('parse ' + os.path.basename(file_path), 'markdown', bytes=len(raw)):
+            # Normalise newlines the same way text mode reads would
+            markdown_content = raw.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+            sections = parser(markdown_content)
+        if cache is not None:
+            cache.put(key, sections)
+    return sections
+
+def __getattr__(name):
+    # The document template subclasses ReportLab's, so it is only loaded once a build needs it
+    if name == 'DocTemplate':
+        from doc_template import DocTemplate
+        return DocTemplate
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def create_toc():
+    """Return an empty table of contents with the report's level styles."""
+    from reportlab.platypus.tableofcontents import TableOfContents
+    styles = get_styles()
+    toc = TableOfContents()
+    toc.levelStyles = [styles['TOC1'], styles['TOC2'], styles['TOC3']]
+    return toc
+
+def cover_flowables(styles, cover=None):
+    """Return the cover page flowables, ending with a page break."""
+    from reportlab.lib.units import inch
+    from reportlab.platypus import PageBreak, Paragraph, Spacer
     content = []
     
     # Add cover page
-    cover_title = "xShop Management System"
-    cover_subtitle = "Project Documentation Report"
-    current_date = datetime.now().strftime("%B %d, %Y")
+    cover = {key: escape(value or '') for key, value in dict(DEFAULT_COVER, **(cover or {})).items()}
+    cover_title = cover['title']
+    cover_subtitle = cover['subtitle']
+    current_date = cover.get('date') or datetime.now().strftime("%B %d, %Y")
     
     content.append(Spacer(1, 2*inch))
     content.append(Paragraph(f'<font size="30">{cover_title}</font>', styles['CustomTitle']))
     content.append(Spacer(1, 0.25*inch))
     content.append(Paragraph(f'<font size="18">{cover_subtitle}</font>', styles['CustomTitle']))
     content.append(Spacer(1, 2*inch))
-    content.append(Paragraph('<font size="14">Prepared by: [Your Name]</font>', styles['CustomNormal']))
-    content.append(Paragraph('<font size="14">Course: [Your Course]</font>', styles['CustomNormal']))
+    content.append(Paragraph(f'<font size="14">Prepared by: {cover["prepared_by"]}</font>', styles['CustomNormal']))
+    content.append(Paragraph(f'<font size="14">Course: {cover["course"]}</font>', styles['CustomNormal']))
     content.append(Paragraph(f'<font size="14">Date: {current_date}</font>', styles['CustomNormal']))
     content.append(PageBreak())
-    
-    # Add table of contents
-    toc = TableOfContents()
-    toc.levelStyles = [
-        ParagraphStyle(name='TOC1', fontSize=14, leading=16),
-        ParagraphStyle(name='TOC2', fontSize=12, leading=14, leftIndent=20),
-        ParagraphStyle(name='TOC3', fontSize=10, leading=12, leftIndent=40),
+    return content
+
+def toc_flowables(styles, toc):
+    """Return the table of contents page flowables, ending with a page break."""
+    from reportlab.lib.units import inch
+    from reportlab.platypus import PageBreak, Paragraph, Spacer
+    return [
+        Paragraph("Table of Contents", styles['TOCHeading']),
+        Spacer(1, 0.2*inch),
+        toc,
+        PageBreak(),
     ]
-    
-    content.append(Paragraph("Table of Contents", styles['TOCHeading']))
-    content.append(Spacer(1, 0.2*inch))
-    content.append(toc)
-    content.append(PageBreak())
-    
-    # Get list of content files
-    contents_dir = os.path.join(os.path.dirname(__file__), 'contents')
+
+def front_matter(styles, toc, cover=None):
+    """Return the cover page and table of contents flowables."""
+    return cover_flowables(styles, cover) + toc_flowables(styles, toc)
+
+def list_content_files(contents_dir=None):
+    """Return the paths of the content files in the order they appear in the report."""
+    if contents_dir is None:
+        contents_dir = os.path.join(os.path.dirname(__file__), 'contents')
     content_files = sorted([f for f in os.listdir(contents_dir) if f.endswith('.txt')])
+    return [os.path.join(contents_dir, f) for f in content_files]
+
+def section_flowables(sections, styles, base_dir=None):
+    """Turn parsed (style name, html) sections into flowables; image paths are relative to base_dir."""
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Paragraph, Preformatted, Spacer
+    from reportlab.platypus.flowables import HRFlowable
+    content = []
+    for style_name, section in sections:
+        if style_name == 'CustomCode':
+            # Preformatted splits across pages line by line
+            content.append(Preformatted(section, styles['CustomCode']))
+            content.append(Spacer(1, 0.1*inch))
+        elif style_name == 'list':
+            content.append(list_flowable(section, styles, base_dir))
+            content.append(Spacer(1, 0.1*inch))
+        elif style_name == 'image':
+            image = image_flowable(section, base_dir)
+            if image is not None:
+                content.append(image)
+                content.append(Spacer(1, 0.1*inch))
+        elif style_name == 'rule':
+            content.append(HRFlowable(width='100%', thickness=0.5, spaceBefore=4, spaceAfter=4))
+        else:
+            content.append(Paragraph(resolve_inline_images(section, base_dir), styles[style_name]))
+            if style_name == 'CustomNormal':
+                content.append(Spacer(1, 0.1*inch))
+    return content
+
+# Markdown compilers: a parser producing cacheable sections and a function turning them into flowables
+COMPILERS = {
+    'html': (parse_content_file, section_flowables),
+    'direct': (parse_markdown, blocks_to_flowables),
+}
+
+def content_flowables(contents_dir, styles, compiler='html', use_cache=True):
+    """Return the flowables of every content file, each starting on a new page."""
+    from reportlab.platypus import PageBreak
+    parser, to_flowables = COMPILERS[compiler]
+    content = []
+    
+    # Parsed sections are cached per file, keyed by file content and style settings
+    cache = BuildCache('sections') if use_cache else None
+    style_key = style_fingerprint(styles)
     
     # Process each content file
-    for file in content_files:
-        file_path = os.path.join(contents_dir, file)
-        
-        with open(file_path, 'r', encoding='utf-8') as f:
-            markdown_content = f.read()
-        
-        # Convert markdown to HTML
-        html_content = convert_markdown_to_html(markdown_content)
-        
-        # Split the content by headers
-        sections = re.split(r'(<h[1-6].*?</h[1-6]>)', html_content)
+    for file_path in list_content_files(contents_dir):
+        sections = load_sections(file_path, style_key, cache, parser)
         
         # Start a new page for each file
         content.append(PageBreak())
-        
-        for section in sections:
-            if section:
-                if re.match(r'<h1', section):
-                    # This is a main heading (from # in markdown)
-                    section = section.replace('<h1>', '').replace('</h1>', '')
-                    content.append(Paragraph(section, styles['CustomTitle']))
-                elif re.match(r'<h2', section):
-                    # This is a secondary heading (from ## in markdown)
-                    section = section.replace('<h2>', '').replace('</h2>', '')
-                    content.append(Paragraph(section, styles['CustomHeading1']))
-                elif re.match(r'<h3', section):
-                    # This is a tertiary heading (from ### in markdown)
-                    section = section.replace('<h3>', '').replace('</h3>', '')
-                    content.append(Paragraph(section, styles['CustomHeading2']))
-                else:
-                    # Regular content
-                    if section.strip():
-                        content.append(Paragraph(section, styles['CustomNormal']))
-                        content.append(Spacer(1, 0.1*inch))
-    
-    # Build the PDF with table of contents
-    doc.multiBuild(content)
-    print(f"PDF generated at: {output_path}")
+        content.extend(to_flowables(sections, styles, os.path.dirname(file_path)))
+    return content
+
+@tracing.traced('report', memory=True)
+def create_pdf(output_path, contents_dir=None, use_cache=True, single_pass=True, compiler='html', cover=None,
+               keywords=False):
+    """
+    Create PDF from text files in the contents directory. With keywords, a
+    keyword index is printed at the end and a search sidecar written next to it;
+    its page numbers are those of this PDF, like the TOC's.
+    """
+    from reportlab.platypus import PageBreak
+    from doc_template import DocTemplate
+    from keyword_index import KeywordIndex, KeywordIndexSection, search_index_path
+    
+    # Set up the document
+    doc = make_doc_template(output_path, doc_class=DocTemplate)
+    
+    # Get the styles
+    styles = get_styles()
+    
+    # List of content to add to the PDF, starting with the cover and TOC
+    toc = create_toc()
+    content = front_matter(styles, toc, cover)
+    content.extend(content_flowables(contents_dir, styles, compiler, use_cache))
+    if keywords:
+        doc.keyword_index = KeywordIndex()
+        content.extend([PageBreak(), KeywordIndexSection(doc.keyword_index, styles)])
+    
+    # Build the PDF with table of contents, reusing the previous heading map if there is one
+    manifest_path = heading_manifest_path(output_path)
+    if single_pass:
+        passes = doc.singlePassBuild(content, toc, load_heading_manifest(manifest_path))
+    else:
+        passes = doc.multiBuild(content)
+    write_heading_manifest(manifest_path, doc.title_list, output_path)
+    if keywords:
+        doc.keyword_index.save(search_index_path(output_path), output_path)
+    print(f"PDF generated at: {output_path} ({passes} layout pass{'es' if passes != 1 else ''})")
 
 if __name__ == "__main__":
     # Check if the contents directory exists, if not create it
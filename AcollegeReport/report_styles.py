@@ -0,0 +1,227 @@
+from functools import lru_cache
+
+# Page margins (in points) for each kind of document the scripts produce
+PAGE_LAYOUTS = {
+    'report': dict(rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=72),
+    'index': dict(rightMargin=60, leftMargin=60, topMargin=50, bottomMargin=50),
+}
+
+# Colours of the token kinds in code appendix listings (hex, so the module loads without reportlab)
+CODE_COLORS = {
+    '': '#000000',
+    'keyword': '#00008b',
+    'builtin': '#00008b',
+    'string': '#006400',
+    'number': '#8b0000',
+    'comment': '#808080',
+    'function': '#5f2f8f',
+    'class': '#005f87',
+    'line_number': '#a0a0a0',
+}
+
+# Colours of data appendix tables
+DATA_TABLE_COLORS = {
+    'header': '#d9e2f3',
+    'stripe': '#f4f6fa',
+    'grid': '#a0a0a0',
+}
+
+@lru_cache(maxsize=None)
+def get_styles():
+    """
+    Return the stylesheet shared by the report, acknowledgement and index
+    scripts. It is built once per process and must be treated as read-only.
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_LEFT
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+
+    # Get the styles
+    styles = getSampleStyleSheet()
+
+    # Report styles
+    styles.add(ParagraphStyle(
+        name='CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=20,
+        alignment=TA_CENTER,
+        spaceAfter=30
+    ))
+
+    styles.add(ParagraphStyle(
+        name='CustomHeading1',
+        parent=styles['Heading1'],
+        fontSize=16,
+        spaceAfter=12
+    ))
+
+    styles.add(ParagraphStyle(
+        name='CustomHeading2',
+        parent=styles['Heading2'],
+        fontSize=14,
+        spaceAfter=10
+    ))
+
+    styles.add(ParagraphStyle(
+        name='CustomNormal',
+        parent=styles['Normal'],
+        fontSize=11,
+        leading=14,
+        alignment=TA_JUSTIFY
+    ))
+
+    styles.add(ParagraphStyle(
+        name='CustomCode',
+        parent=styles['Code'],
+        fontSize=9,
+        leading=11,
+        textColor=colors.darkblue
+    ))
+
+    styles.add(ParagraphStyle(
+        name='TOCHeading',
+        parent=styles['Heading1'],
+        fontSize=18,
+        alignment=TA_CENTER,
+        spaceAfter=20
+    ))
+
+    # Acknowledgement styles
+    styles.add(ParagraphStyle(
+        name='AckTitle',
+        parent=styles['Heading1'],
+        fontSize=22,
+        alignment=TA_CENTER,
+        spaceAfter=30
+    ))
+
+    styles.add(ParagraphStyle(
+        name='AckBody',
+        parent=styles['Normal'],
+        fontSize=12,
+        leading=16,
+        alignment=TA_JUSTIFY,
+        firstLineIndent=20,
+        spaceAfter=12
+    ))
+
+    styles.add(ParagraphStyle(
+        name='AckSignature',
+        parent=styles['Normal'],
+        fontSize=12,
+        alignment=TA_CENTER,
+        spaceBefore=30
+    ))
+
+    # Index styles
+    styles.add(ParagraphStyle(
+        name='IndexTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        alignment=TA_CENTER,
+        spaceAfter=15,
+        fontName='Helvetica-Bold'
+    ))
+
+    styles.add(ParagraphStyle(
+        name='IndexEntry',
+        parent=styles['Normal'],
+        fontSize=10,
+        leading=12,
+        alignment=TA_LEFT,
+        spaceAfter=2,
+        leftIndent=20,
+        fontName='Helvetica'
+    ))
+
+    styles.add(ParagraphStyle(
+        name='IndexSection',
+        parent=styles['Heading2'],
+        fontSize=12,
+        leading=14,
+        alignment=TA_LEFT,
+        spaceBefore=6,
+        spaceAfter=3,
+        fontName='Helvetica-Bold'
+    ))
+
+    # Looks like a chapter title, but is not listed in the TOC or the outline
+    styles.add(ParagraphStyle(
+        name='KeywordIndexTitle',
+        parent=styles['CustomTitle']
+    ))
+
+    styles.add(ParagraphStyle(
+        name='KeywordEntry',
+        parent=styles['Normal'],
+        fontSize=9,
+        leading=11,
+        alignment=TA_LEFT,
+        leftIndent=20,
+        firstLineIndent=-10,
+        fontName='Helvetica'
+    ))
+
+    # Code appendix styles
+    styles.add(ParagraphStyle(
+        name='CodeFile',
+        parent=styles['Heading3'],
+        fontName='Courier-Bold',
+        fontSize=10,
+        leading=12,
+        spaceBefore=12,
+        spaceAfter=6
+    ))
+
+    styles.add(ParagraphStyle(
+        name='CodeListing',
+        parent=styles['Code'],
+        fontName='Courier',
+        fontSize=7.5,
+        leading=9
+    ))
+
+    # Data appendix table cells; only the font settings are used
+    styles.add(ParagraphStyle(
+        name='DataHeader',
+        parent=styles['Normal'],
+        fontName='Helvetica-Bold',
+        fontSize=7.5,
+        leading=9
+    ))
+
+    styles.add(ParagraphStyle(
+        name='DataCell',
+        parent=styles['Normal'],
+        fontName='Helvetica',
+        fontSize=7.5,
+        leading=9
+    ))
+
+    # Table of contents level styles
+    styles.add(ParagraphStyle(name='TOC1', fontSize=14, leading=16))
+    styles.add(ParagraphStyle(name='TOC2', fontSize=12, leading=14, leftIndent=20))
+    styles.add(ParagraphStyle(name='TOC3', fontSize=10, leading=12, leftIndent=40))
+    return styles
+
+def frame_size(layout='report'):
+    """Return the (width, height) in points available to flowables on an A4 page of a layout."""
+    from reportlab.lib.pagesizes import A4
+    margins = PAGE_LAYOUTS[layout]
+    # SimpleDocTemplate's frame adds 6pt of padding on every side
+    width = A4[0] - margins['leftMargin'] - margins['rightMargin'] - 12
+    height = A4[1] - margins['topMargin'] - margins['bottomMargin'] - 12
+    return width, height
+
+def make_doc_template(output_path, layout='report', doc_class=None, **kw):
+    """Return an A4 document template with the margins of the given layout."""
+    from reportlab.lib.pagesizes import A4
+    import text_metrics
+    # Every template measures its text through the shared width cache
+    text_metrics.install()
+    if doc_class is None:
+        from reportlab.platypus import SimpleDocTemplate
+        doc_class = SimpleDocTemplate
+    settings = dict(pagesize=A4, **PAGE_LAYOUTS[layout])
+    settings.update(kw)
+    return doc_class(output_path, **settings)
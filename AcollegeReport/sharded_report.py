@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+import tracing
+from build_cache import BuildCache, hash_bytes, hash_file
+from build_graph import process_pool
+from heading_manifest import heading_manifest_path, write_heading_manifest
+from images import image_references
+from pdf_assembly import assemble_pdf
+from report import (
+    COMPILERS, DocTemplate, create_toc, front_matter,
+    list_content_files, load_sections, style_fingerprint
+)
+from report_styles import get_styles, make_doc_template
+
+# Bump when shard rendering changes so cached chunks are rebuilt
+SHARD_FORMAT_VERSION = 2
+
+def render_shard(file_path, style_key, work_dir, use_cache=True, compiler='html'):
+    """
+    Render one content file to its own PDF chunk.
+    Returns (chunk path, page count, [(level, text, page in chunk), ...]).
+    """
+    cache = BuildCache('shards', max_bytes=512 * 1024 * 1024) if use_cache else None
+    # A chunk embeds the images its file references, so their contents are part of the key
+    image_hashes = [hash_file(path) if os.path.exists(path) else 'missing' for path in image_references(file_path)]
+    key = hash_bytes(hash_file(file_path), style_key, compiler, str(SHARD_FORMAT_VERSION), *image_hashes)
+
+    if cache is not None:
+        meta = cache.get(key)
+        chunk_path = cache.get_file(key, '.pdf')
+        if meta is not None and chunk_path is not None:
+            return chunk_path, meta['pages'], [tuple(h) for h in meta['headings']]
+
+    styles = get_styles()
+    parser, to_flowables = COMPILERS[compiler]
+    sections = load_sections(file_path, style_key, BuildCache('sections') if use_cache else None, parser)
+
+    if cache is not None:
+        os.makedirs(cache.path, exist_ok=True)
+        chunk_path = cache.file_path(key, f'.{os.getpid()}.tmp')
+    else:
+        chunk_path = os.path.join(work_dir, os.path.basename(file_path) + '.pdf')
+
+    # Every page of a chunk is past the cover, so all its headings are listed
+    doc = make_doc_template(chunk_path, doc_class=DocTemplate)
+    doc.toc_first_page = 1
+    doc.build(to_flowables(sections, styles, os.path.dirname(file_path)))
+    headings = [(level, text, page) for level, text, page, _ in doc.title_list]
+
+    if cache is not None:
+        chunk_path = cache.put_file(key, '.pdf', chunk_path)
+        cache.put(key, {'pages': doc.page_count, 'headings': headings})
+    return chunk_path, doc.page_count, headings
+
+def _render_front_matter(output_path, styles, entries, cover=None):
+    """Render the cover and TOC with the given entries; returns (page count, cover headings)."""
+    from reportlab.platypus import PageBreak
+    toc = create_toc()
+    # The entries are final, so the TOC can be drawn from them in a single build
+    toc._lastEntries = entries
+    doc = make_doc_template(output_path, doc_class=DocTemplate)
+    # In create_pdf the first content file's page break follows the one ending the
+    # TOC, which leaves an empty page; keep it so both builds number pages alike
+    doc.build(front_matter(styles, toc, cover) + [PageBreak()])
+    return doc.page_count, doc.title_list
+
+@tracing.traced('report', memory=True)
+def create_pdf_sharded(output_path, contents_dir=None, jobs=None, use_cache=True, compiler='html', cover=None):
+    """
+    Create the report by rendering each content file as a separate PDF chunk
+    on a process pool, then stitching the chunks behind the cover and TOC with
+    page numbers, outline entries and TOC entries shifted to their final pages.
+    """
+    styles = get_styles()
+    style_key = style_fingerprint(styles)
+    content_files = list_content_files(contents_dir)
+    work_dir = tempfile.mkdtemp(prefix='report-shards-')
+
+    try:
+        # Render the chunks, one content file each
+        args = (content_files, [style_key] * len(content_files),
+                [work_dir] * len(content_files), [use_cache] * len(content_files),
+                [compiler] * len(content_files))
+        jobs = jobs or os.cpu_count() or 1
+        with tracing.span('render shards', 'report', memory=True, files=len(content_files), jobs=jobs):
+            if jobs <= 1 or len(content_files) <= 1:
+                shards = list(map(render_shard, *args))
+            else:
+                with process_pool(min(jobs, len(content_files))) as pool:
+                    shards = list(pool.map(render_shard, *args))
+
+        # The TOC length decides where the body starts, so settle the front matter first
+        front_path = os.path.join(work_dir, 'front.pdf')
+        # Cover, TOC and the empty page after it, unless the TOC runs longer
+        front_pages = 3
+        for _ in range(5):
+            entries = []
+            offset = front_pages
+            for _, pages, headings in shards:
+                for level, text, page in headings:
+                    entries.append((level, text, offset + page, None))
+                offset += pages
+            rendered_pages, cover_headings = _render_front_matter(front_path, styles, entries, cover)
+            if rendered_pages == front_pages:
+                break
+            front_pages = rendered_pages
+
+        # Stitch the chunks together with an outline covering every heading
+        headings = [(level, text, page, key) for level, text, page, key in cover_headings]
+        headings.extend((level, text, page, f'h{level + 1}-{text}') for level, text, page, _ in entries)
+        outline = [(text, page - 1, level) for level, text, page, _ in headings]
+        parts = [(front_path, 0, None)] + [(chunk_path, 0, None) for chunk_path, _, _ in shards]
+        assemble_pdf(output_path, parts, outline=outline, optimize=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    write_heading_manifest(heading_manifest_path(output_path), headings, output_path)
+    print(f"PDF generated at: {output_path} ({len(shards)} shards)")
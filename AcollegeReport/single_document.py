@@ -0,0 +1,153 @@
+import os
+import tracing
+from reportlab.platypus import Frame, PageBreak, PageTemplate, Paragraph
+from reportlab.platypus.doctemplate import BaseDocTemplate, IndexingFlowable, NextPageTemplate
+from acknowledgement import acknowledgement_flowables
+from code_appendix import CODE_APPENDIX_TITLE, code_appendix_flowables
+from create_index import index_flowables
+from heading_manifest import heading_manifest_path, load_heading_manifest, write_heading_manifest
+from keyword_index import KeywordIndex, KeywordIndexSection, search_index_path
+from report import DocTemplate, content_flowables, cover_flowables, create_toc, toc_flowables
+from report_styles import PAGE_LAYOUTS, get_styles, make_doc_template
+
+# Outline key of the acknowledgement page
+ACKNOWLEDGEMENT_KEY = 'acknowledgement'
+
+class ReportIndex(IndexingFlowable):
+    """
+    The index page, filled in with the pages of the acknowledgement and of the
+    top-level report headings as they are laid out. Like the table of contents
+    it takes a second layout pass when the pages differ from the last pass.
+    """
+    def __init__(self, styles):
+        IndexingFlowable.__init__(self)
+        self.styles = styles
+        self._entries = []
+        self._lastEntries = []
+
+    def notify(self, kind, stuff):
+        # stuff is a (level, text, page, key) heading
+        if kind in ('TOCEntry', 'IndexEntry') and stuff[0] == 0:
+            self._entries.append(tuple(stuff))
+
+    def seed(self, headings, first_page):
+        """Fill the index from the headings of a previous build."""
+        self._entries = [entry for entry in headings if entry[0] == 0 and entry[2] >= first_page]
+
+    def beforeBuild(self):
+        self._lastEntries = self._entries[:]
+        self._entries = []
+
+    def isSatisfied(self):
+        return self._entries == self._lastEntries
+
+    def wrap(self, availWidth, availHeight):
+        # Never fits whole, so the frame asks for split() and lays the entries out one by one
+        return availWidth, availHeight + 1
+
+    def split(self, availWidth, availHeight):
+        acknowledgement_page = None
+        code_page = None
+        report_headings = []
+        for level, text, page, key in self._lastEntries:
+            if key == ACKNOWLEDGEMENT_KEY:
+                acknowledgement_page = page
+            elif text == CODE_APPENDIX_TITLE:
+                code_page = page
+            else:
+                report_headings.append((text, page))
+        return index_flowables(self.styles, report_headings, acknowledgement_page, code_page)
+
+    def drawOn(self, canvas, x, y, _sW=0):
+        pass
+
+class CompleteDocTemplate(DocTemplate):
+    """
+    The whole final report as one document: cover, index, acknowledgement,
+    table of contents and body. The index page keeps its own margins.
+    """
+    def build(self, flowables, **kw):
+        """Lay the story out once; multiBuild calls this for every pass."""
+        with tracing.span('layout pass', 'layout', memory=True, flowables=len(flowables)):
+            self._calc()
+            self.pageTemplates = [self._page_template(layout) for layout in ('report', 'index')]
+            BaseDocTemplate.build(self, flowables, **kw)
+
+    # SimpleDocTemplate switches every page to its own 'Later' template
+    handle_pageBegin = BaseDocTemplate.handle_pageBegin
+
+    def _page_template(self, layout):
+        margins = PAGE_LAYOUTS[layout]
+        frame = Frame(margins['leftMargin'], margins['bottomMargin'],
+                      self.pagesize[0] - margins['leftMargin'] - margins['rightMargin'],
+                      self.pagesize[1] - margins['topMargin'] - margins['bottomMargin'],
+                      id='normal')
+        return PageTemplate(id=layout, frames=[frame], pagesize=self.pagesize)
+
+    def afterFlowable(self, flowable):
+        """Register TOC entries, and the acknowledgement for the index."""
+        DocTemplate.afterFlowable(self, flowable)
+        if isinstance(flowable, Paragraph) and flowable.style.name == 'AckTitle':
+            entry = (0, 'Acknowledgement', self.page, ACKNOWLEDGEMENT_KEY)
+            self.title_list.append(entry)
+            self.canv.bookmarkPage(ACKNOWLEDGEMENT_KEY)
+            self.canv.addOutlineEntry('Acknowledgement', ACKNOWLEDGEMENT_KEY, 0, 0)
+            self.notify('IndexEntry', entry)
+
+    def toc_entries(self, headings):
+        """Return the recorded headings the TOC lists: the acknowledgement is only in the index."""
+        return [entry for entry in DocTemplate.toc_entries(self, headings) if entry[3] != ACKNOWLEDGEMENT_KEY]
+
+@tracing.traced('report', memory=True)
+def create_complete_pdf(output_path, contents_dir=None, cover=None, acknowledgement=None,
+                        use_cache=True, single_pass=True, compiler='html', source_dir=None, jobs=None,
+                        keywords=False):
+    """
+    Create the final report (cover, index, acknowledgement, table of contents,
+    body and, with source_dir, the code appendix) as one document, without
+    intermediate PDFs. Index page numbers are those of the final file.
+    acknowledgement holds the keyword arguments of acknowledgement_flowables.
+    With keywords, the keyword index is the last section.
+    """
+    # Set up the document
+    doc = make_doc_template(output_path, doc_class=CompleteDocTemplate)
+
+    # Get the styles
+    styles = get_styles()
+
+    # Cover, index (with its own margins), acknowledgement, TOC, then the content files
+    toc = create_toc()
+    index = ReportIndex(styles)
+    content = cover_flowables(styles, cover)
+    content[-1:] = [NextPageTemplate('index'), PageBreak()]
+    content.append(index)
+    content.extend([NextPageTemplate('report'), PageBreak()])
+    content.extend(acknowledgement_flowables(styles, **(acknowledgement or {})))
+    content.append(PageBreak())
+    content.extend(toc_flowables(styles, toc))
+    content.extend(content_flowables(contents_dir, styles, compiler, use_cache))
+    if source_dir:
+        content.append(PageBreak())
+        content.extend(code_appendix_flowables(source_dir, styles, jobs, use_cache))
+    if keywords:
+        doc.keyword_index = KeywordIndex()
+        content.extend([PageBreak(), KeywordIndexSection(doc.keyword_index, styles)])
+
+    # Build the PDF, reusing the previous heading map for the TOC and index if there is one
+    manifest_path = heading_manifest_path(output_path)
+    previous_entries = load_heading_manifest(manifest_path) if single_pass else None
+    if previous_entries:
+        index.seed(previous_entries, doc.toc_first_page)
+        passes = doc.singlePassBuild(content, toc, previous_entries)
+    else:
+        passes = doc.multiBuild(content)
+    write_heading_manifest(manifest_path, doc.title_list, output_path)
+    if keywords:
+        doc.keyword_index.save(search_index_path(output_path), output_path)
+    print(f"Final report generated at: {output_path} ({doc.page_count} pages, "
+          f"{passes} layout pass{'es' if passes != 1 else ''})")
+    return doc.page_count
+
+if __name__ == "__main__":
+    dir_path = os.path.dirname(os.path.abspath(__file__))
+    create_complete_pdf(os.path.join(dir_path, "finalReport.pdf"), os.path.join(dir_path, "contents"))
@@ -0,0 +1,115 @@
+import atexit
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import pytest
+
+# The report modules import each other by name, as the scripts run from AcollegeReport/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep the build caches of test runs out of AcollegeReport/.cache
+if 'REPORT_CACHE_DIR' not in os.environ:
+    os.environ['REPORT_CACHE_DIR'] = tempfile.mkdtemp(prefix='report-tests-')
+    atexit.register(shutil.rmtree, os.environ['REPORT_CACHE_DIR'], True)
+
+@pytest.fixture
+def make_pdf(tmp_path):
+    """
+    Return a function that writes a small ReportLab PDF to tmp_path: one page
+    per title, each with the title as text and an outline entry, plus the same
+    image on every page.
+    """
+    from PIL import Image
+    from reportlab.pdfgen import canvas
+
+    image_path = str(tmp_path / 'square.png')
+    Image.new('RGB', (40, 40), 'red').save(image_path)
+
+    def make(name, titles, color='black'):
+        path = str(tmp_path / name)
+        c = canvas.Canvas(path, invariant=1)
+        for i, title in enumerate(titles):
+            c.setFont('Helvetica', 12)
+            c.setFillColor(color)
+            c.drawString(72, 720, title)
+            c.drawImage(image_path, 72, 500, 40, 40)
+            c.bookmarkPage(f'page{i}')
+            c.addOutlineEntry(title, f'page{i}', 0)
+            c.showPage()
+        c.save()
+        return path
+    return make
+
+@pytest.fixture
+def large_pdf(tmp_path):
+    """
+    Write a PDF of 100 pages whose content streams are 256 KB of uncompressible
+    hex each, so a reader that keeps every page it parsed holds about 25 MB.
+    """
+    from PyPDF2.generic import ArrayObject, DictionaryObject, NameObject, NumberObject, StreamObject
+    from pdf_assembly import PdfStreamWriter, ref
+
+    path = str(tmp_path / 'large.pdf')
+    with open(path, 'wb') as f:
+        writer = PdfStreamWriter(f)
+        catalog_num = writer.reserve()
+        pages_num = writer.reserve()
+        page_nums = []
+        for _ in range(100):
+            stream = StreamObject()
+            # A content stream that is one long comment
+            stream._data = b'% ' + os.urandom(128 * 1024).hex().encode('ascii') + b'\n'
+            stream_num = writer.reserve()
+            writer.write_object(stream_num, stream)
+            page_num = writer.reserve()
+            writer.write_object(page_num, DictionaryObject({
+                NameObject('/Type'): NameObject('/Page'),
+                NameObject('/Parent'): ref(pages_num),
+                NameObject('/MediaBox'): ArrayObject([NumberObject(0), NumberObject(0),
+                                                      NumberObject(612), NumberObject(792)]),
+                NameObject('/Contents'): ref(stream_num),
+            }))
+            page_nums.append(page_num)
+        writer.write_object(pages_num, DictionaryObject({
+            NameObject('/Type'): NameObject('/Pages'),
+            NameObject('/Kids'): ArrayObject([ref(num) for num in page_nums]),
+            NameObject('/Count'): NumberObject(len(page_nums)),
+        }))
+        writer.write_object(catalog_num, DictionaryObject({
+            NameObject('/Type'): NameObject('/Catalog'),
+            NameObject('/Pages'): ref(pages_num),
+        }))
+        writer.finish(catalog_num)
+    return path
+
+@pytest.fixture
+def peak_rss_growth():
+    """
+    Return a function that runs a statement in a fresh interpreter, after
+    importing pdf_assembly and pdf_linearize, and returns by how many MB its
+    peak RSS went over the RSS it had before. With release=False, readers
+    keep every object they parse.
+    """
+    # ru_maxrss of a new process starts at its parent's RSS; VmHWM doesn't
+    if not os.path.exists('/proc/self/status'):
+        pytest.skip("needs /proc for the peak RSS of a process")
+    setup = (
+        "import sys\n"
+        f"sys.path.insert(0, {os.path.dirname(os.path.dirname(os.path.abspath(__file__)))!r})\n"
+        "import pdf_assembly, pdf_linearize\n"
+        "def rss_kb(field):\n"
+        "    with open('/proc/self/status') as f:\n"
+        "        return next(int(line.split()[1]) for line in f if line.startswith(field))\n"
+    )
+
+    def measure(statement, release=True):
+        script = setup
+        if not release:
+            script += ("pdf_assembly.release_parsed_objects = lambda reader: None\n"
+                       "pdf_linearize.release_parsed_objects = lambda reader: None\n")
+        script += f"before = rss_kb('VmRSS:')\n{statement}\nprint((rss_kb('VmHWM:') - before) / 1024)\n"
+        done = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True)
+        return float(done.stdout.split()[-1])
+    return measure
@@ -0,0 +1,67 @@
+import copy
+import json
+import os
+from build_cache import BuildCache
+from report import CUSTOM_STYLE_NAMES, load_sections, parse_content_file, style_fingerprint
+from report_styles import get_styles
+
+class CountingParser:
+    """parse_content_file, counting its calls."""
+    __name__ = 'parse_content_file'
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, markdown_content):
+        self.calls += 1
+        return parse_content_file(markdown_content)
+
+def write(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return str(path)
+
+def test_unchanged_file_is_not_parsed_again(tmp_path):
+    path = write(tmp_path / 'a.txt', '# Alpha\n\nSome text.\n')
+    cache = BuildCache('sections', cache_dir=str(tmp_path / 'cache'))
+    parser = CountingParser()
+    style_key = style_fingerprint(get_styles())
+    first = load_sections(path, style_key, cache, parser)
+    second = load_sections(path, style_key, BuildCache('sections', cache_dir=str(tmp_path / 'cache')), parser)
+    assert parser.calls == 1
+    # Entries are JSON, so tuples come back as lists
+    assert second == json.loads(json.dumps(first))
+
+def test_edited_file_is_parsed_again(tmp_path):
+    path = write(tmp_path / 'a.txt', '# Alpha\n\nSome text.\n')
+    cache = BuildCache('sections', cache_dir=str(tmp_path / 'cache'))
+    parser = CountingParser()
+    style_key = style_fingerprint(get_styles())
+    load_sections(path, style_key, cache, parser)
+    write(path, '# Alpha\n\nOther text.\n')
+    assert load_sections(path, style_key, cache, parser) == parse_content_file('# Alpha\n\nOther text.\n')
+    assert parser.calls == 2
+
+def test_style_change_invalidates_the_cache(tmp_path):
+    path = write(tmp_path / 'a.txt', '# Alpha\n\nSome text.\n')
+    cache = BuildCache('sections', cache_dir=str(tmp_path / 'cache'))
+    parser = CountingParser()
+    styles = {name: copy.copy(get_styles()[name]) for name in CUSTOM_STYLE_NAMES}
+    load_sections(path, style_fingerprint(styles), cache, parser)
+    load_sections(path, style_fingerprint(styles), cache, parser)
+    assert parser.calls == 1
+
+    styles['CustomNormal'].fontSize += 1
+    load_sections(path, style_fingerprint(styles), cache, parser)
+    assert parser.calls == 2
+
+def test_cache_is_bounded(tmp_path):
+    cache = BuildCache('bounded', max_bytes=2000, cache_dir=str(tmp_path))
+    for i in range(50):
+        cache.put(f"key{i}", 'x' * 100)
+        # Distinct modification times, oldest first
+        os.utime(cache._entry_path(f"key{i}"), (i, i))
+    total = sum(os.path.getsize(os.path.join(cache.path, name)) for name in os.listdir(cache.path))
+    assert total <= 2000
+    assert cache.get('key49') == 'x' * 100
+    assert cache.get('key0') is None
@@ -0,0 +1,52 @@
+import functools
+import os
+import pytest
+import build_graph
+from build_graph import BuildGraph, Stage
+
+def write_pid(path):
+    with open(path, 'w') as f:
+        f.write(str(os.getpid()))
+
+def broken_stage():
+    raise KeyError('missing section')
+
+@pytest.fixture
+def without_fork(monkeypatch):
+    monkeypatch.setattr(build_graph.multiprocessing, 'get_all_start_methods', lambda: ['spawn'])
+
+def pid_stages(tmp_path):
+    paths = {name: str(tmp_path / f"{name}.pid") for name in ('a', 'b', 'c')}
+    stages = [Stage(name, functools.partial(write_pid, path), outputs=[path], deps=['a', 'b'] if name == 'c' else [])
+              for name, path in paths.items()]
+    return stages, paths
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_stages_run_in_processes_of_their_own(tmp_path, jobs):
+    stages, paths = pid_stages(tmp_path)
+    results = BuildGraph(stages, str(tmp_path / 'state.json')).run(jobs=jobs)
+    assert results == {'a': 'built', 'b': 'built', 'c': 'built'}
+    pids = {open(path).read() for path in paths.values()}
+    assert (str(os.getpid()) in pids) == (jobs == 1)
+
+def test_stages_are_spawned_without_fork(tmp_path, without_fork):
+    stages, paths = pid_stages(tmp_path)
+    results = BuildGraph(stages, str(tmp_path / 'state.json')).run(jobs=2)
+    assert results == {'a': 'built', 'b': 'built', 'c': 'built'}
+    assert str(os.getpid()) not in {open(path).read() for path in paths.values()}
+
+def test_unpicklable_stages_run_here_without_fork(tmp_path, without_fork, capsys):
+    path = str(tmp_path / 'a.pid')
+    results = BuildGraph([Stage('a', lambda: write_pid(path))], str(tmp_path / 'state.json')).run(jobs=2)
+    assert results == {'a': 'built'}
+    assert open(path).read() == str(os.getpid())
+    assert 'Warning: Running stages one at a time' in capsys.readouterr().out
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_failures_report_the_traceback(tmp_path, capsys, jobs):
+    stages = [Stage('broken', broken_stage), Stage('after', broken_stage, deps=['broken'])]
+    results = BuildGraph(stages, str(tmp_path / 'state.json')).run(jobs=jobs)
+    assert results == {'broken': 'failed', 'after': 'blocked'}
+    out = capsys.readouterr().out
+    assert "Error in stage 'broken':\nTraceback (most recent call last)" in out
+    assert 'in broken_stage' in out and "KeyError: 'missing section'" in out
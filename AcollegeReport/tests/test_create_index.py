@@ -0,0 +1,72 @@
+import json
+from PyPDF2 import PdfReader
+from reportlab.pdfgen import canvas
+import text_extraction
+from create_index import extract_headings, headings_from_manifest, headings_from_outline
+from heading_manifest import heading_manifest_path
+from report import create_pdf
+
+FILLER = "Plain filler sentence that keeps the layout busy for a while. " * 12
+
+CONTENTS = {
+    '01_alpha.txt': "# Alpha\n\nFirst section.\n",
+    # Long enough to go on over several pages
+    '02_beta.txt': "# Beta\n\n" + "\n\n".join([FILLER] * 12) + "\n",
+    '03_gamma.txt': "# Gamma\n\n## Details\n\nLast section.\n",
+}
+
+def build_report(tmp_path):
+    contents_dir = tmp_path / 'contents'
+    contents_dir.mkdir()
+    for name, text in CONTENTS.items():
+        (contents_dir / name).write_text(text, encoding='utf-8')
+    output = str(tmp_path / 'projectReport.pdf')
+    create_pdf(output, str(contents_dir), use_cache=False)
+    return output
+
+def pages_starting_with(path, titles):
+    """Return (title, page) for the pages whose text starts with one of titles."""
+    found = []
+    for number, page in enumerate(PdfReader(path).pages, 1):
+        first_line = page.extract_text().strip().split('\n')[0].strip()
+        if first_line in titles:
+            found.append((first_line, number))
+    return found
+
+def test_outline_and_manifest_give_the_heading_pages(tmp_path):
+    output = build_report(tmp_path)
+    expected = pages_starting_with(output, ['Alpha', 'Beta', 'Gamma'])
+    assert [title for title, _ in expected] == ['Alpha', 'Beta', 'Gamma']
+    # Beta goes on over pages that must not be listed
+    assert expected[2][1] - expected[1][1] > 1
+    assert headings_from_manifest(output, 2) == expected
+    assert headings_from_outline(PdfReader(output), 2) == expected
+    assert extract_headings(output) == expected
+
+def test_text_is_not_extracted_when_there_is_an_outline(tmp_path, monkeypatch):
+    output = build_report(tmp_path)
+    expected = extract_headings(output)
+
+    def fail(*args, **kw):
+        raise AssertionError("page text extracted")
+    monkeypatch.setattr(text_extraction, 'extract_page_texts', fail)
+    # Without the manifest the outline is used
+    manifest_path = heading_manifest_path(output)
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    manifest['pdf_sha256'] = '0' * 64
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    assert headings_from_manifest(output, 2) is None
+    assert extract_headings(output) == expected
+
+def test_text_fallback_without_an_outline(tmp_path):
+    path = str(tmp_path / 'plain.pdf')
+    c = canvas.Canvas(path, invariant=1)
+    for title in ['First page', 'Second page']:
+        c.drawString(72, 720, title)
+        c.drawString(72, 700, 'Body text under the title.')
+        c.showPage()
+    c.save()
+    assert headings_from_outline(PdfReader(path)) == []
+    assert extract_headings(path) == [('First page', 1), ('Second page', 2)]
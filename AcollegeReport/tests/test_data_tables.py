@@ -0,0 +1,73 @@
+import io
+import json
+import pytest
+from data_tables import DataSource, iter_json_items
+
+NESTED = {
+    'emp1': {'name': 'Ann', 'attendance': {'2024-01-02': [1.5, -2e3, 10]}, 'active': True},
+    'emp2': {'name': 'Bo "B" \\ O\'Neil', 'note': 'été\n], {', 'manager': None},
+    'count': 12345,
+    'ratio': 0.25e2,
+}
+
+def items(text, block_size=4096):
+    return list(iter_json_items(io.StringIO(text), block_size))
+
+def test_object_items():
+    assert items(json.dumps(NESTED)) == list(NESTED.items())
+
+def test_array_items():
+    records = [{'a': 1}, [2, [3]], 'four', None, -5.5]
+    assert items(json.dumps(records)) == [(None, value) for value in records]
+
+def test_empty():
+    assert items('[]') == []
+    assert items(' { } ') == []
+
+@pytest.mark.parametrize('block_size', [1, 2, 3, 5, 7, 16])
+def test_values_split_across_blocks(block_size):
+    # Escapes, strings and numbers (after their '.' or exponent too) cut at every position
+    text = json.dumps(NESTED, ensure_ascii=True) + '\n'
+    assert items(text, block_size) == list(NESTED.items())
+    assert items(json.dumps([1.5, 2e-3, 10, 0.125E+2]), block_size) == \
+        [(None, 1.5), (None, 2e-3), (None, 10), (None, 12.5)]
+
+def test_escaped_strings():
+    text = r'{"k\"ey": "a\\b\"cé\n", "tab": "\t"}'
+    assert items(text, 3) == [('k"ey', 'a\\b"cé\n'), ('tab', '\t')]
+
+@pytest.mark.parametrize('text', [
+    '[1, 2',
+    '[1, 2,',
+    '{"a": {"b": 1}',
+    '{"a": "unterminated',
+    '{"a"',
+    '[{"a": 1} {"b": 2}]',
+    '',
+    '42',
+])
+def test_truncated_or_invalid(text):
+    with pytest.raises(ValueError):
+        items(text, 2)
+
+def test_json_columns_come_from_every_record(tmp_path):
+    path = tmp_path / 'users.json'
+    path.write_text(json.dumps({
+        'u1': {'name': 'Ann'},
+        'u2': {'name': 'Bo', 'email': 'bo@example.com'},
+        'u3': {'phone': '123', 'name': 'Cy'},
+    }), encoding='utf-8')
+    source = DataSource(str(path))
+    assert source.columns == ['id', 'name', 'email', 'phone']
+    assert list(source.rows()) == [
+        ['u1', 'Ann', '', ''],
+        ['u2', 'Bo', 'bo@example.com', ''],
+        ['u3', 'Cy', '', '123'],
+    ]
+
+def test_jsonl_columns(tmp_path):
+    path = tmp_path / 'events.jsonl'
+    path.write_text('{"a": 1}\n\n{"b": true}\n', encoding='utf-8')
+    source = DataSource(str(path))
+    assert source.columns == ['a', 'b']
+    assert list(source.rows()) == [['1', ''], ['', 'yes']]
@@ -0,0 +1,72 @@
+import os
+import re
+from PyPDF2 import PdfReader
+from heading_manifest import heading_manifest_path, load_heading_manifest
+from keyword_index import KEYWORD_INDEX_TITLE, load_search_index, search, search_index_path
+from report import create_pdf
+
+FILLER = "Plain filler sentence that keeps the layout busy for a while. " * 12
+
+CONTENTS = {
+    '01_alpha.txt': "# Alpha\n\nThe zebrafinch sings here. Ordinary text with a **Gradle build** phrase.\n",
+    '02_beta.txt': "# Beta\n\n" + "\n\n".join([FILLER] * 6) + "\n\nThe quokka waits at the end.\n\n"
+                   "- a list of things with a narwhal\n- and the zebrafinch again\n",
+    '03_gamma.txt': "# Gamma\n\n## Details\n\nNothing unusual but a narwhal.\n",
+}
+
+def build(tmp_path, keywords=True):
+    contents_dir = tmp_path / 'contents'
+    contents_dir.mkdir()
+    for name, text in CONTENTS.items():
+        (contents_dir / name).write_text(text, encoding='utf-8')
+    output = str(tmp_path / 'projectReport.pdf')
+    create_pdf(output, str(contents_dir), use_cache=False, keywords=keywords)
+    return output
+
+def pages_with(reader, word):
+    """Return the body pages showing word; the index at the end lists some words too."""
+    texts = [page.extract_text() for page in reader.pages]
+    body = next(i for i, text in enumerate(texts) if text.lstrip().startswith(KEYWORD_INDEX_TITLE))
+    return [i + 1 for i, text in enumerate(texts[:body]) if re.search(r'\b%s\b' % word, text.lower())]
+
+def test_postings_match_the_pages_terms_are_on(tmp_path):
+    output = build(tmp_path)
+    reader = PdfReader(output)
+    index = load_search_index(search_index_path(output))
+    for word in ('zebrafinch', 'quokka', 'narwhal', 'gradle'):
+        assert index['terms'][word] == pages_with(reader, word), word
+    # Every posted page really shows the term
+    for term, pages in index['terms'].items():
+        for page in pages:
+            assert page in pages_with(reader, term) or term in reader.pages[page - 1].extract_text().lower(), (term, page)
+    assert search(index, 'zebrafinch narwhal') == sorted(
+        set(pages_with(reader, 'zebrafinch')) & set(pages_with(reader, 'narwhal')))
+
+def test_printed_entries(tmp_path):
+    output = build(tmp_path)
+    reader = PdfReader(output)
+    index = load_search_index(search_index_path(output))
+    assert index['phrases'] == {'Gradle build': pages_with(reader, 'gradle')}
+    last_page = reader.pages[-1].extract_text()
+    assert KEYWORD_INDEX_TITLE in last_page
+    assert 'Gradle build, %d' % pages_with(reader, 'gradle')[0] in last_page
+
+def test_index_title_is_not_a_heading(tmp_path):
+    output = build(tmp_path)
+    reader = PdfReader(output)
+    outline = [item.title for item in reader.outline if not isinstance(item, list)]
+    assert outline[-3:] == ['Alpha', 'Beta', 'Gamma']
+    assert KEYWORD_INDEX_TITLE not in outline
+    titles = [text for _, text, _, _ in load_heading_manifest(heading_manifest_path(output), output)]
+    assert KEYWORD_INDEX_TITLE not in titles
+    # The TOC page lists the chapters only
+    assert KEYWORD_INDEX_TITLE not in reader.pages[1].extract_text()
+
+def test_off_by_default(tmp_path):
+    contents_dir = tmp_path / 'contents'
+    contents_dir.mkdir()
+    (contents_dir / '01.txt').write_text(CONTENTS['01_alpha.txt'], encoding='utf-8')
+    output = str(tmp_path / 'projectReport.pdf')
+    create_pdf(output, str(contents_dir), use_cache=False)
+    assert not os.path.exists(search_index_path(output))
+    assert KEYWORD_INDEX_TITLE not in PdfReader(output).pages[-1].extract_text()
@@ -0,0 +1,91 @@
+from reportlab.platypus import ListFlowable, Paragraph
+from markdown_flowables import blocks_to_flowables, inline_markup, parse_markdown
+from report import parse_content_file
+from report_styles import get_styles
+
+def test_headings():
+    blocks = parse_markdown("# Title\n\n## Section ##\n\n### Sub *part*\n")
+    assert blocks == [
+        ['heading', 1, 'Title'],
+        ['heading', 2, 'Section'],
+        ['heading', 3, 'Sub <i>part</i>'],
+    ]
+
+def test_deep_headings_match_the_html_compiler():
+    text = "#### Details\n"
+    assert parse_markdown(text) == [['heading', 4, 'Details']]
+    flowables = blocks_to_flowables(parse_markdown(text), get_styles())
+    assert flowables[0].style.name == 'CustomNormal'
+    assert flowables[0].text == '<b>Details</b>'
+    assert parse_content_file(text) == [('CustomNormal', '<b>Details</b>')]
+
+def test_paragraph_lines_are_joined():
+    assert parse_markdown("one\ntwo\n\nthree\n") == [['paragraph', 'one two'], ['paragraph', 'three']]
+
+def test_nested_list():
+    blocks = parse_markdown("- a\n- b\n  1. c\n  2. d\n- e\n\nafter\n")
+    assert blocks == [
+        ['list', {'ordered': False, 'items': [
+            ['a', None],
+            ['b', {'ordered': True, 'items': [['c', None], ['d', None]]}],
+            ['e', None],
+        ]}],
+        ['paragraph', 'after'],
+    ]
+
+def test_list_continuation_and_blank_lines():
+    blocks = parse_markdown("- first\n  more\n\n- second\n\ntext\n")
+    assert blocks[0] == ['list', {'ordered': False, 'items': [['first more', None], ['second', None]]}]
+    assert blocks[1] == ['paragraph', 'text']
+
+def test_list_flowable_records_index_parts():
+    flowables = blocks_to_flowables(parse_markdown("- a\n  - b\n- c\n"), get_styles())
+    lists = [f for f in flowables if isinstance(f, ListFlowable)]
+    assert len(lists) == 1
+    # One part per flowable of each item: a, the nested list, c
+    assert [len(part) for part in lists[0].index_parts] == [1, 1, 1]
+    assert [p.text for p in lists[0].index_paragraphs] == ['a', 'b', 'c']
+
+def test_code_blocks():
+    blocks = parse_markdown("```\nx < 1 && y\n```\n\n    indented\n    code\n")
+    assert blocks == [['code', 'x < 1 && y'], ['code', 'indented\ncode']]
+
+def test_image_and_rule():
+    assert parse_markdown("![alt](pic.png)\n\n---\n") == [['image', 'pic.png'], ['rule']]
+
+def test_escaping():
+    assert inline_markup('a < b > c & d') == 'a &lt; b &gt; c &amp; d'
+
+def test_entities_are_kept():
+    assert inline_markup('&amp; &lt; &#169; &#xA9;') == '&amp; &lt; &#169; &#xA9;'
+
+def test_code_spans_escape_entities():
+    assert inline_markup('`&amp; <b>`') == '<font face="Courier">&amp;amp; &lt;b&gt;</font>'
+
+def test_inline_markup():
+    assert inline_markup('**bold** and _em_ and [link](http://x.org)') == \
+        '<b>bold</b> and <i>em</i> and <a href="http://x.org">link</a>'
+
+def test_markup_parses_in_reportlab():
+    styles = get_styles()
+    text = "Tom & Jerry &amp; friends: 1 < 2 > 0, `a && b`, **bold _both_**\n"
+    for flowable in blocks_to_flowables(parse_markdown(text), styles):
+        if isinstance(flowable, Paragraph):
+            flowable.wrap(400, 800)
+    plain = blocks_to_flowables(parse_markdown(text), styles)[0].getPlainText()
+    assert 'Tom & Jerry & friends: 1 < 2 > 0, a && b' in plain
+
+def test_quotes_in_attributes():
+    markup = inline_markup('see [docs](http://x/?q="a") now')
+    assert markup == 'see <a href="http://x/?q=&quot;a&quot;">docs</a> now'
+    paragraph = Paragraph(markup, get_styles()['CustomNormal'])
+    paragraph.wrap(400, 800)
+    assert paragraph.getPlainText() == 'see docs now'
+    assert inline_markup('![x](a"b.png)') == '<img src="a&quot;b.png"/>'
+
+def test_escaped_image_names_are_found(tmp_path):
+    from PIL import Image
+    Image.new('RGB', (20, 20), 'red').save(tmp_path / 'a&"b.png')
+    flowables = blocks_to_flowables(parse_markdown('Inline ![x](a&"b.png) image\n'), get_styles(), str(tmp_path))
+    assert 'a&amp;' not in flowables[0].text
+    assert '<img src="' in flowables[0].text
@@ -0,0 +1,110 @@
+from PyPDF2 import PdfReader
+from pdf_assembly import assemble_pdf
+
+def page_texts(path):
+    return [page.extract_text().strip() for page in PdfReader(path).pages]
+
+def outline(path):
+    reader = PdfReader(path)
+    return [(entry.title, reader.get_destination_page_number(entry)) for entry in reader.outline]
+
+def count_images(path):
+    with open(path, 'rb') as f:
+        return f.read().count(b'/Subtype /Image')
+
+def test_page_ranges_and_outline(make_pdf, tmp_path):
+    first = make_pdf('first.pdf', ['A1', 'A2', 'A3'])
+    second = make_pdf('second.pdf', ['B1', 'B2'])
+    output = str(tmp_path / 'out.pdf')
+    stats = assemble_pdf(output, [(first, 1, None), (second, 0, 1)])
+    assert stats['pages'] == 3
+    assert page_texts(output) == ['A2', 'A3', 'B1']
+    # Outline entries of pages left out are dropped; the rest point at their new positions
+    assert outline(output) == [('A2', 0), ('A3', 1), ('B1', 2)]
+
+def test_explicit_outline(make_pdf, tmp_path):
+    source = make_pdf('source.pdf', ['A1', 'A2'])
+    output = str(tmp_path / 'out.pdf')
+    assemble_pdf(output, [(source, 0, None)], outline=[('Start', 0, 0), ('Second', 1, 0)])
+    assert outline(output) == [('Start', 0), ('Second', 1)]
+
+def test_optimize_writes_shared_objects_once(make_pdf, tmp_path):
+    first = make_pdf('first.pdf', ['A1', 'A2'])
+    second = make_pdf('second.pdf', ['B1', 'B2'])
+    plain = str(tmp_path / 'plain.pdf')
+    optimized = str(tmp_path / 'optimized.pdf')
+    assemble_pdf(plain, [(first, 0, None), (second, 0, None)])
+    stats = assemble_pdf(optimized, [(first, 0, None), (second, 0, None)], optimize=True)
+    # The font and the image are the same in both sources
+    assert stats['duplicates'] == 2
+    assert count_images(plain) == 2
+    assert count_images(optimized) == 1
+    assert stats['bytes'] < len(open(plain, 'rb').read())
+    assert page_texts(optimized) == ['A1', 'A2', 'B1', 'B2']
+
+def test_optimize_keeps_different_objects(make_pdf, tmp_path):
+    first = make_pdf('first.pdf', ['A1'])
+    second = make_pdf('second.pdf', ['B1'], color='blue')
+    output = str(tmp_path / 'out.pdf')
+    assemble_pdf(output, [(first, 0, None), (second, 0, None)], optimize=True)
+    assert page_texts(output) == ['A1', 'B1']
+    contents = [page.get_contents().get_data() for page in PdfReader(output).pages]
+    assert contents[0] != contents[1]
+
+def test_optimize_removes_ascii85(make_pdf, tmp_path):
+    source = make_pdf('source.pdf', ['A1'])
+    assert b'ASCII85Decode' in open(source, 'rb').read()
+    output = str(tmp_path / 'out.pdf')
+    assemble_pdf(output, [(source, 0, None)], optimize=True)
+    assert b'ASCII85Decode' not in open(output, 'rb').read()
+    assert page_texts(output) == ['A1']
+
+def test_layout(make_pdf, tmp_path):
+    source = make_pdf('source.pdf', ['A1', 'A2'])
+    output = str(tmp_path / 'out.pdf')
+    layout = {}
+    stats = assemble_pdf(output, [(source, 0, None)], optimize=True, layout=layout)
+    reader = PdfReader(output)
+    assert layout['page_objects'] == [page.indirect_reference.idnum for page in reader.pages]
+    assert layout['catalog_object'] == reader.trailer.raw_get('/Root').idnum
+    assert layout['bytes'] == stats['bytes']
+
+def test_memory_stays_bounded(large_pdf, peak_rss_growth, tmp_path):
+    statement = f"pdf_assembly.assemble_pdf({str(tmp_path / 'out.pdf')!r}, [({large_pdf!r}, 0, None)])"
+    kept = peak_rss_growth(statement, release=False)
+    released = peak_rss_growth(statement)
+    # The source's streams add up to 25 MB; released, about one page is held at a time
+    assert kept > 20
+    assert released < 8
+
+def test_release_without_an_object_cache(monkeypatch, capsys):
+    import pdf_assembly
+    monkeypatch.setattr(pdf_assembly, '_release_unsupported', False)
+    reader = object()
+    pdf_assembly.release_parsed_objects(reader)
+    pdf_assembly.release_parsed_objects(reader)
+    assert capsys.readouterr().out.count('Warning: PyPDF2') == 1
+
+def test_stats_without_rates():
+    from pdf_assembly import format_stats
+    stats = {'pages': 3, 'bytes': 2048, 'seconds': 0.0, 'pages_per_second': None, 'mb_per_second': None,
+             'peak_rss_mb': None}
+    assert format_stats(stats) == "3 pages, 2.0 KB in 0.000s"
+
+def test_reportlab_truetype_fonts_are_already_subset(tmp_path):
+    import os
+    import reportlab
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+    pdfmetrics.registerFont(TTFont('AssemblyTestVera', os.path.join(os.path.dirname(reportlab.__file__),
+                                                                    'fonts', 'Vera.ttf')))
+    source = str(tmp_path / 'vera.pdf')
+    c = canvas.Canvas(source, invariant=1)
+    c.setFont('AssemblyTestVera', 12)
+    c.drawString(72, 720, 'Subset me')
+    c.showPage()
+    c.save()
+    stats = assemble_pdf(str(tmp_path / 'out.pdf'), [(source, 0, None)])
+    assert stats['unsubset_fonts'] == []
+    assert page_texts(str(tmp_path / 'out.pdf')) == ['Subset me']
@@ -0,0 +1,95 @@
+from PyPDF2 import PdfReader
+import pdf_linearize
+from pdf_assembly import assemble_pdf
+from pdf_linearize import check_linearization, linearization_parameters, linearize_pdf
+
+def page_texts(path):
+    return [page.extract_text().strip() for page in PdfReader(path).pages]
+
+def assembled(make_pdf, tmp_path, titles):
+    path = str(tmp_path / 'assembled.pdf')
+    assemble_pdf(path, [(make_pdf('source.pdf', titles), 0, None)], optimize=True)
+    return path
+
+def test_linearized_output_passes_the_check(make_pdf, tmp_path):
+    titles = [f'Page {i}' for i in range(1, 8)]
+    output = str(tmp_path / 'linear.pdf')
+    stats = linearize_pdf(assembled(make_pdf, tmp_path, titles), output)
+    result = check_linearization(output)
+    assert result['linearized']
+    assert result['problems'] == []
+    assert result['pages'] == 7
+    assert stats['first_page_bytes'] < stats['bytes'] == result['bytes']
+    assert page_texts(output) == titles
+    assert [entry.title for entry in PdfReader(output).outline] == titles
+
+def test_single_page(make_pdf, tmp_path):
+    output = str(tmp_path / 'linear.pdf')
+    linearize_pdf(assembled(make_pdf, tmp_path, ['Only']), output)
+    assert check_linearization(output)['problems'] == []
+    assert page_texts(output) == ['Only']
+
+def test_reportlab_output_can_be_linearized_directly(make_pdf, tmp_path):
+    output = str(tmp_path / 'linear.pdf')
+    linearize_pdf(make_pdf('source.pdf', ['A', 'B', 'C']), output)
+    assert check_linearization(output)['problems'] == []
+    assert page_texts(output) == ['A', 'B', 'C']
+
+def test_assemble_pdf_linearize(make_pdf, tmp_path):
+    output = str(tmp_path / 'out.pdf')
+    stats = assemble_pdf(output, [(make_pdf('source.pdf', ['A', 'B']), 0, None)], linearize=True)
+    assert stats['linearized']
+    assert check_linearization(output)['problems'] == []
+    assert not [name for name in tmp_path.iterdir() if name.suffix == '.tmp']
+
+def test_plain_file_is_not_linearized(make_pdf, tmp_path):
+    path = assembled(make_pdf, tmp_path, ['A', 'B'])
+    result = check_linearization(path)
+    assert not result['linearized']
+    assert result['first_page_bytes'] == result['bytes']
+    assert linearization_parameters(path) is None
+
+def test_appended_bytes_are_found(make_pdf, tmp_path):
+    output = str(tmp_path / 'linear.pdf')
+    linearize_pdf(assembled(make_pdf, tmp_path, ['A', 'B']), output)
+    with open(output, 'ab') as f:
+        f.write(b'\n')
+    assert any('/L is' in problem for problem in check_linearization(output)['problems'])
+
+def test_wrong_content_stream_lengths_are_found(make_pdf, tmp_path, monkeypatch):
+    hint_tables = pdf_linearize.hint_tables
+
+    def wrong_lengths(pages, *args):
+        pages = [(offset, length, count, content_offset, content_length + 1)
+                 for offset, length, count, content_offset, content_length in pages]
+        return hint_tables(pages, *args)
+
+    monkeypatch.setattr(pdf_linearize, 'hint_tables', wrong_lengths)
+    output = str(tmp_path / 'linear.pdf')
+    linearize_pdf(assembled(make_pdf, tmp_path, ['A', 'B', 'C']), output)
+    problems = check_linearization(output)['problems']
+    assert len(problems) == 1
+    assert 'content stream of' in problems[0]
+
+def test_wrong_page_offsets_are_found(make_pdf, tmp_path, monkeypatch):
+    hint_tables = pdf_linearize.hint_tables
+
+    def wrong_offsets(pages, *args):
+        pages = [(offset + 1, length, count, content_offset, content_length)
+                 for offset, length, count, content_offset, content_length in pages]
+        return hint_tables(pages, *args)
+
+    monkeypatch.setattr(pdf_linearize, 'hint_tables', wrong_offsets)
+    output = str(tmp_path / 'linear.pdf')
+    linearize_pdf(assembled(make_pdf, tmp_path, ['A', 'B', 'C']), output)
+    assert any('at offset' in problem for problem in check_linearization(output)['problems'])
+
+def test_memory_stays_bounded(large_pdf, peak_rss_growth, tmp_path):
+    output = str(tmp_path / 'linear.pdf')
+    statement = f"pdf_linearize.linearize_pdf({large_pdf!r}, {output!r})"
+    kept = peak_rss_growth(statement, release=False)
+    released = peak_rss_growth(statement)
+    assert check_linearization(output)['problems'] == []
+    # The source's streams add up to 25 MB; released, about one page is held at a time
+    assert kept > 20
+    assert released < 8
@@ -0,0 +1,94 @@
+import json
+from PyPDF2 import PdfReader
+from pdf_update import load_update_state, update_pdf, update_state_path
+
+def page_texts(path):
+    return [page.extract_text().strip() for page in PdfReader(path).pages]
+
+def outline_titles(path):
+    return [entry.title for entry in PdfReader(path).outline]
+
+def test_first_build_is_a_full_write(make_pdf, tmp_path):
+    source = make_pdf('source.pdf', ['A1', 'A2', 'A3', 'A4'])
+    output = str(tmp_path / 'out.pdf')
+    stats = update_pdf(output, [(source, 0, None)])
+    assert stats['mode'] == 'full'
+    assert page_texts(output) == ['A1', 'A2', 'A3', 'A4']
+    assert load_update_state(update_state_path(output), output) is not None
+
+def test_unchanged(make_pdf, tmp_path):
+    source = make_pdf('source.pdf', ['A1', 'A2'])
+    output = str(tmp_path / 'out.pdf')
+    update_pdf(output, [(source, 0, None)])
+    before = open(output, 'rb').read()
+    stats = update_pdf(output, [(source, 0, None)])
+    assert stats['mode'] == 'unchanged'
+    assert open(output, 'rb').read() == before
+
+def test_changed_page_is_appended(make_pdf, tmp_path):
+    output = str(tmp_path / 'out.pdf')
+    update_pdf(output, [(make_pdf('v1.pdf', ['A1', 'A2', 'A3', 'A4']), 0, None)])
+    size = len(open(output, 'rb').read())
+    stats = update_pdf(output, [(make_pdf('v2.pdf', ['A1', 'B2', 'A3', 'A4']), 0, None)])
+    assert stats['mode'] == 'update'
+    assert stats['pages_written'] == 1
+    data = open(output, 'rb').read()
+    # The earlier file is kept as it was, with the update after it
+    assert data.count(b'%%EOF') == 2
+    assert stats['bytes_appended'] == len(data) - size
+    assert page_texts(output) == ['A1', 'B2', 'A3', 'A4']
+    assert outline_titles(output) == ['A1', 'B2', 'A3', 'A4']
+
+def test_added_page(make_pdf, tmp_path):
+    output = str(tmp_path / 'out.pdf')
+    update_pdf(output, [(make_pdf('v1.pdf', ['A1', 'A2', 'A3', 'A4']), 0, None)])
+    stats = update_pdf(output, [(make_pdf('v2.pdf', ['A1', 'A2', 'A3', 'A4', 'A5']), 0, None)])
+    assert stats['mode'] == 'update'
+    assert page_texts(output) == ['A1', 'A2', 'A3', 'A4', 'A5']
+    assert outline_titles(output) == ['A1', 'A2', 'A3', 'A4', 'A5']
+
+def test_repeated_updates(make_pdf, tmp_path):
+    output = str(tmp_path / 'out.pdf')
+    # Enough pages that the updates don't grow the file into a compaction
+    titles = [f'A{i}' for i in range(12)]
+    update_pdf(output, [(make_pdf('v0.pdf', titles), 0, None)])
+    for i in range(3):
+        titles[i] = f'C{i}'
+        stats = update_pdf(output, [(make_pdf(f'v{i + 1}.pdf', titles), 0, None)])
+        assert stats['mode'] == 'update'
+        assert stats['updates'] == i + 1
+        assert page_texts(output) == titles
+
+def test_compaction(make_pdf, tmp_path):
+    output = str(tmp_path / 'out.pdf')
+    update_pdf(output, [(make_pdf('v1.pdf', ['A1', 'A2', 'A3', 'A4']), 0, None)])
+    update_pdf(output, [(make_pdf('v2.pdf', ['A1', 'B2', 'A3', 'A4']), 0, None)], compact_every=1)
+    stats = update_pdf(output, [(make_pdf('v3.pdf', ['A1', 'C2', 'A3', 'A4']), 0, None)], compact_every=1)
+    assert stats['mode'] == 'full'
+    assert open(output, 'rb').read().count(b'%%EOF') == 1
+    assert page_texts(output) == ['A1', 'C2', 'A3', 'A4']
+
+def test_same_size_rewrite_forces_a_full_write(make_pdf, tmp_path):
+    output = str(tmp_path / 'out.pdf')
+    update_pdf(output, [(make_pdf('v1.pdf', ['A1', 'A2', 'A3', 'A4']), 0, None)])
+    # Something else changed the file without changing its size
+    data = bytearray(open(output, 'rb').read())
+    comment = data.index(b'\n%') + 2
+    data[comment] ^= 1
+    with open(output, 'wb') as f:
+        f.write(data)
+    assert load_update_state(update_state_path(output), output) is None
+    stats = update_pdf(output, [(make_pdf('v2.pdf', ['A1', 'B2', 'A3', 'A4']), 0, None)])
+    assert stats['mode'] == 'full'
+    assert page_texts(output) == ['A1', 'B2', 'A3', 'A4']
+
+def test_old_state_version_is_ignored(make_pdf, tmp_path):
+    output = str(tmp_path / 'out.pdf')
+    update_pdf(output, [(make_pdf('v1.pdf', ['A1', 'A2']), 0, None)])
+    state_path = update_state_path(output)
+    with open(state_path, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    state['version'] = 1
+    with open(state_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    assert load_update_state(state_path, output) is None
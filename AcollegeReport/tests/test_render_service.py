@@ -0,0 +1,70 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+import pytest
+import render_service
+from render_service import RenderHandler, RenderService, ThreadingHTTPServer
+
+SECTION = {'name': 'intro', 'markdown': '# Alpha\n\nHello world.'}
+
+@pytest.fixture(scope='module')
+def server():
+    service = RenderService(workers=1, max_queue=2, timeout=60)
+    service.warm_up()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), RenderHandler)
+    server.service = service
+    server.quiet = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    service.close()
+
+def post(server, sections):
+    request = urllib.request.Request(f"http://127.0.0.1:{server.server_address[1]}/render",
+                                     json.dumps({'sections': sections}).encode('utf-8'))
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+def test_workers_are_reused(server):
+    pids = [server.service.render([SECTION], {}, {})[1]['pid'] for _ in range(3)]
+    assert len(set(pids)) == 1
+    status, body = post(server, [SECTION])
+    assert status == 200 and body.startswith(b'%PDF')
+
+def test_bad_markup_is_a_client_error(server):
+    status, body = post(server, [{'name': 'bad', 'markdown': '<font color="zz>x'}])
+    assert status == 400
+    assert 'paraparser' in body['error']
+
+def test_other_value_errors_are_server_errors(server, monkeypatch):
+    failed = server.service.metrics.snapshot()['failed']
+    monkeypatch.setattr(server.service, '_run', lambda job, deadline: {
+        'name': job['name'], 'ok': False, 'exception': 'ValueError', 'message': 'bug',
+        'error': 'Traceback (most recent call last):\n  File "report.py", line 1\nValueError: bug\n'})
+    assert post(server, [SECTION]) == (500, {'error': "Render failed"})
+    assert server.service.metrics.snapshot()['failed'] == failed + 1
+
+def test_os_errors_get_a_response(server, monkeypatch):
+    def disk_full(contents_dir, sections):
+        raise OSError(28, "No space left on device")
+    monkeypatch.setattr(render_service, 'write_sections', disk_full)
+    failed = server.service.metrics.snapshot()['failed']
+    assert post(server, [SECTION]) == (500, {'error': "Render failed"})
+    assert server.service.metrics.snapshot()['failed'] == failed + 1
+
+def test_timed_out_worker_is_replaced(server):
+    service = server.service
+    timeout, service.timeout = service.timeout, 0.0001
+    try:
+        with pytest.raises(TimeoutError):
+            service.render([SECTION], {}, {})
+    finally:
+        service.timeout = timeout
+    assert service.render([SECTION], {}, {})[1]['ok']
+    assert len(service.pool) == service.workers
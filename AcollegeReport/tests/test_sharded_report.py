@@ -0,0 +1,75 @@
+import pytest
+from PyPDF2 import PdfReader
+from heading_manifest import heading_manifest_path, load_heading_manifest
+from report import create_pdf
+from sharded_report import create_pdf_sharded
+
+FILLER = "Plain filler sentence that keeps the layout busy for a while. " * 12
+
+def write_contents(tmp_path, files):
+    contents_dir = tmp_path / 'contents'
+    contents_dir.mkdir()
+    for name, text in files.items():
+        (contents_dir / name).write_text(text, encoding='utf-8')
+    return str(contents_dir)
+
+def short_contents():
+    return {
+        '01_alpha.txt': "# Alpha\n\nFirst section.\n",
+        '02_beta.txt': "# Beta\n\n" + "\n\n".join([FILLER] * 10) + "\n\n## Late heading\n\nAt the end.\n",
+        '03_gamma.txt': "# Gamma\n\n## Details\n\nLast section.\n",
+    }
+
+def long_toc_contents():
+    # Enough headings for a TOC that needs more than one page
+    return {f"{i:02d}_part.txt": f"# Part {i}\n\n" + "".join(f"## Topic {i}.{j}\n\n{FILLER}\n\n" for j in range(8))
+            for i in range(8)}
+
+def page_texts(path):
+    return [page.extract_text() for page in PdfReader(path).pages]
+
+def outline(path):
+    reader = PdfReader(path)
+    entries = []
+
+    def walk(items):
+        for item in items:
+            if isinstance(item, list):
+                walk(item)
+            else:
+                entries.append((item.title, reader.get_destination_page_number(item)))
+    walk(reader.outline)
+    return entries
+
+def manifest_pages(path):
+    return [(level, text, page) for level, text, page, _ in load_heading_manifest(heading_manifest_path(path))]
+
+@pytest.mark.parametrize('contents', [short_contents, long_toc_contents])
+def test_sharded_matches_one_document(tmp_path, contents):
+    contents_dir = write_contents(tmp_path, contents())
+    reference = str(tmp_path / 'reference.pdf')
+    create_pdf(reference, contents_dir, use_cache=False, single_pass=False)
+    sharded = str(tmp_path / 'sharded.pdf')
+    create_pdf_sharded(sharded, contents_dir, jobs=2, use_cache=False)
+
+    assert page_texts(sharded) == page_texts(reference)
+    assert outline(sharded) == outline(reference)
+    assert manifest_pages(sharded) == manifest_pages(reference)
+
+def test_long_toc_shifts_the_body(tmp_path):
+    contents_dir = write_contents(tmp_path, long_toc_contents())
+    sharded = str(tmp_path / 'sharded.pdf')
+    create_pdf_sharded(sharded, contents_dir, jobs=1, use_cache=False)
+    pages = dict(outline(sharded))
+    # Cover, at least two TOC pages and the empty page after them, then the first part
+    assert pages['Part 0'] >= 4
+    assert page_texts(sharded)[pages['Part 0']].lstrip().startswith('Part 0')
+
+def test_cached_chunks_give_the_same_report(tmp_path):
+    contents_dir = write_contents(tmp_path, short_contents())
+    first = str(tmp_path / 'first.pdf')
+    create_pdf_sharded(first, contents_dir, jobs=1)
+    second = str(tmp_path / 'second.pdf')
+    create_pdf_sharded(second, contents_dir, jobs=2)
+    assert page_texts(second) == page_texts(first)
+    assert outline(second) == outline(first)
@@ -0,0 +1,85 @@
+import re
+from PyPDF2 import PdfReader
+from heading_manifest import heading_manifest_path, load_heading_manifest
+from report import create_pdf
+
+FILLER = "Plain filler sentence that keeps the layout busy for a while. " * 12
+
+CONTENTS = {
+    '01_alpha.txt': "# Alpha\n\nFirst section.\n",
+    '02_beta.txt': "# Beta\n\n" + "\n\n".join([FILLER] * 4) + "\n",
+    '03_gamma.txt': "# Gamma\n\n## Details\n\nLast section.\n",
+}
+
+def write_contents(contents_dir, contents):
+    contents_dir.mkdir(exist_ok=True)
+    for name, text in contents.items():
+        (contents_dir / name).write_text(text, encoding='utf-8')
+    return str(contents_dir)
+
+def build(capsys, output, contents_dir, single_pass=True):
+    """Build the report and return the number of layout passes it took."""
+    capsys.readouterr()
+    create_pdf(output, contents_dir, use_cache=False, single_pass=single_pass)
+    return int(re.search(r'\((\d+) layout pass', capsys.readouterr().out).group(1))
+
+def page_texts(path):
+    return [page.extract_text() for page in PdfReader(path).pages]
+
+def outline(path):
+    reader = PdfReader(path)
+    entries = []
+
+    def walk(items):
+        for item in items:
+            if isinstance(item, list):
+                walk(item)
+            else:
+                entries.append((item.title, reader.get_destination_page_number(item)))
+    walk(reader.outline)
+    return entries
+
+def test_unchanged_rebuild_takes_one_pass(tmp_path, capsys):
+    contents_dir = write_contents(tmp_path / 'contents', CONTENTS)
+    output = str(tmp_path / 'projectReport.pdf')
+    assert build(capsys, output, contents_dir) > 1
+    first = page_texts(output)
+    assert build(capsys, output, contents_dir) == 1
+    assert page_texts(output) == first
+
+def test_added_heading_matches_multibuild(tmp_path, capsys):
+    contents_dir = write_contents(tmp_path / 'contents', CONTENTS)
+    output = str(tmp_path / 'projectReport.pdf')
+    build(capsys, output, contents_dir)
+
+    # A new heading, and enough text before Gamma to move it to a later page
+    write_contents(tmp_path / 'contents', {
+        '02_beta.txt': CONTENTS['02_beta.txt'] + "\n## Added\n\n" + "\n\n".join([FILLER] * 8) + "\n",
+    })
+    assert build(capsys, output, contents_dir) > 1
+    reference = str(tmp_path / 'reference.pdf')
+    build(capsys, reference, contents_dir, single_pass=False)
+
+    assert page_texts(output) == page_texts(reference)
+    assert outline(output) == outline(reference)
+    titles = [title for title, _ in outline(output)]
+    assert titles[-5:] == ['Alpha', 'Beta', 'Added', 'Gamma', 'Details']
+    # The TOC (compared above) lists the heading; the manifest has the page it is on
+    assert 'Added' in page_texts(output)[1]
+    pages = {text: page for _, text, page, _ in load_heading_manifest(heading_manifest_path(output))}
+    assert pages['Added'] == dict(outline(output))['Added'] + 1
+
+def test_pages_shifted_without_new_headings(tmp_path, capsys):
+    contents_dir = write_contents(tmp_path / 'contents', CONTENTS)
+    output = str(tmp_path / 'projectReport.pdf')
+    build(capsys, output, contents_dir)
+    before = dict(outline(output))
+    write_contents(tmp_path / 'contents', {
+        '02_beta.txt': "# Beta\n\n" + "\n\n".join([FILLER] * 16) + "\n",
+    })
+    build(capsys, output, contents_dir)
+    assert dict(outline(output))['Gamma'] > before['Gamma']
+    reference = str(tmp_path / 'reference.pdf')
+    build(capsys, reference, contents_dir, single_pass=False)
+    assert page_texts(output) == page_texts(reference)
+    assert outline(output) == outline(reference)
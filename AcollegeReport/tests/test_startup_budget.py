@@ -0,0 +1,13 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+from startup_budget import BUDGET_MS, LIGHT_ENTRY_POINTS, probe
+
+@pytest.mark.parametrize('module', LIGHT_ENTRY_POINTS)
+def test_entry_point_starts_light(module):
+    results = [probe(module) for _ in range(3)]
+    assert results[0]['heavy'] == []
+    # The best of a few runs, so a busy machine doesn't fail the check
+    assert min(result['import_ms'] for result in results) <= BUDGET_MS
@@ -0,0 +1,51 @@
+from PyPDF2 import PdfReader
+import text_extraction
+from text_extraction import extract_page_texts
+
+TITLES = [f"Page {i} of the {word} chapter" for i, word in enumerate(
+    ['first', 'second', 'third', 'fourth', 'fifth', 'sixth', 'seventh', 'eighth', 'ninth', 'tenth',
+     'eleventh', 'twelfth'], 1)]
+
+def serial_texts(path):
+    return [page.extract_text() for page in PdfReader(path).pages]
+
+def test_parallel_matches_serial(make_pdf, monkeypatch):
+    path = make_pdf('source.pdf', TITLES)
+    pools = []
+    real_pool = text_extraction.process_pool
+
+    def counting_pool(jobs, **kw):
+        pools.append(jobs)
+        return real_pool(jobs, **kw)
+    monkeypatch.setattr(text_extraction, 'process_pool', counting_pool)
+    monkeypatch.setattr(text_extraction, 'MIN_PAGES_PER_WORKER', 1)
+
+    expected = serial_texts(path)
+    assert extract_page_texts(path, jobs=3, use_cache=False) == expected
+    assert pools == [3]
+    assert extract_page_texts(path, jobs=1, use_cache=False) == expected
+    assert pools == [3]
+    assert extract_page_texts(path, 2, 9, jobs=4, use_cache=False) == expected[2:9]
+
+def test_cached_pages_are_not_extracted_again(make_pdf, monkeypatch):
+    path = make_pdf('cached.pdf', TITLES)
+    extracted = []
+    real_extract = text_extraction._extract_range
+
+    def counting_extract(pdf_path, pages):
+        extracted.extend(pages)
+        return real_extract(pdf_path, pages)
+    monkeypatch.setattr(text_extraction, '_extract_range', counting_extract)
+
+    expected = serial_texts(path)
+    assert extract_page_texts(path, 0, 5, jobs=1) == expected[:5]
+    assert extract_page_texts(path, 0, 12, jobs=1) == expected
+    assert extract_page_texts(path, jobs=1) == expected
+    assert extracted == list(range(12))
+
+def test_changed_file_is_extracted_again(make_pdf):
+    path = make_pdf('changing.pdf', TITLES[:3])
+    assert extract_page_texts(path, jobs=1) == serial_texts(path)
+    make_pdf('changing.pdf', [title.upper() for title in TITLES[:3]])
+    assert extract_page_texts(path, jobs=1) == serial_texts(path)
+    assert 'PAGE 1' in extract_page_texts(path, jobs=1)[0]
@@ -0,0 +1,66 @@
+import os
+import shutil
+import threading
+import reportlab
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from text_metrics import WidthCache, font_identity
+
+VERA = os.path.join(os.path.dirname(reportlab.__file__), 'fonts', 'Vera.ttf')
+VERA_BOLD = os.path.join(os.path.dirname(reportlab.__file__), 'fonts', 'VeraBd.ttf')
+VERA_ITALIC = os.path.join(os.path.dirname(reportlab.__file__), 'fonts', 'VeraIt.ttf')
+
+def test_widths_match_reportlab():
+    cache = WidthCache(pdfmetrics.stringWidth)
+    for _ in range(2):
+        assert cache.stringWidth('Hello world', 'Helvetica', 12) == pdfmetrics.stringWidth('Hello world', 'Helvetica', 12)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_eviction_while_other_threads_insert():
+    cache = WidthCache(lambda text, font, size, encoding: len(text), max_entries=64)
+    errors = []
+
+    def measure(prefix):
+        try:
+            for i in range(20000):
+                cache.stringWidth(f"{prefix}{i}", 'Helvetica', 10)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=measure, args=(n,)) for n in 'abcd']
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(cache.widths) <= 64
+
+def test_saved_widths_are_kept_for_the_same_fonts(tmp_path):
+    pdfmetrics.registerFont(TTFont('MetricsTestFont', VERA))
+    cache = WidthCache(pdfmetrics.stringWidth)
+    cache.stringWidth('Hello', 'MetricsTestFont', 12)
+    cache.stringWidth('Hello', 'Helvetica', 12)
+    cache.save(str(tmp_path / 'widths.json'))
+
+    loaded = WidthCache(pdfmetrics.stringWidth)
+    loaded.load(str(tmp_path / 'widths.json'))
+    assert set(loaded.widths) == {('Hello', 'MetricsTestFont', 12.0), ('Hello', 'Helvetica', 12.0)}
+
+def test_saved_widths_are_dropped_when_the_font_file_changes(tmp_path):
+    font_path = str(tmp_path / 'font.ttf')
+    # A face no other test registers; ReportLab shares faces registered under other names
+    shutil.copyfile(VERA_ITALIC, font_path)
+    pdfmetrics.registerFont(TTFont('MetricsTestFileFont', font_path))
+    cache = WidthCache(pdfmetrics.stringWidth)
+    cache.stringWidth('Hello', 'MetricsTestFileFont', 12)
+    cache.stringWidth('Hello', 'Helvetica', 12)
+    cache.save(str(tmp_path / 'widths.json'))
+
+    # The next run finds another font in the file registered under the same name
+    shutil.copyfile(VERA_BOLD, font_path)
+    loaded = WidthCache(pdfmetrics.stringWidth)
+    loaded.load(str(tmp_path / 'widths.json'))
+    assert set(loaded.widths) == {('Hello', 'Helvetica', 12.0)}
+
+def test_unregistered_fonts_have_no_identity():
+    assert font_identity('NoSuchFontAnywhere') is None
@@ -0,0 +1,65 @@
+import os
+from PyPDF2 import PdfReader
+from build_cache import BuildCache, hash_file
+from build_graph import process_pool
+from tracing import traced
+
+# Below this many uncached pages per worker, starting processes costs more than it saves
+MIN_PAGES_PER_WORKER = 8
+
+def _extract_range(pdf_path, pages):
+    """Extract the text of the given pages; runs in a worker with its own reader."""
+    reader = PdfReader(pdf_path)
+    return [(i, reader.pages[i].extract_text()) for i in pages]
+
+def _split(pages, chunks):
+    """Split a list of page numbers into at most `chunks` contiguous runs."""
+    size = -(-len(pages) // chunks)
+    return [pages[i:i + size] for i in range(0, len(pages), size)]
+
+@traced('text', memory=True)
+def extract_page_texts(pdf_path, start=0, end=None, jobs=None, use_cache=True):
+    """
+    Return the extracted text of pages [start, end) of a PDF, in page order.
+
+    Text is cached on disk per (file hash, page number), so an unchanged PDF
+    is only extracted once. Uncached pages are spread over a process pool,
+    each worker opening its own PdfReader; the result is the same as calling
+    extract_text() on each page in turn.
+    """
+    if end is None:
+        end = len(PdfReader(pdf_path).pages)
+    pages = list(range(start, end))
+    if not pages:
+        return []
+
+    cache = BuildCache('page_text', max_bytes=128 * 1024 * 1024) if use_cache else None
+    file_hash = hash_file(pdf_path)
+    texts = {}
+    missing = []
+    for i in pages:
+        text = cache.get(f"{file_hash}-{i}") if cache is not None else None
+        if text is None:
+            missing.append(i)
+        else:
+            texts[i] = text
+
+    if missing:
+        jobs = jobs or os.cpu_count() or 1
+        jobs = min(jobs, len(missing) // MIN_PAGES_PER_WORKER)
+        if jobs <= 1:
+            results = _extract_range(pdf_path, missing)
+        else:
+            # One contiguous run per worker, since every chunk pays for opening the PDF
+            chunks = _split(missing, jobs)
+            results = []
+            with process_pool(jobs) as pool:
+                for chunk_results in pool.map(_extract_range, [pdf_path] * len(chunks), chunks):
+                    results.extend(chunk_results)
+
+        for i, text in results:
+            texts[i] = text
+            if cache is not None:
+                cache.put(f"{file_hash}-{i}", text)
+
+    return [texts[i] for i in pages]
@@ -0,0 +1,167 @@
+import atexit
+import json
+import os
+import threading
+from itertools import islice
+from build_cache import CACHE_DIR, hash_file
+
+# Bump when the saved layout changes
+WIDTH_CACHE_VERSION = 2
+
+# Widths kept in memory (and saved); the oldest half is dropped when it fills up
+MAX_ENTRIES = 200000
+
+# REPORT_WIDTH_CACHE: 'memory' (default) keeps measured widths within a process,
+# 'disk' also between runs and 'off' measures every string again
+WIDTH_CACHE_MODE = os.environ.get('REPORT_WIDTH_CACHE', 'memory')
+
+WIDTH_CACHE_PATH = os.path.join(CACHE_DIR, 'text_metrics', 'widths.json')
+
+# ReportLab modules that measure text with their own reference to stringWidth
+PATCHED_MODULES = (
+    'reportlab.pdfbase.pdfmetrics',
+    'reportlab.platypus.paragraph',
+    'reportlab.platypus.flowables',
+    'reportlab.platypus.xpreformatted',
+    'reportlab.platypus.tables',
+    'reportlab.platypus.tableofcontents',
+    'reportlab.platypus.frames',
+    'reportlab.platypus.doctemplate',
+)
+
+def font_identity(font_name):
+    """
+    Return what the widths measured in a font depend on: 'builtin' for
+    ReportLab's standard fonts, the hash of the font file for fonts loaded
+    from one, and None when the font isn't registered or has no file.
+    """
+    from reportlab.pdfbase.pdfmetrics import getFont
+    try:
+        face = getFont(font_name).face
+    except KeyError:
+        return None
+    if getattr(face, 'builtIn', False):
+        return 'builtin'
+    filename = getattr(face, 'filename', None)
+    if isinstance(filename, str) and os.path.isfile(filename):
+        return hash_file(filename)
+    return None
+
+class WidthCache:
+    """
+    Memoized string widths keyed by (text, font, size). Paragraphs measure
+    the same words in the same few fonts over and over, on every layout pass,
+    and ReportLab's width code is slow Python when its C accelerator is
+    missing.
+    """
+    def __init__(self, measure, max_entries=MAX_ENTRIES):
+        self.measure = measure
+        self.max_entries = max_entries
+        self.widths = {}
+        # Lookups need no lock; inserts and evictions do, or an eviction could
+        # iterate the dict while another thread adds to it
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.loaded = 0
+
+    def stringWidth(self, text, fontName, fontSize, encoding='utf8'):
+        """Drop-in replacement for pdfmetrics.stringWidth."""
+        key = (text, fontName, fontSize)
+        width = self.widths.get(key)
+        if width is not None and encoding == 'utf8':
+            self.hits += 1
+            return width
+        width = self.measure(text, fontName, fontSize, encoding)
+        if encoding == 'utf8':
+            self.misses += 1
+            with self.lock:
+                if len(self.widths) >= self.max_entries:
+                    for old in list(islice(self.widths, self.max_entries // 2)):
+                        del self.widths[old]
+                self.widths[key] = width
+        return width
+
+    def load(self, path):
+        """
+        Add the widths saved at path that were measured by this ReportLab
+        version in the same font files as the fonts registered now.
+        """
+        from reportlab import Version
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        if saved.get('version') != WIDTH_CACHE_VERSION or saved.get('reportlab') != Version:
+            return
+        with self.lock:
+            for font_name, font in saved['fonts'].items():
+                # A different font may be registered under the same name
+                if font['identity'] != font_identity(font_name):
+                    continue
+                for size, widths in font['widths'].items():
+                    size = float(size)
+                    for text, width in widths.items():
+                        self.widths[(text, font_name, size)] = width
+            self.loaded = len(self.widths)
+
+    def save(self, path):
+        """Save the widths, with what identifies each font, so load can tell when a font changed."""
+        from reportlab import Version
+        if not self.misses:
+            return
+        with self.lock:
+            entries = list(self.widths.items())
+        identities = {}
+        fonts = {}
+        for (text, font_name, size), width in entries:
+            if font_name not in identities:
+                identities[font_name] = font_identity(font_name)
+            if identities[font_name] is None or not isinstance(text, str):
+                continue
+            font = fonts.setdefault(font_name, {'identity': identities[font_name], 'widths': {}})
+            font['widths'].setdefault(repr(float(size)), {})[text] = width
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': WIDTH_CACHE_VERSION, 'reportlab': Version, 'fonts': fonts}, f,
+                      separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+_cache = None
+_install_lock = threading.Lock()
+
+def install(mode=None):
+    """
+    Route ReportLab's text measurement through a WidthCache; called by
+    make_doc_template before a document is built. Only the first call
+    patches ReportLab, so it is safe to call from several threads. Returns
+    the cache, or None when the cache is off.
+    """
+    global _cache
+    mode = mode or WIDTH_CACHE_MODE
+    if _cache is not None or mode == 'off':
+        return _cache
+    import importlib
+    from reportlab.pdfbase import pdfmetrics
+
+    with _install_lock:
+        if _cache is not None:
+            return _cache
+        measure = pdfmetrics.stringWidth
+        cache = WidthCache(measure)
+        if mode == 'disk':
+            cache.load(WIDTH_CACHE_PATH)
+            atexit.register(save)
+        for name in PATCHED_MODULES:
+            module = importlib.import_module(name)
+            if getattr(module, 'stringWidth', None) is measure:
+                module.stringWidth = cache.stringWidth
+        _cache = cache
+    return _cache
+
+def save():
+    """Save the measured widths for the next run."""
+    if _cache is not None:
+        _cache.save(WIDTH_CACHE_PATH)
@@ -0,0 +1,252 @@
+import functools
+import json
+import os
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# The active tracer, or None when tracing is off
+_tracer = None
+
+def peak_rss_mb():
+    """Return the peak resident set size of this process in MB, if known."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    if os.uname().sysname == 'Darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+def rss_mb():
+    """Return the current resident set size in MB, falling back to the peak."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return peak_rss_mb()
+
+class Tracer:
+    """
+    Collects trace events in the Chrome trace event format, which
+    chrome://tracing and Perfetto can load. Times are in microseconds.
+    """
+    def __init__(self, path, flowables=False):
+        self.path = path
+        self.flowables = flowables
+        self.pid = os.getpid()
+        self.start = time.perf_counter()
+        self.events = []
+        self.threads = {}
+        # (kind, flowable class) -> [calls, seconds]
+        self.totals = {}
+
+    def _ts(self, t):
+        return (t - self.start) * 1e6
+
+    def add(self, ph, name, cat, t, **fields):
+        # list.append is atomic, so stage threads can record without a lock
+        tid = threading.get_ident()
+        if tid not in self.threads:
+            self.threads[tid] = threading.current_thread().name
+        self.events.append(dict(ph=ph, name=name, cat=cat, ts=self._ts(t),
+                                pid=self.pid, tid=tid, **fields))
+
+    def complete(self, name, cat, start, end, args=None):
+        self.add('X', name, cat, start, dur=(end - start) * 1e6, args=args or {})
+
+    def counter(self, name, t, **values):
+        self.add('C', name, 'memory', t, args=values)
+
+    def save(self):
+        # Name the threads so the stage threads are easy to tell apart
+        metadata = [dict(ph='M', name='thread_name', pid=self.pid, tid=tid, args={'name': name})
+                    for tid, name in self.threads.items()]
+        totals = {f"{kind}/{cls}": {'calls': calls, 'seconds': seconds}
+                  for (kind, cls), (calls, seconds) in sorted(self.totals.items())}
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': metadata + self.events, 'displayTimeUnit': 'ms',
+                       'otherData': {'flowable_totals': totals}}, f)
+        os.replace(tmp_path, self.path)
+
+class _NullSpan:
+    """Stand-in returned by span() when tracing is off."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    def __init__(self, tracer, name, cat, memory, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.memory = memory
+        self.args = args
+
+    def __enter__(self):
+        if self.memory:
+            self.args['rss_start_mb'] = rss_mb()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        if self.memory:
+            self.args['rss_end_mb'] = rss_mb()
+            self.args['peak_rss_mb'] = peak_rss_mb()
+            self.tracer.counter('rss_mb', end, rss=self.args['rss_end_mb'])
+        if exc[0] is not None:
+            self.args['error'] = repr(exc[1])
+        self.tracer.complete(self.name, self.cat, self.start, end, self.args)
+        return False
+
+def enable(path, flowables=False):
+    """
+    Start recording a trace that save() writes to path. With flowables=True
+    every flowable's wrap, split and draw calls are timed as well.
+    """
+    global _tracer
+    _tracer = Tracer(path, flowables)
+    if flowables:
+        _instrument_flowables()
+    return _tracer
+
+def enabled():
+    return _tracer is not None
+
+def span(name, cat='stage', memory=False, **args):
+    """
+    Return a context manager that records a span around its block.
+    When tracing is off this is a shared no-op object.
+    """
+    if _tracer is None:
+        return _NULL_SPAN
+    return _Span(_tracer, name, cat, memory, args)
+
+def traced(cat, memory=False):
+    """Decorator recording a span named after the function around every call."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kw):
+            if _tracer is None:
+                return func(*args, **kw)
+            with _Span(_tracer, func.__name__, cat, memory, {}):
+                return func(*args, **kw)
+        return wrapper
+    return decorate
+
+def begin(name, cat, **args):
+    """Open a span that is closed by end() from another hook on the same thread."""
+    if _tracer is not None:
+        _tracer.add('B', name, cat, time.perf_counter(), args=args)
+
+def end(name, cat):
+    if _tracer is not None:
+        _tracer.add('E', name, cat, time.perf_counter())
+
+def instant(name, cat, **args):
+    """Record a point in time, such as a heading being placed."""
+    if _tracer is not None:
+        _tracer.add('i', name, cat, time.perf_counter(), s='t', args=args)
+
+def save():
+    """Write the trace and stop tracing; returns the trace path, or None if tracing was off."""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is None:
+        return None
+    tracer.save()
+    return tracer.path
+
+def settings():
+    """Return what a spawned process needs for resume(), or None when tracing is off."""
+    if _tracer is None:
+        return None
+    return {'path': _tracer.path, 'flowables': _tracer.flowables, 'start': _tracer.start}
+
+def resume(settings):
+    """
+    Trace in a spawned process on the timeline of the process that called
+    settings(); events_since() and merge() bring the events back to it.
+    """
+    tracer = enable(settings['path'], settings['flowables'])
+    # perf_counter is a system-wide clock, so the timestamps line up
+    tracer.start = settings['start']
+
+def mark():
+    """Note how much has been recorded, so a forked stage process can send back only its own events."""
+    if _tracer is None:
+        return None
+    return len(_tracer.events), {key: list(total) for key, total in _tracer.totals.items()}
+
+def events_since(mark, name=None):
+    """Return what was recorded since mark(), for merge() in the parent process, naming this process."""
+    if _tracer is None or mark is None:
+        return None
+    count, totals = mark
+    changed = {}
+    for key, (calls, seconds) in _tracer.totals.items():
+        before = totals.get(key, [0, 0.0])
+        if calls != before[0]:
+            changed[key] = [calls - before[0], seconds - before[1]]
+    events = _tracer.events[count:]
+    if name:
+        events.append(dict(ph='M', name='process_name', pid=_tracer.pid, args={'name': name}))
+    return {'events': events, 'totals': changed}
+
+def merge(recorded):
+    """Add the events of a stage process to this process's trace."""
+    if _tracer is None or not recorded:
+        return
+    _tracer.events.extend(recorded['events'])
+    for key, (calls, seconds) in recorded['totals'].items():
+        total = _tracer.totals.setdefault(key, [0, 0.0])
+        total[0] += calls
+        total[1] += seconds
+
+def _after_fork():
+    # Events recorded in a forked stage process belong to that process
+    if _tracer is not None:
+        _tracer.pid = os.getpid()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+def _timed(method, kind):
+    def timed(self, *args, **kw):
+        tracer = _tracer
+        if tracer is None or not tracer.flowables:
+            return method(self, *args, **kw)
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kw)
+        finally:
+            end = time.perf_counter()
+            cls = self.__class__.__name__
+            tracer.complete(cls, kind, start, end)
+            total = tracer.totals.setdefault((kind, cls), [0, 0.0])
+            total[0] += 1
+            total[1] += end - start
+    timed.__wrapped__ = method
+    return timed
+
+def _instrument_flowables():
+    """Time Flowable.wrapOn/splitOn/drawOn; only installed once flowable tracing is asked for."""
+    from reportlab.platypus.flowables import Flowable
+    if getattr(Flowable, '_traced', False):
+        return
+    Flowable.wrapOn = _timed(Flowable.wrapOn, 'wrap')
+    Flowable.splitOn = _timed(Flowable.splitOn, 'split')
+    Flowable.drawOn = _timed(Flowable.drawOn, 'draw')
+    Flowable._traced = True
@@ -0,0 +1,222 @@
+import argparse
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+import build_cache
+from build_graph import BuildGraph
+from generate_complete_report import create_stages
+from images import referenced_images
+
+# inotify event flags (see inotify(7)); IN_CREATE reports new source subdirectories
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# Header of each event read from an inotify descriptor: wd, mask, cookie, name length
+EVENT_HEADER = struct.Struct('iIII')
+
+class InotifyWatcher:
+    """Waits for files in a set of directories to change, using inotify through libc."""
+    def __init__(self, dirs):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs = {}
+        for path in dirs:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                os.close(self.fd)
+                raise OSError(errno, f"Cannot watch {path}")
+            self.dirs[wd] = path
+
+    def _read(self):
+        data = os.read(self.fd, 64 * 1024)
+        changed = set()
+        pos = 0
+        while pos < len(data):
+            wd, _, _, length = EVENT_HEADER.unpack_from(data, pos)
+            pos += EVENT_HEADER.size
+            name = data[pos:pos + length].rstrip(b'\0')
+            pos += length
+            if wd in self.dirs and name:
+                changed.add(os.path.join(self.dirs[wd], os.fsdecode(name)))
+        return changed
+
+    def wait(self, settle=0.05):
+        """Block until something changes, then return the changed paths."""
+        select.select([self.fd], [], [])
+        changed = self._read()
+        # Editors often save in several steps; collect them into one rebuild
+        while select.select([self.fd], [], [], settle)[0]:
+            changed |= self._read()
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """Fallback for systems without inotify: compares file mtimes at an interval."""
+    def __init__(self, dirs, interval=0.25):
+        self.dirs = list(dirs)
+        self.interval = interval
+        self.snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        for path in self.dirs:
+            try:
+                names = os.listdir(path)
+            except OSError:
+                continue
+            for name in names:
+                file_path = os.path.join(path, name)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                snapshot[file_path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def wait(self, settle=0.05):
+        while True:
+            time.sleep(self.interval)
+            current = self._scan()
+            if current != self.snapshot:
+                break
+        time.sleep(settle)
+        current = self._scan()
+        changed = {path for path in set(current) | set(self.snapshot)
+                   if current.get(path) != self.snapshot.get(path)}
+        self.snapshot = current
+        return changed
+
+    def close(self):
+        pass
+
+def make_watcher(dirs, poll=False):
+    if not poll:
+        try:
+            return InotifyWatcher(dirs)
+        except (OSError, AttributeError):
+            # No libc or no inotify (not Linux)
+            pass
+    return PollingWatcher(dirs)
+
+def watched_dirs(dir_path, image_paths, source_dir):
+    """Return the directories holding the build's inputs: contents, scripts, referenced images and app sources."""
+    dirs = [os.path.join(dir_path, "contents"), dir_path]
+    dirs.extend(os.path.dirname(path) for path in image_paths)
+    # inotify doesn't watch subdirectories, so list every directory of the source tree
+    for root, subdirs, _ in os.walk(source_dir):
+        subdirs.sort()
+        dirs.append(root)
+    unique = []
+    for path in map(os.path.normpath, dirs):
+        if os.path.isdir(path) and path not in unique:
+            unique.append(path)
+    return unique
+
+def warm_up(contents_dir):
+    """Load the heavy modules, the styles and the parsed sections into this process."""
+    import PyPDF2
+    import acknowledgement, create_index, create_final_report, pdf_assembly, pdf_update
+    from report import list_content_files, load_sections, style_fingerprint
+    from report_styles import get_styles
+
+    build_cache.keep_in_memory()
+    style_key = style_fingerprint(get_styles())
+    cache = build_cache.BuildCache('sections')
+    for file_path in list_content_files(contents_dir):
+        load_sections(file_path, style_key, cache)
+
+def rebuild(graph, jobs):
+    """Run the build graph and print how long it took; returns True on success."""
+    start = time.perf_counter()
+    results = graph.run(jobs=jobs)
+    elapsed = time.perf_counter() - start
+    built = [name for name, result in results.items() if result == 'built']
+    failed = [name for name, result in results.items() if result in ('failed', 'blocked')]
+    if failed:
+        print(f"Error: Failed stages: {', '.join(failed)}")
+        return False
+    if built:
+        print(f"Updated in {elapsed:.2f}s ({', '.join(built)})")
+    else:
+        print("Everything is up to date.")
+    return True
+
+def main(argv=None):
+    """Rebuild the final report whenever a content file, referenced image, app source or generator script changes."""
+    parser = argparse.ArgumentParser(description="Watch the report sources and rebuild on change.")
+    parser.add_argument("--single-document", action="store_true",
+                        help="lay the whole report out again on every change instead of re-rendering only changed files")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="worker processes for rendering; the default renders in this warm process")
+    parser.add_argument("--poll", action="store_true", help="poll file times instead of using inotify")
+    args = parser.parse_args(argv)
+
+    dir_path = os.path.dirname(os.path.abspath(__file__))
+    contents_dir = os.path.join(dir_path, "contents")
+    source_dir = os.path.join(os.path.dirname(dir_path), "lib")
+
+    def make_graph():
+        # Edits are small, so the final report is updated in place instead of rewritten
+        return BuildGraph(create_stages(dir_path, sharded=not args.single_document, jobs=args.jobs, incremental=True))
+
+    def is_input(path):
+        if path in image_paths or path.startswith(source_dir + os.sep):
+            return True
+        return os.path.dirname(path) == contents_dir and path.endswith('.txt')
+
+    print("Loading report modules...")
+    warm_up(contents_dir)
+    image_paths = {os.path.normpath(path) for path in referenced_images(contents_dir)}
+    graph = make_graph()
+    rebuild(graph, args.jobs)
+
+    dirs = watched_dirs(dir_path, image_paths, source_dir)
+    watcher = make_watcher(dirs, poll=args.poll)
+    print(f"\nWatching {contents_dir}, its images, the app sources and the generator scripts "
+          f"({'inotify' if isinstance(watcher, InotifyWatcher) else 'polling'}). Press Ctrl+C to stop.")
+    try:
+        while True:
+            changed = {os.path.normpath(path) for path in watcher.wait()}
+            inputs = sorted(path for path in changed if is_input(path))
+            scripts = sorted(path for path in changed
+                             if os.path.dirname(path) == dir_path and path.endswith('.py'))
+
+            if scripts:
+                # Loaded modules can't be swapped safely, so start over with the new code
+                print(f"\nChanged: {', '.join(os.path.basename(p) for p in scripts)}; restarting...")
+                watcher.close()
+                os.execv(sys.executable, [sys.executable, os.path.abspath(__file__)] + sys.argv[1:])
+            if inputs:
+                print(f"\nChanged: {', '.join(os.path.relpath(p, dir_path) for p in inputs)}")
+                # The stages list the referenced images as inputs, so declare them again when those change
+                current = {os.path.normpath(path) for path in referenced_images(contents_dir)}
+                if current != image_paths:
+                    image_paths = current
+                    graph = make_graph()
+                # Follow images in new directories and new source subdirectories
+                current_dirs = watched_dirs(dir_path, image_paths, source_dir)
+                if current_dirs != dirs:
+                    dirs = current_dirs
+                    watcher.close()
+                    watcher = make_watcher(dirs, poll=args.poll)
+                rebuild(graph, args.jobs)
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
+    finally:
+        watcher.close()
+
+if __name__ == "__main__":
+    main()